@@ -0,0 +1,136 @@
+"""
+Общие средства асинхронных представлений API (настройка ASYNC_API).
+
+Асинхронные представления отвечают на GET в том же формате, что и DRF,
+а остальные методы передают синхронным представлениям DRF.
+"""
+
+from functools import wraps
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions
+from rest_framework.request import Request
+
+from users.authentication import CachedTokenAuthentication
+from .renderers import dumps
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+async def alist(queryset):
+    return [item async for item in queryset]
+
+
+async def aset(queryset):
+    return {item async for item in queryset}
+
+
+def json_response(data, status=HTTPStatus.OK, headers=None):
+    return HttpResponse(
+        dumps(data),
+        status=status,
+        headers=headers,
+        content_type="application/json",
+    )
+
+
+def exception_response(exc):
+    """Формирует ответ на исключение так же, как exception_handler DRF."""
+    if isinstance(exc, Http404):
+        exc = exceptions.NotFound(*exc.args)
+    headers = {}
+    if getattr(exc, "auth_header", None):
+        headers["WWW-Authenticate"] = exc.auth_header
+    if getattr(exc, "wait", None):
+        headers["Retry-After"] = "%d" % exc.wait
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {"detail": exc.detail}
+    return json_response(data, status=exc.status_code, headers=headers)
+
+
+def async_api_view(fallback=None, login_required=False):
+    """
+    Декоратор асинхронного представления.
+    GET и HEAD обрабатываются декорируемой функцией после аутентификации
+    по токену, прочие методы передаются синхронному представлению
+    ``fallback``.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def view(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                if fallback is None:
+                    return HttpResponseNotAllowed(SAFE_METHODS)
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+            authentication = CachedTokenAuthentication()
+            try:
+                result = await authentication.aauthenticate(request)
+                request.user = result[0] if result else AnonymousUser()
+                if login_required and not request.user.is_authenticated:
+                    exc = exceptions.NotAuthenticated()
+                    exc.auth_header = authentication.authenticate_header(
+                        request
+                    )
+                    raise exc
+                return await func(request, *args, **kwargs)
+            except exceptions.AuthenticationFailed as exc:
+                exc.auth_header = authentication.authenticate_header(request)
+                return exception_response(exc)
+            except (exceptions.APIException, Http404) as exc:
+                return exception_response(exc)
+
+        view.csrf_exempt = True
+        return view
+
+    return decorator
+
+
+async def apaginate(queryset, request, pagination_class, fetch_page):
+    """
+    Асинхронный аналог PageNumberPagination.paginate_queryset.
+    ``fetch_page`` получает срез queryset и возвращает элементы страницы.
+    Запросы async ORM выполняются в общем синхронном потоке по одному,
+    поэтому подсчёт строк и выборка страницы идут друг за другом.
+    Возвращает пагинатор DRF (для ссылок) и элементы страницы.
+    """
+    request = Request(request)
+    pagination = pagination_class()
+    page_size = pagination.get_page_size(request)
+    paginator = Paginator(queryset, page_size)
+    page_number = request.query_params.get(pagination.page_query_param) or 1
+    try:
+        if page_number in pagination.last_page_strings:
+            paginator.__dict__["count"] = await queryset.acount()
+            page_number = paginator.num_pages
+        elif not str(page_number).isdigit() or int(page_number) < 1:
+            # Ошибка формата номера страницы не требует подсчёта строк
+            paginator.validate_number(page_number)
+        number = int(page_number)
+        bottom = (number - 1) * page_size
+        paginator.__dict__["count"] = await queryset.acount()
+        items = await fetch_page(queryset[bottom:bottom + page_size])
+        pagination.page = paginator.page(number)
+    except InvalidPage as exc:
+        raise exceptions.NotFound(
+            pagination.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+        )
+    pagination.request = request
+    return pagination, items
+
+
+def paginated_data(pagination, results):
+    """Тело ответа в формате PageNumberPagination.get_paginated_response."""
+    return {
+        "count": pagination.page.paginator.count,
+        "next": pagination.get_next_link(),
+        "previous": pagination.get_previous_link(),
+        "results": results,
+    }
@@ -0,0 +1,203 @@
+"""
+Нагрузочный прогон эндпоинтов внутри процесса.
+
+Запросы выполняет django.test.Client через полный стек middleware без
+сети, несколько потоков на эндпоинт. Для каждого эндпоинта считаются
+перцентили задержки и число SQL-запросов на запрос. Отчёт — JSON,
+который можно сравнить с отчётом другого коммита (compare).
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import django
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+PERCENTILES = (50, 95, 99)
+
+
+class Endpoint(NamedTuple):
+    name: str
+    method: str
+    path: str
+    authenticated: bool = False
+    data: object = None
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[rank - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Сведения о ревизии и окружении для отчёта."""
+    return {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def summarize(latencies, statuses, elapsed):
+    """Пропускная способность, задержки (мс) и статусы одной серии."""
+    return {
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        **{
+            f"p{percent}_ms": round(percentile(latencies, percent) * 1000, 3)
+            for percent in PERCENTILES
+        },
+        "statuses": {
+            str(status): count for status, count in sorted(
+                statuses.items(), key=lambda item: str(item[0])
+            )
+        },
+    }
+
+
+class Runner:
+    """
+    Выполняет ``requests`` запросов к каждому эндпоинту в ``concurrency``
+    потоков после ``warmup`` прогревочных. Запросы с authenticated=True
+    отправляются с токеном ``token``.
+    """
+
+    def __init__(
+        self, requests=200, concurrency=4, warmup=5, token=None,
+        host="localhost",
+    ):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.token = token
+        self.host = host
+
+    def client(self, endpoint):
+        headers = {"HTTP_HOST": self.host}
+        if endpoint.authenticated:
+            headers["HTTP_AUTHORIZATION"] = f"Token {self.token}"
+        return Client(**headers)
+
+    def call(self, client, endpoint):
+        method = getattr(client, endpoint.method.lower())
+        if endpoint.data is None:
+            return method(endpoint.path)
+        return method(
+            endpoint.path, json.dumps(endpoint.data),
+            content_type="application/json",
+        )
+
+    def worker(self, endpoint, count):
+        """Задержки (с), число запросов к базе и статусы ответов потока."""
+        client = self.client(endpoint)
+        latencies, queries, statuses = [], [], Counter()
+        try:
+            for _ in range(count):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = self.call(client, endpoint)
+                    latencies.append(time.perf_counter() - started)
+                queries.append(len(captured))
+                statuses[response.status_code] += 1
+        finally:
+            # Соединения потока возвращаются в пул
+            connections.close_all()
+        return latencies, queries, statuses
+
+    def measure(self, endpoint):
+        for _ in range(self.warmup):
+            self.call(self.client(endpoint), endpoint)
+        shares = [
+            self.requests // self.concurrency
+            + (index < self.requests % self.concurrency)
+            for index in range(self.concurrency)
+        ]
+        latencies, queries, statuses = [], [], Counter()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            for result in executor.map(
+                lambda share: self.worker(endpoint, share), shares
+            ):
+                latencies += result[0]
+                queries += result[1]
+                statuses += result[2]
+        elapsed = time.perf_counter() - started
+        return {
+            "method": endpoint.method,
+            "path": endpoint.path,
+            **summarize(latencies, statuses, elapsed),
+            "queries_per_request": round(statistics.fmean(queries), 2),
+            "max_queries": max(queries),
+        }
+
+    def run(self, endpoints, meta=None):
+        return {
+            "meta": {
+                **environment(),
+                "requests": self.requests,
+                "concurrency": self.concurrency,
+                "warmup": self.warmup,
+                **(meta or {}),
+            },
+            "endpoints": {
+                endpoint.name: self.measure(endpoint)
+                for endpoint in endpoints
+            },
+        }
+
+
+def compare(old, new, fields=("p50_ms", "p95_ms", "p99_ms",
+                              "queries_per_request"), section="endpoints"):
+    """Строки сравнения двух отчётов по общим эндпоинтам."""
+    lines = []
+    for name, current in new[section].items():
+        previous = old[section].get(name)
+        if previous is None:
+            lines.append(f"{name}: new endpoint")
+            continue
+        changes = []
+        for field in fields:
+            before, after = previous[field], current[field]
+            change = (
+                f"{(after - before) / before * 100:+.0f}%" if before else "n/a"
+            )
+            changes.append(f"{field} {before} -> {after} ({change})")
+        lines.append(f"{name}: " + ", ".join(changes))
+    return lines
+
+
+def regressions(old, new, field="p95_ms", threshold=20, section="endpoints"):
+    """Эндпоинты, у которых ``field`` вырос больше чем на ``threshold`` %."""
+    return [
+        name for name, current in new[section].items()
+        if name in old[section]
+        and old[section][name][field]
+        and current[field] > old[section][name][field] * (
+            1 + threshold / 100
+        )
+    ]
@@ -0,0 +1,83 @@
+"""
+Заголовки кеширования ответов API для обратного прокси (infra/nginx.conf).
+
+HttpCacheMiddleware помечает успешные ответы на анонимные GET и HEAD
+как ``public`` с MAX_AGE и STALE_WHILE_REVALIDATE, а все прочие ответы
+API — как ``private, no-cache``. Каждый ответ API получает
+``Vary: Authorization, Accept``, чтобы прокси не отдал ответ одного
+пользователя другому. Запросы, закреплённые за основной базой после
+записи (config.replicas), считаются персональными.
+
+Стандартный nginx не умеет сбрасывать кеш по запросу, поэтому записи
+прокси не сбрасываются, а устаревают: после изменения содержимого прокси
+отдаёт прежний ответ не дольше MAX_AGE + STALE_WHILE_REVALIDATE секунд,
+а бэкенд — не дольше GENERATION_CHECK_INTERVAL кеша ответов
+(api.response_cache). Итоговую границу возвращает max_staleness.
+"""
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from config.replicas import PIN_COOKIE
+from . import response_cache
+
+#: Настройки по умолчанию, переопределяются словарём HTTP_CACHE
+DEFAULTS = {
+    "PATH_PREFIX": "/api/",
+    "MAX_AGE": 10,
+    "STALE_WHILE_REVALIDATE": 30,
+}
+VARY = ("Authorization", "Accept")
+
+
+def get_setting(name):
+    return getattr(settings, "HTTP_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def is_public(request, response):
+    """Можно ли отдать ответ из общего кеша любому анонимному клиенту."""
+    user = getattr(request, "user", None)
+    return (
+        request.method in ("GET", "HEAD")
+        and response.status_code == 200
+        and "HTTP_AUTHORIZATION" not in request.META
+        and PIN_COOKIE not in request.COOKIES
+        and not response.cookies
+        and not (user is not None and user.is_authenticated)
+    )
+
+
+def max_staleness():
+    """
+    Сколько секунд после изменения содержимого анонимный клиент может
+    получать прежний ответ.
+    """
+    return (
+        get_setting("MAX_AGE")
+        + get_setting("STALE_WHILE_REVALIDATE")
+        + response_cache.get_setting("GENERATION_CHECK_INTERVAL")
+    )
+
+
+class HttpCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not request.path.startswith(get_setting("PATH_PREFIX")):
+            return response
+        patch_vary_headers(response, VARY)
+        if response.has_header("Cache-Control"):
+            # Представление выбрало политику кеширования само
+            return response
+        if is_public(request, response):
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=get_setting("MAX_AGE"),
+                stale_while_revalidate=get_setting("STALE_WHILE_REVALIDATE"),
+            )
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,410 @@
+"""
+Нагрузочный сценарий из Postman-коллекции.
+
+Коллекция postman_collection/foodgram.postman_collection.json описывает
+путь пользователя по API: регистрация, токены, рецепты, избранное,
+корзина, подписки. Каждый виртуальный пользователь под своими именем
+и почтой проходит начало коллекции по порядку — до последнего запроса,
+сохраняющего переменную (setup). Затем до конца прогона он выбирает
+запросы коллекции случайно с весами и отправляет их на сервер по HTTP
+через постоянное соединение.
+
+Переменные, которые коллекция сохраняет скриптами тестов
+(pm.collectionVariables.set), извлекаются из JSON ответа по тем же
+выражениям; остальной JavaScript не выполняется.
+"""
+
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import NamedTuple
+from urllib.parse import quote, urlsplit
+
+from api.benchmark import environment, summarize
+
+#: Префикс имён виртуальных пользователей (для удаления после прогона)
+USER_PREFIX = "replay-"
+
+#: Переменные коллекции, уникальные для каждого виртуального пользователя
+UNIQUE_VARIABLES = (
+    "username", "email", "secondUserUsername", "secondUserEmail",
+    "thirdUserUsername", "thirdUserEmail",
+)
+
+#: Веса запросов по умолчанию: (шаблон "МЕТОД путь/имя", вес), действует
+#: первый подходящий. Выход, смена пароля и удаление рецептов ломают
+#: состояние пользователя, повторная регистрация бессмысленна: эти
+#: запросы выполняются только в setup
+WEIGHTS = (
+    ("* */create_users/*", 0),
+    ("* */logout/*", 0),
+    ("* */reset_password/*", 0),
+    ("* delete_requests/recipes/*", 0),
+    ("* *bad_requests*", 1),
+    ("GET *", 10),
+    ("*", 2),
+)
+
+VARIABLE = re.compile(r"\{\{(\w+)\}\}")
+GET_ALIAS = re.compile(
+    r"const (\w+) = _\.get\(responseData, [\"']([\w.\[\]]+)[\"']\)"
+)
+SET_VARIABLE = re.compile(
+    r"pm\.collectionVariables\.set\([\"'](\w+)[\"'],\s*(.+)\);?\s*$"
+)
+EXPRESSION = re.compile(
+    r"responseData((?:\[\d+\]|\.\w+)*?)(?:\.slice\(0,\s*(\d+)\))?$"
+)
+KEY = re.compile(r"\[(\d+)\]|\.?(\w+)")
+
+
+class Capture(NamedTuple):
+    variable: str
+    keys: tuple
+    length: int = None
+
+
+class Step(NamedTuple):
+    name: str
+    method: str
+    url: str
+    headers: dict
+    body: str = None
+    captures: tuple = ()
+
+
+def parse_keys(path):
+    """Ключи пути вида ``[0].name`` или ``id``."""
+    return tuple(
+        int(index) if index else key
+        for index, key in KEY.findall(path)
+    )
+
+
+def parse_captures(script):
+    """Переменные, которые скрипт теста сохраняет из ответа."""
+    aliases = {}
+    captures = []
+    for line in script:
+        line = line.strip()
+        alias = GET_ALIAS.search(line)
+        if alias:
+            aliases[alias[1]] = Capture(None, parse_keys(alias[2]))
+            continue
+        assignment = SET_VARIABLE.search(line)
+        if not assignment:
+            continue
+        variable, expression = assignment[1], assignment[2].strip()
+        if expression in aliases:
+            captures.append(aliases[expression]._replace(variable=variable))
+            continue
+        match = EXPRESSION.match(expression)
+        if match:
+            captures.append(Capture(
+                variable, parse_keys(match[1]),
+                int(match[2]) if match[2] else None,
+            ))
+    return tuple(captures)
+
+
+def extract(data, capture):
+    """Значение по пути захвата или None, если его в ответе нет."""
+    for key in capture.keys:
+        try:
+            data = data[key]
+        except (KeyError, IndexError, TypeError):
+            return None
+    if data is not None and capture.length is not None:
+        data = str(data)[:capture.length]
+    return data
+
+
+def auth_headers(auth):
+    if not auth or auth.get("type") != "apikey":
+        return {}
+    options = {item["key"]: item["value"] for item in auth["apikey"]}
+    if options.get("in", "header") != "header":
+        return {}
+    return {options["key"]: options["value"]}
+
+
+def load_collection(path):
+    """Запросы коллекции по порядку и её переменные."""
+    with open(path, encoding="utf-8") as file:
+        collection = json.load(file)
+    variables = {
+        variable["key"]: variable["value"]
+        for variable in collection.get("variable", [])
+    }
+    steps = []
+
+    def walk(items, folder, auth):
+        for item in items:
+            # Без собственной авторизации действует авторизация папки
+            item_auth = item.get("auth") or item.get("request", {}).get(
+                "auth"
+            ) or auth
+            name = f"{folder}{item['name']}"
+            if "item" in item:
+                walk(item["item"], f"{name}/", item_auth)
+                continue
+            request = item["request"]
+            headers = {
+                header["key"]: header["value"]
+                for header in request.get("header", [])
+                if not header.get("disabled")
+            }
+            headers.update(auth_headers(item_auth))
+            body = request.get("body") or {}
+            if body.get("mode") == "raw":
+                body = body["raw"]
+                headers.setdefault("Content-Type", "application/json")
+            else:
+                body = None
+            url = request["url"]
+            steps.append(Step(
+                name=name,
+                method=request["method"],
+                url=url["raw"] if isinstance(url, dict) else url,
+                headers=headers,
+                body=body,
+                captures=tuple(
+                    capture
+                    for event in item.get("event", [])
+                    if event["listen"] == "test"
+                    for capture in parse_captures(event["script"]["exec"])
+                ),
+            ))
+
+    walk(collection["item"], "", collection.get("auth"))
+    return steps, variables
+
+
+def weight(step, weights):
+    label = f"{step.method} {step.name}"
+    for pattern, value in weights:
+        if fnmatchcase(label, pattern):
+            return value
+    return 1
+
+
+class Scenario:
+    """
+    Запросы setup (по порядку, один раз) и взвешенная смесь запросов.
+    ``weights`` проверяются раньше весов по умолчанию WEIGHTS.
+    """
+
+    def __init__(self, steps, variables, weights=()):
+        last = max(
+            (index for index, step in enumerate(steps) if step.captures),
+            default=-1,
+        )
+        self.setup = steps[:last + 1]
+        self.variables = variables
+        self.weights = tuple(weights) + WEIGHTS
+        self.mix = []
+        self.mix_weights = []
+        for step in steps:
+            value = weight(step, self.weights)
+            if value > 0:
+                self.mix.append(step)
+                self.mix_weights.append(value)
+
+    @classmethod
+    def from_collection(cls, path, weights=()):
+        return cls(*load_collection(path), weights)
+
+
+def unique(value, tag):
+    """Значение переменной с меткой пользователя (строка в кавычках JSON)."""
+    if value.startswith('"'):
+        return f'"{tag}{value[1:]}'
+    return f"{tag}{value}"
+
+
+class VirtualUser:
+    """Переменные, соединение и замеры одного виртуального пользователя."""
+
+    def __init__(self, variables, base_url, tag, timeout):
+        self.variables = {
+            **variables,
+            **{
+                name: unique(variables[name], tag)
+                for name in UNIQUE_VARIABLES if name in variables
+            },
+            "baseUrl": base_url,
+        }
+        self.timeout = timeout
+        self.connection = None
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def render(self, text):
+        return VARIABLE.sub(
+            lambda match: str(self.variables.get(match[1], match[0])), text
+        )
+
+    def open(self, url):
+        if self.connection is None:
+            connection_class = (
+                http.client.HTTPSConnection if url.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            self.connection = connection_class(
+                url.netloc, timeout=self.timeout
+            )
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def send(self, step):
+        """Выполняет запрос, сохраняет переменные и записывает замер."""
+        url = urlsplit(self.render(step.url))
+        path = f"{url.path}?{url.query}" if url.query else url.path
+        # Значения переменных в адресе кодируются, как это делает Postman
+        path = quote(path, safe="/?&=%+:,;@")
+        body = self.render(step.body).encode() if step.body else None
+        headers = {
+            key: self.render(value) for key, value in step.headers.items()
+        }
+        started = time.perf_counter()
+        try:
+            connection = self.open(url)
+            connection.request(step.method, path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            status, content = "error", b""
+        else:
+            status = response.status
+        self.latencies[step.name].append(time.perf_counter() - started)
+        self.statuses[step.name][status] += 1
+        if step.captures and content:
+            try:
+                data = json.loads(content)
+            except ValueError:
+                return
+            for capture in step.captures:
+                value = extract(data, capture)
+                if value is not None:
+                    self.variables[capture.variable] = value
+
+
+class LoadReplay:
+    """
+    ``users`` виртуальных пользователей в отдельных потоках выполняют
+    сценарий ``duration`` секунд или по ``iterations`` запросов смеси.
+    """
+
+    def __init__(
+        self, scenario, base_url, users=20, duration=30, iterations=None,
+        seed=49, timeout=10,
+    ):
+        self.scenario = scenario
+        self.base_url = base_url.rstrip("/")
+        self.users = users
+        self.duration = duration
+        self.iterations = iterations
+        self.seed = seed
+        self.timeout = timeout
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def virtual_user(self, index, run, barrier):
+        user = VirtualUser(
+            self.scenario.variables, self.base_url,
+            f"{USER_PREFIX}{run}-{index}-", self.timeout,
+        )
+        rand = random.Random(self.seed + index)
+        try:
+            for step in self.scenario.setup:
+                user.send(step)
+            setup = user.statuses
+            user.latencies, user.statuses = defaultdict(list), defaultdict(
+                Counter
+            )
+            # Смесь начинается одновременно у всех, когда setup пройден
+            barrier.wait()
+            deadline = self.started + self.duration
+            sent = 0
+            while self.scenario.mix and (
+                sent < self.iterations if self.iterations is not None
+                else time.perf_counter() < deadline
+            ):
+                user.send(rand.choices(
+                    self.scenario.mix, self.scenario.mix_weights
+                )[0])
+                sent += 1
+        except BaseException:
+            barrier.abort()
+            raise
+        finally:
+            user.close()
+        return setup, user.latencies, user.statuses
+
+    def run(self, meta=None):
+        run = uuid.uuid4().hex[:6]
+        barrier = threading.Barrier(self.users, action=self.start)
+        with ThreadPoolExecutor(self.users) as executor:
+            futures = [
+                executor.submit(self.virtual_user, index, run, barrier)
+                for index in range(self.users)
+            ]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - self.started
+        setup, statuses = defaultdict(Counter), defaultdict(Counter)
+        latencies = defaultdict(list)
+        for setup_statuses, step_latencies, step_statuses in results:
+            for name, counter in setup_statuses.items():
+                setup[name] += counter
+            for name, values in step_latencies.items():
+                latencies[name] += values
+                statuses[name] += step_statuses[name]
+        weights = dict(zip(
+            (step.name for step in self.scenario.mix),
+            self.scenario.mix_weights,
+        ))
+        return {
+            "meta": {
+                **environment(),
+                "base_url": self.base_url,
+                "users": self.users,
+                "duration": self.duration,
+                "iterations": self.iterations,
+                "seed": self.seed,
+                "elapsed_s": round(elapsed, 3),
+                "requests": sum(map(len, latencies.values())),
+                "throughput_rps": round(
+                    sum(map(len, latencies.values())) / elapsed, 1
+                ),
+                **(meta or {}),
+            },
+            "setup": {
+                name: {
+                    str(status): count
+                    for status, count in sorted(
+                        counter.items(), key=lambda item: str(item[0])
+                    )
+                }
+                for name, counter in setup.items()
+            },
+            "endpoints": {
+                name: {
+                    "weight": weights[name],
+                    **summarize(latencies[name], statuses[name], elapsed),
+                }
+                for name in weights if name in latencies
+            },
+        }
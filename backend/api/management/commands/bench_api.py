@@ -0,0 +1,164 @@
+# Стандартные библиотеки
+import json
+import random
+from urllib.parse import quote
+
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+# Локальные импорты
+from api.benchmark import Endpoint, Runner, compare
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every read endpoint in-process at a given concurrency "
+        "and write p50/p95/p99 latency and queries per request to a JSON "
+        "report (generate data first with generate_data)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--seed", type=int, default=48,
+            help="Seed for choosing the recipe, author and reader",
+        )
+        parser.add_argument(
+            "--output", default=None,
+            help="Report path (default: print to stdout)",
+        )
+        parser.add_argument(
+            "--compare", default=None, metavar="REPORT",
+            help="Print changes against an earlier report",
+        )
+        parser.add_argument(
+            "--no-response-cache", action="store_true",
+            help="Disable the anonymous response cache",
+        )
+        parser.add_argument(
+            "--only", action="append", default=None,
+            help="Run only endpoints with this name (repeatable)",
+        )
+        parser.add_argument("--host", default="localhost")
+
+    def fixtures(self, seed):
+        """Рецепт, автор, ингредиент и читатель для адресов эндпоинтов."""
+        rand = random.Random(seed)
+        # Популярные объекты: к ним приходит основная часть запросов
+        recipes = list(Recipe.objects.order_by(
+            "-favorites_count", "id"
+        ).values_list("id", flat=True)[:20])
+        authors = list(User.objects.order_by(
+            "-subscribers_count", "id"
+        ).values_list("id", flat=True)[:20])
+        readers = list(User.objects.filter(
+            id__in=Subscription.objects.values("user_id"),
+        ).filter(
+            id__in=Favorite.objects.values("user_id"),
+        ).filter(
+            id__in=ShoppingCart.objects.values("user_id"),
+        ).order_by("id").values_list("id", flat=True)[:20])
+        ingredient = Ingredient.objects.order_by("name").first()
+        if not (recipes and authors and readers and ingredient):
+            raise CommandError(
+                "Not enough data: run generate_data first"
+            )
+        recipe = Recipe.objects.get(pk=rand.choice(recipes))
+        reader = User.objects.get(pk=rand.choice(readers))
+        token, _ = Token.objects.get_or_create(user=reader)
+        return recipe, rand.choice(authors), ingredient, token.key
+
+    def endpoints(self, recipe, author, ingredient):
+        recipes = reverse("recipe-list")
+        users = reverse("user-list")
+        detail = reverse("recipe-detail", args=[recipe.id])
+        word = recipe.name.split()[0]
+        prefix = quote(ingredient.name[:3])
+        ingredients = reverse("ingredient-list")
+        anonymous = [
+            ("recipes", recipes),
+            ("recipes_by_author", f"{recipes}?author={author}"),
+            ("recipes_search", f"{recipes}?search={quote(word)}"),
+            ("recipes_trending", reverse("recipe-trending")),
+            ("recipe", detail),
+            ("recipe_related", reverse("recipe-related", args=[recipe.id])),
+            ("recipe_similar", reverse("recipe-similar", args=[recipe.id])),
+            ("ingredients", f"{ingredients}?name={prefix}"),
+            ("ingredient", reverse("ingredient-detail", args=[ingredient.id])),
+            ("users", users),
+            ("user", reverse("user-detail", args=[author])),
+        ]
+        authenticated = [
+            ("auth_recipes", recipes),
+            ("auth_recipes_favorited", f"{recipes}?is_favorited=1"),
+            ("auth_recipes_in_cart", f"{recipes}?is_in_shopping_cart=1"),
+            ("auth_recipe", detail),
+            ("auth_feed", reverse("recipe-feed")),
+            ("auth_shopping_cart",
+             reverse("recipe-download-shopping-cart")),
+            ("auth_me", reverse("user-me")),
+            ("auth_subscriptions",
+             f"{reverse('user-subscriptions')}?recipes_limit=3"),
+        ]
+        return [
+            Endpoint(name, "GET", path) for name, path in anonymous
+        ] + [
+            Endpoint(name, "GET", path, authenticated=True)
+            for name, path in authenticated
+        ]
+
+    def handle(self, *args, **options):
+        recipe, author, ingredient, token = self.fixtures(options["seed"])
+        endpoints = self.endpoints(recipe, author, ingredient)
+        if options["only"]:
+            endpoints = [
+                endpoint for endpoint in endpoints
+                if endpoint.name in options["only"]
+            ]
+        runner = Runner(
+            requests=options["requests"],
+            concurrency=options["concurrency"],
+            warmup=options["warmup"],
+            token=token,
+            host=options["host"],
+        )
+        meta = {
+            "seed": options["seed"],
+            "response_cache": not options["no_response_cache"],
+            "dataset": {
+                model.__name__: model.objects.count()
+                for model in (
+                    User, Recipe, Ingredient, Favorite, ShoppingCart,
+                    Subscription,
+                )
+            },
+        }
+        if options["no_response_cache"]:
+            with override_settings(RESPONSE_CACHE={"ENABLED": False}):
+                report = runner.run(endpoints, meta)
+        else:
+            report = runner.run(endpoints, meta)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        for name, result in report["endpoints"].items():
+            self.stderr.write(
+                f"{name}: p50 {result['p50_ms']} ms, "
+                f"p95 {result['p95_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['queries_per_request']} queries"
+            )
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)
+            for line in compare(previous, report):
+                self.stdout.write(line)
@@ -0,0 +1,130 @@
+# Стандартные библиотеки
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+# Локальные импорты
+from api.renderers import FastJSONRenderer, orjson
+from recipes.serializers.projections import (
+    ingredient_data,
+    recipe_data,
+    user_data,
+)
+
+WORDS = (
+    "борщ", "свёкла", "капуста", "картофель", "морковь", "лук", "чеснок",
+    "сметана", "говядина", "томатная", "паста", "соль", "перец", "варить",
+    "нарезать", "обжарить", "добавить", "подавать", "горячим", "зеленью",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare encode time of the standard and the fast JSON renderer "
+        "on recipe list pages shaped like API responses"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=200)
+        parser.add_argument(
+            "--page-size", type=int, action="append", dest="page_sizes",
+            help="Recipes per page (repeatable, default: 6 and 100)",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def text(self, rand, words):
+        return " ".join(rand.choices(WORDS, k=words)).capitalize()
+
+    def recipe(self, rand, recipe_id, native):
+        author_id = rand.randint(1, 1000)
+        author = user_data({
+            "id": author_id,
+            "username": f"user{author_id}",
+            "first_name": "Иван",
+            "last_name": "Петров",
+            "email": f"user{author_id}@example.com",
+            "avatar": f"users/avatars/{author_id}.png",
+        }, rand.random() < 0.3, None)
+        ingredients = [
+            ingredient_data({
+                "ingredient_id": rand.randint(1, 2000),
+                "ingredient__name": self.text(rand, 2),
+                "ingredient__measurement_unit": "г",
+                "amount": rand.randint(1, 1000),
+            })
+            for _ in range(rand.randint(3, 15))
+        ]
+        created_at = timezone.now() - timedelta(minutes=recipe_id)
+        data = recipe_data({
+            "id": recipe_id,
+            "name": self.text(rand, 3),
+            "image": f"recipes/images/{recipe_id}.png",
+            "text": self.text(rand, 60),
+            "cooking_time": rand.randint(5, 240),
+            "created_at": created_at,
+            "favorites_count": rand.randint(0, 5000),
+        }, author, rand.random() < 0.2, rand.random() < 0.1, ingredients,
+            None)
+        if native:
+            # Значения, которые кодировщик получает без сериализатора
+            data["created_at"] = created_at
+            data["rating"] = Decimal(rand.randint(0, 500)) / 100
+        return data
+
+    def pages(self, rand, count, size, native):
+        return [
+            {
+                "count": count * size,
+                "next": f"http://localhost/api/recipes/?page={page + 2}",
+                "previous": None,
+                "results": [
+                    self.recipe(rand, page * size + index + 1, native)
+                    for index in range(size)
+                ],
+            }
+            for page in range(count)
+        ]
+
+    def measure(self, renderer, pages, repeat):
+        """Лучшее из repeat время кодирования всех страниц."""
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for page in pages:
+                renderer.render(page)
+            best = min(best, time.perf_counter() - started)
+        return best
+
+    def handle(self, *args, **options):
+        encoder = f"orjson {orjson.__version__}" if orjson else "not installed"
+        self.stdout.write(f"fast encoder: {encoder}")
+        for size in options["page_sizes"] or [6, 100]:
+            for native in (False, True):
+                pages = self.pages(
+                    random.Random(options["seed"]), options["pages"],
+                    size, native,
+                )
+                if JSONRenderer().render(pages[0]) != (
+                    FastJSONRenderer().render(pages[0])
+                ):
+                    raise CommandError("Renderers produce different JSON")
+                standard = self.measure(
+                    JSONRenderer(), pages, options["repeat"]
+                )
+                fast = self.measure(
+                    FastJSONRenderer(), pages, options["repeat"]
+                )
+                label = "native types" if native else "serialized"
+                self.stdout.write(
+                    f"page size {size}, {label}: "
+                    f"json {standard / len(pages) * 1e6:.0f} us/page, "
+                    f"fast {fast / len(pages) * 1e6:.0f} us/page, "
+                    f"x{standard / fast:.1f}"
+                )
@@ -0,0 +1,267 @@
+# Стандартные библиотеки
+import json
+import random
+
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+# Локальные импорты
+from api.benchmark import compare, regressions
+from api.microbench import Case, MicroBenchmark
+from recipes.filters import IngredientFilter
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from recipes.serializers.recipe_read import RecipeReadSerializer
+from recipes.serializers.recipe_write import RecipeWriteSerializer
+from recipes.views import shopping_list_text
+from users.models import User
+from users.serializers import UserSerializer
+
+WORDS = (
+    "мука", "соль", "сахар", "молоко", "яйцо", "масло", "лук", "морковь",
+    "картофель", "капуста", "свёкла", "чеснок", "перец", "сметана",
+    "говядина", "курица", "рис", "гречка", "томат", "укроп",
+)
+UNITS = ("г", "кг", "мл", "л", "шт.", "ст. л.", "ч. л.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark serializers, the ingredient filter and the "
+        "shopping list text on fixed seeded fixtures (warmup, rounds, "
+        "median and spread per call) and write a JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rounds", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--iterations", type=int, default=None,
+            help="Calls per round (default: calibrate to --min-time)",
+        )
+        parser.add_argument(
+            "--min-time", type=float, default=0.02,
+            help="Minimal round duration in seconds for calibration",
+        )
+        parser.add_argument("--seed", type=int, default=50)
+        parser.add_argument(
+            "--page-size", type=int, default=6,
+            help="Recipes serialized per call",
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe", type=int, default=10,
+        )
+        parser.add_argument(
+            "--users", type=int, default=100,
+            help="Users serialized per call",
+        )
+        parser.add_argument(
+            "--cart-items", type=int, default=50,
+            help="Lines of the shopping list",
+        )
+        parser.add_argument(
+            "--host", default="localhost",
+            help="Host of absolute image URLs",
+        )
+        parser.add_argument(
+            "--only", action="append", default=None,
+            help="Run only benchmarks with this name (repeatable)",
+        )
+        parser.add_argument(
+            "--output", default=None,
+            help="Report path (default: print to stdout)",
+        )
+        parser.add_argument(
+            "--compare", default=None, metavar="REPORT",
+            help="Print changes against an earlier report",
+        )
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            metavar="PERCENT",
+            help="Fail if the median of a benchmark grew more than this "
+                 "against --compare",
+        )
+
+    def text(self, rand, words):
+        return " ".join(rand.choices(WORDS, k=words)).capitalize()
+
+    def user(self, rand, user_id):
+        return User(
+            id=user_id,
+            username=f"user{user_id}",
+            email=f"user{user_id}@example.com",
+            first_name="Иван",
+            last_name="Петров",
+            avatar=(
+                f"users/avatars/{user_id}.png" if rand.random() < 0.5 else ""
+            ),
+        )
+
+    def database_fixtures(self, rand, options):
+        """
+        Рецепты с ингредиентами, избранным и корзиной читателя.
+        bulk_create не вызывает сигналы: кеши и индексы не меняются.
+        """
+        per_recipe = options["ingredients_per_recipe"]
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(
+                name=f"бенчмарк {self.text(rand, 2)} {index}",
+                measurement_unit=rand.choice(UNITS),
+            )
+            for index in range(per_recipe * 4)
+        ])
+        author, reader = User.objects.bulk_create([
+            User(
+                username=f"bench-{role}-{options['seed']}",
+                email=f"bench-{role}-{options['seed']}@example.com",
+                first_name="Иван", last_name="Петров",
+            )
+            for role in ("author", "reader")
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                author=author,
+                name=self.text(rand, 2),
+                image=f"recipes/images/{index}.png",
+                text=self.text(rand, 40),
+                cooking_time=rand.randint(5, 240),
+            )
+            for index in range(options["page_size"])
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient,
+                amount=rand.randint(1, 1000),
+            )
+            for recipe in recipes
+            for ingredient in rand.sample(ingredients, per_recipe)
+        ])
+        Favorite.objects.bulk_create([
+            Favorite(user=reader, recipe=recipe) for recipe in recipes[::2]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=reader, recipe=recipe)
+            for recipe in recipes[1::2]
+        ])
+        request = Request(APIRequestFactory().get(
+            "/api/recipes/", HTTP_HOST=options["host"]
+        ))
+        request.user = reader
+        return ingredients, author, request
+
+    def cases(self, options):
+        rand = random.Random(options["seed"])
+        ingredients, author, request = self.database_fixtures(rand, options)
+        recipes = list(Recipe.objects.filter(
+            author=author
+        ).select_related("author").order_by("id"))
+        payload = [
+            {"id": ingredient.id, "amount": rand.randint(1, 1000)}
+            for ingredient in rand.sample(
+                ingredients, options["ingredients_per_recipe"]
+            )
+        ]
+        write = RecipeWriteSerializer(context={"request": request})
+        # Пользователи в памяти: подписку даёт аннотация, как в UserViewSet
+        users = []
+        for user_id in range(1, options["users"] + 1):
+            user = self.user(rand, user_id)
+            user.subscribed = rand.random() < 0.3
+            users.append(user)
+        ingredient_queryset = Ingredient.objects.order_by("name")
+        rows = [
+            {
+                "recipe__ingredients__name": self.text(rand, 2),
+                "recipe__ingredients__measurement_unit": rand.choice(UNITS),
+                "amount": rand.randint(1, 5000),
+            }
+            for _ in range(options["cart_items"])
+        ]
+
+        def filter_ingredients():
+            queryset = IngredientFilter(
+                {"name": "мук"}, queryset=ingredient_queryset
+            ).qs
+            # Сборка SQL без обращения к базе
+            return queryset.query.get_compiler(queryset.db).as_sql()
+
+        return [
+            Case("recipe_read_serializer", lambda: RecipeReadSerializer(
+                recipes, many=True, context={"request": request}
+            ).data),
+            Case(
+                "recipe_write_validate_ingredients",
+                lambda: write.validate_ingredients(payload),
+            ),
+            Case("user_serializer", lambda: UserSerializer(
+                users, many=True, context={"request": request}
+            ).data),
+            Case("ingredient_filter", filter_ingredients),
+            Case("shopping_list_text", lambda: shopping_list_text(rows)),
+        ]
+
+    def handle(self, *args, **options):
+        if options["max_regression"] is not None and not options["compare"]:
+            raise CommandError("--max-regression requires --compare")
+        benchmark = MicroBenchmark(
+            rounds=options["rounds"],
+            warmup=options["warmup"],
+            iterations=options["iterations"],
+            min_time=options["min_time"],
+        )
+        meta = {
+            "seed": options["seed"],
+            "fixtures": {
+                name: options[name] for name in (
+                    "page_size", "ingredients_per_recipe", "users",
+                    "cart_items",
+                )
+            },
+        }
+        # Фикстуры в базе живут только в транзакции бенчмарка
+        with transaction.atomic():
+            cases = self.cases(options)
+            if options["only"]:
+                cases = [
+                    case for case in cases if case.name in options["only"]
+                ]
+            report = benchmark.run(cases, meta)
+            transaction.set_rollback(True)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        for name, result in report["benchmarks"].items():
+            self.stderr.write(
+                f"{name}: median {result['median_us']} us, "
+                f"IQR {result['iqr_us']} us, "
+                f"{result['queries']} queries"
+            )
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)
+            for line in compare(
+                previous, report, fields=("median_us", "iqr_us", "queries"),
+                section="benchmarks",
+            ):
+                self.stdout.write(line)
+            if options["max_regression"] is not None:
+                slower = regressions(
+                    previous, report, "median_us",
+                    options["max_regression"], section="benchmarks",
+                )
+                if slower:
+                    raise CommandError(
+                        "Median grew more than "
+                        f"{options['max_regression']}%: " + ", ".join(slower)
+                    )
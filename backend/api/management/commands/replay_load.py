@@ -0,0 +1,132 @@
+# Стандартные библиотеки
+import json
+
+# Сторонние библиотеки
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Локальные импорты
+from api.benchmark import compare, regressions
+from api.load_replay import USER_PREFIX, LoadReplay, Scenario
+from users.models import User
+
+COLLECTION = (
+    settings.BASE_DIR.parent / "postman_collection"
+    / "foodgram.postman_collection.json"
+)
+
+
+def weight_option(value):
+    pattern, _, weight = value.rpartition("=")
+    try:
+        return pattern, int(weight)
+    except ValueError:
+        raise CommandError(f"Expected PATTERN=WEIGHT, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the Postman collection as a weighted load scenario with "
+        "many virtual users against a running server and write throughput "
+        "and p50/p95/p99 latency per request name to a JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection", default=str(COLLECTION))
+        parser.add_argument(
+            "--base-url", default=None,
+            help="Server address (default: baseUrl of the collection)",
+        )
+        parser.add_argument(
+            "--users", type=int, default=20, help="Virtual users",
+        )
+        parser.add_argument(
+            "--duration", type=float, default=30,
+            help="Seconds of weighted requests after setup",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=None,
+            help="Weighted requests per virtual user (overrides --duration)",
+        )
+        parser.add_argument("--seed", type=int, default=49)
+        parser.add_argument("--timeout", type=float, default=10)
+        parser.add_argument(
+            "--weight", action="append", default=[], type=weight_option,
+            metavar="PATTERN=WEIGHT",
+            help='Weight of requests matching "METHOD folder/name" '
+                 "(repeatable, 0 excludes)",
+        )
+        parser.add_argument(
+            "--output", default=None,
+            help="Report path (default: print to stdout)",
+        )
+        parser.add_argument(
+            "--compare", default=None, metavar="REPORT",
+            help="Print changes against an earlier report",
+        )
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            metavar="PERCENT",
+            help="Fail if p95 of a request grew more than this against "
+                 "--compare",
+        )
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="Delete virtual users of earlier runs first "
+                 "(the server must use the same database)",
+        )
+
+    def handle(self, *args, **options):
+        if options["max_regression"] is not None and not options["compare"]:
+            raise CommandError("--max-regression requires --compare")
+        if options["clear"]:
+            deleted, _ = User.objects.filter(
+                username__startswith=USER_PREFIX
+            ).delete()
+            self.stderr.write(f"Deleted {deleted} objects of earlier runs")
+        scenario = Scenario.from_collection(
+            options["collection"], options["weight"]
+        )
+        replay = LoadReplay(
+            scenario,
+            base_url=options["base_url"] or scenario.variables["baseUrl"],
+            users=options["users"],
+            duration=options["duration"],
+            iterations=options["iterations"],
+            seed=options["seed"],
+            timeout=options["timeout"],
+        )
+        report = replay.run({"collection": options["collection"]})
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+        meta = report["meta"]
+        self.stderr.write(
+            f"{meta['requests']} requests in {meta['elapsed_s']} s, "
+            f"{meta['throughput_rps']} rps"
+        )
+        for name, result in report["endpoints"].items():
+            self.stderr.write(
+                f"{name}: {result['throughput_rps']} rps, "
+                f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                f"p99 {result['p99_ms']} ms, {result['statuses']}"
+            )
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                previous = json.load(file)
+            for line in compare(previous, report, fields=(
+                "throughput_rps", "p50_ms", "p95_ms", "p99_ms",
+            )):
+                self.stdout.write(line)
+            if options["max_regression"] is not None:
+                slower = regressions(
+                    previous, report, "p95_ms", options["max_regression"]
+                )
+                if slower:
+                    raise CommandError(
+                        f"p95 grew more than {options['max_regression']}%: "
+                        + ", ".join(slower)
+                    )
@@ -0,0 +1,107 @@
+"""
+Микробенчмарки отдельных функций внутри процесса.
+
+Функция вызывается ``warmup`` раз без замера, затем ``rounds`` раундов
+по ``iterations`` вызовов; время раунда делится на число вызовов. Если
+``iterations`` не задано, оно подбирается так, чтобы раунд длился не
+меньше ``min_time`` секунд (как timeit.autorange). На время раундов
+сборщик мусора выключен. Отчёт — JSON со статистикой в микросекундах
+на вызов; отчёты двух коммитов сравнивают compare и regressions из
+api.benchmark с section="benchmarks".
+"""
+
+import gc
+import statistics
+import time
+from typing import Callable, NamedTuple
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.benchmark import environment
+
+
+class Case(NamedTuple):
+    name: str
+    func: Callable
+
+
+def run_round(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return time.perf_counter() - started
+
+
+def calibrate(func, min_time):
+    """Число вызовов, которое выполняется не быстрее ``min_time`` секунд."""
+    iterations = 1
+    while True:
+        elapsed = run_round(func, iterations)
+        if elapsed >= min_time:
+            return iterations
+        # Не больше чем вдесятеро за шаг: первые вызовы бывают медленнее
+        iterations *= min(10, max(2, int(min_time / max(elapsed, 1e-9))))
+
+
+def describe(times):
+    """Статистика времени вызова по раундам (секунды) в микросекундах."""
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else (
+        times * 3
+    )
+    median = statistics.median(times)
+    return {
+        "min_us": round(min(times) * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "mean_us": round(statistics.fmean(times) * 1e6, 3),
+        "stdev_us": round(
+            statistics.stdev(times) * 1e6 if len(times) > 1 else 0, 3
+        ),
+        "iqr_us": round((quartiles[2] - quartiles[0]) * 1e6, 3),
+        "max_us": round(max(times) * 1e6, 3),
+        "ops_per_s": round(1 / median, 1),
+    }
+
+
+class MicroBenchmark:
+    def __init__(self, rounds=20, warmup=3, iterations=None, min_time=0.02):
+        self.rounds = rounds
+        self.warmup = warmup
+        self.iterations = iterations
+        self.min_time = min_time
+
+    def measure(self, case):
+        for _ in range(self.warmup):
+            case.func()
+        # Запросы к базе одного вызова: время с ними не только CPU
+        with CaptureQueriesContext(connection) as captured:
+            case.func()
+        iterations = self.iterations or calibrate(case.func, self.min_time)
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            times = [
+                run_round(case.func, iterations) / iterations
+                for _ in range(self.rounds)
+            ]
+        finally:
+            if enabled:
+                gc.enable()
+        return {
+            "rounds": self.rounds,
+            "iterations": iterations,
+            **describe(times),
+            "queries": len(captured),
+        }
+
+    def run(self, cases, meta=None):
+        return {
+            "meta": {
+                **environment(),
+                "rounds": self.rounds,
+                "warmup": self.warmup,
+                "min_time": self.min_time,
+                **(meta or {}),
+            },
+            "benchmarks": {case.name: self.measure(case) for case in cases},
+        }
@@ -0,0 +1,26 @@
+"""
+Быстрый JSON-парсер DRF: orjson, если установлен, иначе JSONParser.
+"""
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import orjson
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser, использующий orjson, если он установлен."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace("-", "") != "utf8":
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
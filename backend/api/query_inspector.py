@@ -0,0 +1,128 @@
+"""
+Поиск N+1 во время разработки.
+
+QueryInspectorMiddleware записывает SQL каждого запроса ко всем базам
+и группирует его по форме: текст без параметров, списки IN (...)
+и VALUES свёрнуты. Форма, выполненная THRESHOLD и более раз за запрос,
+записывается в журнал вместе с местом вызова в коде проекта, при
+RAISE — вызывает RepeatedQueriesError. Включается настройкой
+QUERY_INSPECTOR["ENABLED"]; выключенный middleware Django не загружает.
+"""
+
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+#: Настройки по умолчанию, переопределяются словарём QUERY_INSPECTOR
+DEFAULTS = {
+    "ENABLED": False,
+    "THRESHOLD": 3,
+    "RAISE": False,
+    "STACK_DEPTH": 6,
+}
+
+PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+VALUES_LIST = re.compile(r"VALUES \(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+NUMBER = re.compile(r"\b\d+\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+def get_setting(name):
+    return getattr(settings, "QUERY_INSPECTOR", {}).get(name, DEFAULTS[name])
+
+
+class RepeatedQueriesError(Exception):
+    """Один и тот же запрос выполнен за запрос слишком много раз."""
+
+
+def query_shape(sql):
+    """Форма запроса: SQL без значений параметров и длины списков."""
+    sql = WHITESPACE.sub(" ", sql.strip())
+    sql = PLACEHOLDER_LIST.sub("(...)", sql)
+    sql = VALUES_LIST.sub("VALUES (...)", sql)
+    return NUMBER.sub("?", sql)
+
+
+def project_stack(depth):
+    """Последние ``depth`` кадров стека из кода проекта."""
+    root = str(Path(settings.BASE_DIR).resolve())
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(root)
+        and "site-packages" not in frame.filename
+        and frame.filename != __file__
+    ]
+    return "".join(traceback.format_list(frames[-depth:]))
+
+
+class QueryRecorder:
+    """
+    Обёртка выполнения запросов (connection.execute_wrapper): считает
+    формы запросов и запоминает место первого повтора каждой из них.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.sql = {}
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = query_shape(sql)
+        self.counts[shape] += 1
+        if self.counts[shape] == 1:
+            self.sql[shape] = sql
+        elif self.counts[shape] == 2:
+            self.stacks[shape] = project_stack(get_setting("STACK_DEPTH"))
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """Повторы не меньше ``threshold`` раз: (sql, число, стек)."""
+        return [
+            (self.sql[shape], count, self.stacks[shape])
+            for shape, count in self.counts.most_common()
+            if count >= threshold
+        ]
+
+    def record(self):
+        """Контекст, записывающий запросы ко всем базам."""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class QueryInspectorMiddleware:
+    def __init__(self, get_response):
+        if not get_setting("ENABLED"):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        repeated = recorder.repeated(get_setting("THRESHOLD"))
+        if repeated:
+            self.report(request, repeated)
+        return response
+
+    def report(self, request, repeated):
+        message = "\n\n".join(
+            f"{count} раз: {sql}\n{stack}" for sql, count, stack in repeated
+        )
+        message = (
+            f"{request.method} {request.get_full_path()}: "
+            f"повторяющиеся запросы (возможно, N+1)\n{message}"
+        )
+        if get_setting("RAISE"):
+            raise RepeatedQueriesError(message)
+        logger.warning(message)
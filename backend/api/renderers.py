@@ -0,0 +1,86 @@
+"""
+Быстрый JSON-рендерер DRF.
+
+Если установлен orjson, ответы кодируются им, иначе — стандартным
+JSONRenderer. Результат совпадает с JSONRenderer: компактный UTF-8 без
+экранирования не-ASCII символов, U+2028/U+2029 экранированы, даты и время
+в ISO 8601 (UTC с «Z»); типы, которых orjson не знает (Decimal, timedelta,
+ленивые строки, QuerySet), кодирует JSONEncoder DRF.
+
+Данные, которые orjson кодирует иначе, чем JSONRenderer, передаются
+стандартному пути: целые шире 64 бит (orjson.JSONEncodeError) и
+NaN/Infinity, которые orjson молча заменяет на null. JSONRenderer
+отклоняет их при STRICT_JSON (ValueError), иначе пишет как есть.
+"""
+
+import math
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+_default = JSONEncoder().default
+
+
+def _has_non_finite(data):
+    """Есть ли в словарях и списках ``data`` значения NaN или Infinity."""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def _orjson_dumps(data):
+    """
+    JSON от orjson или None, если результат разошёлся бы
+    с JSONRenderer.
+    """
+    try:
+        content = orjson.dumps(data, default=_default, option=OPTIONS)
+    except TypeError:
+        # orjson.JSONEncodeError: например, целое шире 64 бит
+        return None
+    # orjson пишет NaN и Infinity как null: данные проверяются,
+    # только если null в ответе есть
+    if b"null" in content and _has_non_finite(data):
+        return None
+    return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+def dumps(data):
+    """Кодирует данные ответа в JSON (bytes) так же, как JSONRenderer."""
+    content = _orjson_dumps(data) if orjson is not None else None
+    if content is None:
+        return JSONRenderer().render(data)
+    return content
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, использующий orjson, если он установлен."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Отступы (indent в Accept) поддерживает только стандартный путь
+        if orjson is not None and not self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            content = _orjson_dumps(data)
+            if content is not None:
+                return content
+        return super().render(data, accepted_media_type, renderer_context)
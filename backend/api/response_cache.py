@@ -0,0 +1,197 @@
+"""
+Кеш ответов анонимным пользователям на GET-запросы списков и страниц
+объектов.
+
+Ключ ответа строится из имени представления, хоста, пути, заголовка
+Accept, упорядоченных параметров запроса и поколения содержимого.
+Поколение — одно значение в общем кеше GENERATION_CACHE_ALIAS:
+изменение рецептов, ингредиентов и полей пользователей, которые
+выводятся в ответах, заменяет его новым случайным значением сразу
+и после коммита, и все прежние ключи перестают использоваться без их
+перебора (старые записи вытесняются по TIMEOUT). Случайное значение,
+в отличие от инкремента, не требует атомарного счётчика: одновременные
+изменения не получат одинаковое поколение. Процесс перечитывает
+поколение не чаще раза в GENERATION_CHECK_INTERVAL секунд, поэтому
+другие процессы замечают изменение не позже этого интервала. Счётчики
+(favorites_count и т. п.) и регистрация новых пользователей поколение
+не меняют: в кешированных ответах они отстают не более чем на TIMEOUT.
+
+Кеш используют только запросы, которые после аутентификации остались
+анонимными и не закреплены за основной базой после записи
+(config.replicas). Сами ответы могут храниться в кеше процесса
+(CACHE_ALIAS), поколение должно быть общим для всех процессов.
+"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework.permissions import SAFE_METHODS
+
+from config.replicas import PIN_COOKIE
+
+#: Настройки по умолчанию, переопределяются словарём RESPONSE_CACHE
+DEFAULTS = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "default",
+    "GENERATION_CACHE_ALIAS": "shared",
+    "GENERATION_CHECK_INTERVAL": 1,
+    "KEY_PREFIX": "response",
+    "TIMEOUT": 60,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "RESPONSE_CACHE", {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[get_setting("CACHE_ALIAS")]
+
+
+def get_generation_cache():
+    return caches[get_setting("GENERATION_CACHE_ALIAS")]
+
+
+def generation_key():
+    return f"{get_setting('KEY_PREFIX')}:generation"
+
+
+#: Поколение, последним прочитанное или записанное процессом, и момент
+#: этого (time.monotonic)
+_seen = (None, None)
+
+
+def generation():
+    """Текущее поколение содержимого."""
+    global _seen
+    value, checked_at = _seen
+    now = time.monotonic()
+    if checked_at is not None and (
+        now - checked_at < get_setting("GENERATION_CHECK_INTERVAL")
+    ):
+        return value
+    cache = get_generation_cache()
+    value = cache.get(generation_key())
+    if value is None:
+        # Поколение вытеснено или ещё не создано: новое значение
+        # не совпадёт ни с одним прежним
+        cache.add(generation_key(), uuid4().hex, timeout=None)
+        value = cache.get(generation_key())
+    _seen = (value, now)
+    return value
+
+
+def bump():
+    """Начинает новое поколение содержимого."""
+    global _seen
+    value = uuid4().hex
+    get_generation_cache().set(generation_key(), value, timeout=None)
+    _seen = (value, time.monotonic())
+
+
+def content_changed():
+    """
+    Начинает новое поколение сразу и ещё раз после коммита текущей
+    транзакции: ответы, закешированные другими запросами до коммита,
+    не переживут его, а откат транзакции не оставит устаревших ответов.
+    """
+    bump()
+    transaction.on_commit(bump)
+
+
+def is_cacheable(request):
+    return (
+        get_setting("ENABLED")
+        and request.method in SAFE_METHODS
+        and "HTTP_AUTHORIZATION" not in request.META
+        and PIN_COOKIE not in request.COOKIES
+    )
+
+
+def cache_key(request, name):
+    """Ключ ответа на запрос или None, если запрос не кешируется."""
+    if not is_cacheable(request):
+        return None
+    params = urlencode(sorted(
+        (param, value)
+        for param, values in request.GET.lists()
+        for value in values
+    ))
+    digest = hashlib.sha256("\n".join((
+        request.get_host(),
+        request.path,
+        request.META.get("HTTP_ACCEPT", ""),
+        params,
+    )).encode()).hexdigest()
+    return f"{get_setting('KEY_PREFIX')}:{generation()}:{name}:{digest}"
+
+
+def get(key):
+    """Сохранённый ответ или None."""
+    cached = get_cache().get(key)
+    if cached is None:
+        return None
+    content, headers = cached
+    return HttpResponse(content, headers=headers)
+
+
+def store(key, response):
+    """Сохраняет успешный ответ; возвращает его же."""
+    if response.status_code != 200 or response.streaming:
+        return response
+    if hasattr(response, "render"):
+        response.render()
+    get_cache().set(
+        key,
+        (response.content, dict(response.items())),
+        timeout=get_setting("TIMEOUT"),
+    )
+    return response
+
+
+class ResponseCacheMixin:
+    """
+    Кеширует ответы анонимным пользователям на действия из
+    ``cached_actions``. Поиск в кеше выполняется после аутентификации
+    и проверки прав, но до обращения к базе и сериализации.
+    """
+
+    cached_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if (
+            self.action not in self.cached_actions
+            or request.auth is not None
+            or request.user.is_authenticated
+        ):
+            return
+        key = cache_key(request, f"{type(self).__name__}.{self.action}")
+        if key is None:
+            return
+        response = get(key)
+        if response is None:
+            self.response_cache_key = key
+        else:
+            # Обработчик действия подменяется сохранённым ответом так же,
+            # как ViewSet привязывает действия к методам HTTP
+            setattr(
+                self, request.method.lower(),
+                lambda *args, **kwargs: response,
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        key = getattr(self, "response_cache_key", None)
+        if key is None:
+            return response
+        return store(key, response)
@@ -0,0 +1,55 @@
+"""
+Выборочные поля ответа: ?fields=id,name оставляет только перечисленные
+поля, ?omit=text,ingredients убирает перечисленные. Представления
+по выбранным полям сокращают и запросы: не загружают лишние столбцы
+и не выполняют запросы для невыбранных вложенных данных.
+"""
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = "fields"
+OMIT_PARAM = "omit"
+
+
+def _parse(query_params, param, available):
+    value = query_params.get(param)
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(available)
+    if unknown:
+        raise ValidationError({param: [
+            "Неизвестные поля: {}. Доступны: {}.".format(
+                ", ".join(sorted(unknown)), ", ".join(available)
+            )
+        ]})
+    return names
+
+
+def requested_fields(query_params, available):
+    """
+    Поля ответа по параметрам fields и omit в порядке ``available``
+    или None, если ни один из параметров не задан.
+    """
+    fields = _parse(query_params, FIELDS_PARAM, available)
+    omit = _parse(query_params, OMIT_PARAM, available)
+    if fields is None and omit is None:
+        return None
+    return tuple(
+        name for name in available
+        if (fields is None or name in fields)
+        and (omit is None or name not in omit)
+    )
+
+
+class SparseFieldsMixin:
+    """
+    Сериализатор, который выводит только поля из аргумента ``fields``
+    (все поля, если он не задан).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
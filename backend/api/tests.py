@@ -0,0 +1,973 @@
+import json
+import random
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from uuid import UUID
+
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (
+    LiveServerTestCase,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import http_cache, response_cache
+from api.benchmark import compare, percentile
+from api.load_replay import (
+    USER_PREFIX,
+    Capture,
+    Scenario,
+    VirtualUser,
+    extract,
+    load_collection,
+)
+from api.management.commands.replay_load import COLLECTION
+from api.microbench import (
+    Case,
+    MicroBenchmark,
+    calibrate,
+    describe,
+    run_round,
+)
+from api.parsers import FastJSONParser
+from api.query_inspector import (
+    QueryInspectorMiddleware,
+    QueryRecorder,
+    RepeatedQueriesError,
+    query_shape,
+)
+from api.renderers import FastJSONRenderer, dumps
+
+from recipes import feed
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from recipes.trending import update_scores
+from users.models import Subscription, User
+
+USERS = 500
+RECIPES = 5000
+INGREDIENTS = 2000
+FAVORITES_PER_USER = 10
+
+
+def query_plan(sql):
+    """План запроса в текстовом виде для текущей СУБД."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return "\n".join(row[-1] for row in cursor.fetchall())
+        # На тестовом объёме последовательное чтение маленьких таблиц
+        # дешевле индекса; проверяется, что индекс применим
+        cursor.execute("SET enable_seqscan = off")
+        try:
+            cursor.execute("EXPLAIN " + sql)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute("RESET enable_seqscan")
+
+
+def sequential_scans(sql, plan):
+    """
+    Таблицы, которые план читает целиком. Проход SQLite по индексу
+    в порядке сортировки допустим только с LIMIT: он останавливается
+    на первых строках.
+    """
+    if connection.vendor == "sqlite":
+        return [
+            match.group(1)
+            for match in re.finditer(
+                r"^\s*SCAN (\S+)( USING .*INDEX .*)?$", plan, re.MULTILINE
+            )
+            if not match.group(2) or " LIMIT " not in sql
+        ]
+    return re.findall(r"Seq Scan on (\S+)", plan)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Основные запросы эндпоинтов на большом синтетическом наборе данных
+    не должны читать таблицы последовательным сканированием.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rand = random.Random(35)
+        User.objects.bulk_create(
+            User(
+                username=f"user{index}",
+                email=f"user{index}@example.com",
+                password="!",
+            )
+            for index in range(USERS)
+        )
+        cls.users = list(User.objects.order_by("id"))
+        cls.user = cls.users[0]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {index:05}", measurement_unit="г")
+            for index in range(INGREDIENTS)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=rand.choice(cls.users),
+                name=f"Рецепт {index}",
+                image="recipes/images/recipe.png",
+                text="Описание",
+                cooking_time=10,
+            )
+            for index in range(RECIPES)
+        )
+        recipe_ids = list(Recipe.objects.values_list("id", flat=True))
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe_id=recipe_id)
+                for user in cls.users
+                for recipe_id in rand.sample(recipe_ids, FAVORITES_PER_USER)
+            )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=author)
+            for user in cls.users
+            for author in rand.sample(cls.users, 5)
+            if author != user
+        )
+        cls.recipe_id = recipe_ids[len(recipe_ids) // 2]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def main_query(self, queries, table):
+        """Первый запрос страницы к таблице, без подсчёта строк."""
+        for query in queries:
+            sql = query["sql"]
+            if (
+                sql.startswith("SELECT")
+                and f'FROM "{table}"' in sql
+                and "COUNT(" not in sql
+            ):
+                return sql
+        self.fail(f"Нет запроса к {table}")
+
+    def assert_uses_indexes(self, method, url, table, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data)
+        self.assertLess(response.status_code, 500)
+        sql = self.main_query(queries, table)
+        plan = query_plan(sql)
+        self.assertEqual(sequential_scans(sql, plan), [], plan)
+
+    def test_recipe_list(self):
+        self.assert_uses_indexes(
+            "get", reverse("recipe-list"), "recipes_recipe"
+        )
+
+    def test_recipe_list_by_author(self):
+        self.assert_uses_indexes(
+            "get", reverse("recipe-list"), "recipes_recipe",
+            {"author": self.users[7].id},
+        )
+
+    def test_recipe_list_favorited(self):
+        self.assert_uses_indexes(
+            "get", reverse("recipe-list"), "recipes_recipe",
+            {"is_favorited": "1"},
+        )
+
+    def test_recipe_list_in_shopping_cart(self):
+        self.assert_uses_indexes(
+            "get", reverse("recipe-list"), "recipes_recipe",
+            {"is_in_shopping_cart": "1"},
+        )
+
+    def test_recipe_detail(self):
+        self.assert_uses_indexes(
+            "get", reverse("recipe-detail", args=[self.recipe_id]),
+            "recipes_recipe",
+        )
+
+    def test_ingredient_search(self):
+        self.assert_uses_indexes(
+            "get", reverse("ingredient-list"), "recipes_ingredient",
+            {"name": "ингредиент 0001"},
+        )
+
+    def test_subscriptions(self):
+        self.assert_uses_indexes(
+            "get", reverse("user-subscriptions"), "users_user"
+        )
+
+    def test_username_check(self):
+        self.client.force_authenticate(user=None)
+        self.assert_uses_indexes(
+            "post", reverse("user-list"), "users_user", {
+                "username": "USER42",
+                "email": "new@example.com",
+                "password": "validPass123",
+                "first_name": "Имя",
+                "last_name": "Фамилия",
+            },
+        )
+
+
+class FastJSONTests(TestCase):
+    data = {
+        "name": "Борщ\u2028\u2029",
+        "created_at": datetime(2024, 1, 2, 3, 4, 5, 6, tzinfo=dt_timezone.utc),
+        "local": datetime(
+            2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone(timedelta(hours=3))
+        ),
+        "day": date(2024, 1, 2),
+        "amount": Decimal("1.50"),
+        "duration": timedelta(minutes=90),
+        "uuid": UUID("12345678-1234-5678-1234-567812345678"),
+        "lazy": gettext_lazy("Рецепт"),
+        "ids": {1: [1, 2.5, None, True]},
+    }
+
+    def test_renders_same_bytes_as_json_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data),
+            JSONRenderer().render(self.data),
+        )
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch("api.renderers.orjson", None):
+            self.assertEqual(
+                FastJSONRenderer().render(self.data),
+                JSONRenderer().render(self.data),
+            )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_wide_integers_fall_back(self):
+        data = {"big": 2 ** 64, "negative": -(2 ** 70), "items": [None]}
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+        self.assertEqual(dumps(data), JSONRenderer().render(data))
+
+    def test_rejects_nan_and_infinity(self):
+        for value in (float("nan"), float("inf"), float("-inf")):
+            with self.subTest(value=value):
+                data = {"scores": [1.0, None, {"score": value}]}
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render(data)
+                with self.assertRaises(ValueError):
+                    dumps(data)
+
+    def test_non_strict_nan_matches_json_renderer(self):
+        data = {"score": float("nan"), "other": None}
+        renderer = FastJSONRenderer()
+        renderer.strict = False
+        expected = JSONRenderer()
+        expected.strict = False
+        self.assertEqual(renderer.render(data), expected.render(data))
+
+    def test_indent_uses_standard_renderer(self):
+        self.assertEqual(
+            FastJSONRenderer().render(
+                {"a": 1}, "application/json; indent=2"
+            ),
+            b'{\n  "a": 1\n}',
+        )
+
+    def test_parser(self):
+        parser = FastJSONParser()
+        self.assertEqual(
+            parser.parse(BytesIO('{"name": "Борщ"}'.encode())),
+            {"name": "Борщ"},
+        )
+        for body in (b"{", b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                parser.parse(BytesIO(body))
+
+    def test_api_uses_fast_renderer(self):
+        user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="!"
+        )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(
+            reverse("recipe-favorite-batch"), "{",
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("JSON parse error", response.json()["detail"])
+        self.assertIsInstance(
+            response.accepted_renderer, FastJSONRenderer
+        )
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="!"
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name="Борщ",
+            image="recipes/images/recipe.png",
+            text="Описание",
+            cooking_time=30,
+        )
+        self.list_url = reverse("recipe-list")
+        self.detail_url = reverse("recipe-detail", args=[self.recipe.id])
+
+    def test_repeated_anonymous_requests_skip_database(self):
+        for url in (self.list_url, self.detail_url):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.status_code, 200)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second["Content-Type"], first["Content-Type"])
+
+    def test_key_ignores_parameter_order(self):
+        factory = RequestFactory()
+        self.assertEqual(
+            response_cache.cache_key(
+                factory.get(self.list_url, {"a": 1, "b": 2}), "list"
+            ),
+            response_cache.cache_key(
+                factory.get(self.list_url + "?b=2&a=1"), "list"
+            ),
+        )
+        self.assertNotEqual(
+            response_cache.cache_key(
+                factory.get(self.list_url, {"page": 1}), "list"
+            ),
+            response_cache.cache_key(
+                factory.get(self.list_url, {"page": 2}), "list"
+            ),
+        )
+
+    def test_writes_start_new_generation(self):
+        self.client.get(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = "Щи"
+            self.recipe.save()
+        self.assertEqual(self.client.get(self.detail_url).data["name"], "Щи")
+
+        self.client.get(self.list_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.first_name = "Иван"
+            self.author.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(
+            response.data["results"][0]["author"]["first_name"], "Иван"
+        )
+
+    def test_login_does_not_start_new_generation(self):
+        generation = response_cache.generation()
+        self.author.save(update_fields=["last_login"])
+        self.assertEqual(response_cache.generation(), generation)
+
+    def test_only_payload_fields_start_new_generation(self):
+        generation = response_cache.generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(
+                username="reader", email="reader@example.com", password="!"
+            )
+            self.author.is_active = False
+            self.author.save()
+        self.assertEqual(response_cache.generation(), generation)
+        self.author.last_name = "Петров"
+        self.author.save()
+        self.assertNotEqual(response_cache.generation(), generation)
+
+    def recipe_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [
+            query for query in queries
+            if Recipe._meta.db_table in query["sql"]
+        ]
+
+    @override_settings(RESPONSE_CACHE={"GENERATION_CHECK_INTERVAL": 0})
+    def test_generation_is_shared_between_processes(self):
+        self.client.get(self.detail_url)
+        self.assertFalse(self.recipe_queries(self.detail_url))
+        # Другой процесс начал новое поколение
+        caches["shared"].set(
+            response_cache.generation_key(), "other", timeout=None
+        )
+        self.assertTrue(self.recipe_queries(self.detail_url))
+
+    def test_token_requests_are_not_cached(self):
+        token = Token.objects.create(user=self.author)
+        self.client.get(self.detail_url)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assert_hits_database(self.detail_url)
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+        self.assertEqual(self.client.get(self.detail_url).status_code, 401)
+
+    def assert_hits_database(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertTrue(queries.captured_queries)
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.client.force_authenticate(user=self.author)
+        self.client.get(self.detail_url)
+        self.assert_hits_database(self.detail_url)
+        self.client.force_authenticate(user=None)
+        self.assert_hits_database(self.detail_url)
+        self.assertIsNone(
+            response_cache.cache_key(
+                RequestFactory().get(
+                    self.detail_url, HTTP_AUTHORIZATION="Token x"
+                ),
+                "RecipeViewSet.retrieve",
+            )
+        )
+
+    @override_settings(RESPONSE_CACHE={"ENABLED": False})
+    def test_disabled(self):
+        self.client.get(self.detail_url)
+        self.assert_hits_database(self.detail_url)
+
+
+@override_settings(
+    HTTP_CACHE={"MAX_AGE": 10, "STALE_WHILE_REVALIDATE": 30},
+    RESPONSE_CACHE={"ENABLED": False},
+)
+class HttpCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username="reader", email="reader@example.com", password="!"
+        )
+        self.url = reverse("ingredient-list")
+
+    def assert_vary(self, response):
+        vary = {value.strip() for value in response["Vary"].split(",")}
+        self.assertLessEqual({"Authorization", "Accept"}, vary)
+
+    def test_anonymous_read_is_public(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            set(response["Cache-Control"].split(", ")),
+            {"public", "max-age=10", "stale-while-revalidate=30"},
+        )
+        self.assert_vary(response)
+
+    def cache_control(self, response):
+        return dict(
+            value.partition("=")[::2]
+            for value in response["Cache-Control"].split(", ")
+        )
+
+    def test_staleness_is_bounded(self):
+        directives = self.cache_control(self.client.get(self.url))
+        self.assertEqual(http_cache.max_staleness(), 41)
+        self.assertEqual(
+            int(directives["max-age"])
+            + int(directives["stale-while-revalidate"])
+            + response_cache.get_setting("GENERATION_CHECK_INTERVAL"),
+            http_cache.max_staleness(),
+        )
+
+    @override_settings(
+        HTTP_CACHE={"MAX_AGE": 5, "STALE_WHILE_REVALIDATE": 0},
+        RESPONSE_CACHE={"GENERATION_CHECK_INTERVAL": 0},
+    )
+    def test_staleness_follows_settings(self):
+        directives = self.cache_control(self.client.get(self.url))
+        self.assertEqual(directives["max-age"], "5")
+        self.assertEqual(directives["stale-while-revalidate"], "0")
+        self.assertEqual(http_cache.max_staleness(), 5)
+
+    def test_personalized_responses_are_private(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        for response in (
+            self.client.get(self.url),
+            self.client.get(reverse("user-me")),
+        ):
+            self.assertIn("private", response["Cache-Control"])
+            self.assert_vary(response)
+
+    def test_errors_and_writes_are_private(self):
+        self.assertIn(
+            "private",
+            self.client.get(reverse("user-me"))["Cache-Control"],
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse("recipe-favorite-batch"), {}, format="json"
+        )
+        self.assertIn("private", response["Cache-Control"])
+
+
+@override_settings(RESPONSE_CACHE={"ENABLED": False})
+class QueryBudgetTests(TestCase):
+    """
+    Число запросов каждого эндпоинта не больше бюджета и не зависит
+    от размера страницы.
+    """
+
+    AUTHORS = 12
+    RECIPES_PER_AUTHOR = 3
+    INGREDIENTS_PER_RECIPE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username="reader", email="reader@example.com", password="!"
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"ингредиент {index}", measurement_unit="г")
+            for index in range(20)
+        )
+        rand = random.Random(47)
+        for index in range(cls.AUTHORS):
+            author = User.objects.create_user(
+                username=f"author{index}",
+                email=f"author{index}@example.com",
+                password="!",
+            )
+            Subscription.objects.create(user=cls.reader, author=author)
+            for number in range(cls.RECIPES_PER_AUTHOR):
+                recipe = Recipe.objects.create(
+                    author=author,
+                    name=f"Рецепт {index}-{number}",
+                    image="recipes/images/recipe.png",
+                    text="Описание",
+                    cooking_time=10,
+                )
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(
+                        recipe=recipe, ingredient=ingredient, amount=1
+                    )
+                    for ingredient in rand.sample(
+                        ingredients, cls.INGREDIENTS_PER_RECIPE
+                    )
+                )
+                if number == 0:
+                    Favorite.objects.create(user=cls.reader, recipe=recipe)
+                    ShoppingCart.objects.create(
+                        user=cls.reader, recipe=recipe
+                    )
+        feed.backfill(
+            Subscription.objects.filter(user=cls.reader),
+            recipes_per_author=cls.RECIPES_PER_AUTHOR,
+        )
+        update_scores(now=django_timezone.now() + timedelta(days=1))
+        cls.recipe = Recipe.objects.first()
+        cls.author = cls.recipe.author
+        cls.ingredient = ingredients[0]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def assert_budget(self, budget, url, params=None, paginated=True):
+        params = params or {}
+        counts = [
+            self.count_queries(url, {**params, "limit": limit})
+            for limit in (2, 10)
+        ] if paginated else [self.count_queries(url, params)]
+        self.assertLessEqual(max(counts), budget, url)
+        self.assertEqual(len(set(counts)), 1, f"{url}: {counts}")
+
+    def test_anonymous(self):
+        for budget, url, params, paginated in (
+            (4, reverse("recipe-list"), {}, True),
+            (5, reverse("recipe-list"), {"author": self.author.id}, True),
+            (4, reverse("recipe-trending"), {}, True),
+            (2, reverse("recipe-detail", args=[self.recipe.id]), {}, False),
+            (2, reverse("recipe-related", args=[self.recipe.id]), {}, False),
+            (1, reverse("ingredient-list"), {"name": "ингр"}, False),
+            (1, reverse("ingredient-detail", args=[self.ingredient.id]),
+             {}, False),
+            (2, reverse("user-list"), {}, True),
+            (1, reverse("user-detail", args=[self.author.id]), {}, False),
+        ):
+            with self.subTest(url=url, params=params):
+                self.assert_budget(budget, url, params, paginated)
+
+    def test_authenticated(self):
+        self.client.force_authenticate(user=self.reader)
+        for budget, url, params, paginated in (
+            (7, reverse("recipe-list"), {}, True),
+            (7, reverse("recipe-list"), {"is_favorited": 1}, True),
+            (7, reverse("recipe-list"), {"is_in_shopping_cart": 1}, True),
+            (6, reverse("recipe-list"), {"search": "рецепт"}, True),
+            (7, reverse("recipe-feed"), {}, True),
+            (5, reverse("recipe-detail", args=[self.recipe.id]), {}, False),
+            (2, reverse("recipe-download-shopping-cart"), {}, False),
+            (2, reverse("user-list"), {}, True),
+            (1, reverse("user-detail", args=[self.author.id]), {}, False),
+            (1, reverse("user-me"), {}, False),
+            (3, reverse("user-subscriptions"), {}, True),
+            (3, reverse("user-subscriptions"), {"recipes_limit": 2}, True),
+        ):
+            with self.subTest(url=url, params=params):
+                self.assert_budget(budget, url, params, paginated)
+
+    def test_subscriptions_respect_recipes_limit(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(
+            reverse("user-subscriptions"), {"recipes_limit": 2, "limit": 3}
+        )
+        results = response.data["results"]
+        self.assertEqual(len(results), 3)
+        for author in results:
+            self.assertTrue(author["is_subscribed"])
+            self.assertEqual(author["recipes_count"], self.RECIPES_PER_AUTHOR)
+            self.assertEqual(len(author["recipes"]), 2)
+            expected = list(Recipe.objects.filter(
+                author_id=author["id"]
+            ).values_list("id", flat=True)[:2])
+            self.assertEqual(
+                [recipe["id"] for recipe in author["recipes"]], expected
+            )
+
+
+class QueryInspectorTests(TestCase):
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape(
+                'SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s)\n LIMIT 21'
+            ),
+            query_shape('SELECT "a" FROM "t" WHERE "id" IN (%s) LIMIT 5'),
+        )
+        self.assertEqual(
+            query_shape('INSERT INTO "t" VALUES (%s, %s), (%s, %s)'),
+            'INSERT INTO "t" VALUES (...)',
+        )
+
+    def test_recorder_finds_repeated_queries(self):
+        recorder = QueryRecorder()
+        users = [
+            User.objects.create_user(
+                username=f"user{index}",
+                email=f"user{index}@example.com",
+                password="!",
+            )
+            for index in range(3)
+        ]
+        with recorder.record():
+            User.objects.filter(id__in=[user.id for user in users]).count()
+            for user in users:
+                list(Recipe.objects.filter(author=user))
+        (sql, count, stack), = recorder.repeated(3)
+        self.assertIn('FROM "recipes_recipe"', sql)
+        self.assertEqual(count, 3)
+        self.assertIn("test_recorder_finds_repeated_queries", stack)
+
+    @override_settings(QUERY_INSPECTOR={"ENABLED": True, "RAISE": True})
+    def test_middleware_raises(self):
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="!"
+        )
+
+        def view(request):
+            for _ in range(3):
+                Recipe.objects.filter(author=author).exists()
+            return HttpResponse()
+
+        middleware = QueryInspectorMiddleware(view)
+        with self.assertRaisesMessage(RepeatedQueriesError, "3 раз"):
+            middleware(RequestFactory().get("/api/recipes/"))
+
+    @override_settings(QUERY_INSPECTOR={"ENABLED": True})
+    def test_middleware_logs(self):
+        middleware = QueryInspectorMiddleware(
+            lambda request: HttpResponse(User.objects.count())
+        )
+        with self.assertNoLogs("api.query_inspector"):
+            middleware(RequestFactory().get("/api/users/"))
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryInspectorMiddleware(lambda request: HttpResponse())
+
+
+class BenchmarkTests(TestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        random.Random(48).shuffle(values)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_compare_reports(self):
+        fields = ("p50_ms", "queries_per_request")
+        old = {"endpoints": {
+            "recipes": {"p50_ms": 10, "queries_per_request": 4},
+        }}
+        new = {"endpoints": {
+            "recipes": {"p50_ms": 5, "queries_per_request": 4},
+            "feed": {"p50_ms": 3, "queries_per_request": 2},
+        }}
+        self.assertEqual(compare(old, new, fields), [
+            "recipes: p50_ms 10 -> 5 (-50%), "
+            "queries_per_request 4 -> 4 (+0%)",
+            "feed: new endpoint",
+        ])
+
+
+class BenchApiCommandTests(TransactionTestCase):
+    """Потоки бенчмарка работают в своих соединениях: данные закоммичены."""
+
+    def setUp(self):
+        call_command(
+            "generate_data", users=20, recipes=40, ingredients=30,
+            favorites_per_user=3, carts_per_user=2,
+            subscriptions_per_user=2, stdout=StringIO(),
+        )
+        self.output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(self.output.close)
+
+    def bench(self, *args):
+        stdout = StringIO()
+        call_command(
+            "bench_api", "--requests", "4", "--concurrency", "2",
+            "--warmup", "1", "--host", "testserver",
+            "--output", self.output.name, *args,
+            stdout=stdout, stderr=StringIO(),
+        )
+        with open(self.output.name, encoding="utf-8") as file:
+            return json.load(file), stdout.getvalue()
+
+    def test_report(self):
+        report, _ = self.bench()
+        self.assertEqual(report["meta"]["dataset"]["Recipe"], 40)
+        self.assertIn("recipes", report["endpoints"])
+        self.assertIn("auth_subscriptions", report["endpoints"])
+        for name, result in report["endpoints"].items():
+            with self.subTest(name):
+                self.assertEqual(result["statuses"], {"200": 4})
+                self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+                self.assertLessEqual(result["p95_ms"], result["p99_ms"])
+        # Анонимные ответы после прогрева приходят из кеша без запросов
+        self.assertEqual(report["endpoints"]["recipe"]["max_queries"], 0)
+        self.assertGreater(
+            report["endpoints"]["auth_recipe"]["queries_per_request"], 0
+        )
+
+    def test_only_and_compare(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as previous:
+            report, _ = self.bench("--only", "recipe", "--only", "auth_me")
+            json.dump(report, previous)
+            previous.flush()
+            report, stdout = self.bench(
+                "--only", "recipe", "--compare", previous.name
+            )
+        self.assertEqual(list(report["endpoints"]), ["recipe"])
+        self.assertIn("recipe: p50_ms", stdout)
+
+
+class LoadReplayTests(TestCase):
+    def setUp(self):
+        self.steps, self.variables = load_collection(COLLECTION)
+        self.scenario = Scenario(self.steps, self.variables)
+
+    def step(self, name):
+        return next(step for step in self.steps if step.name == name)
+
+    def test_captures_from_test_scripts(self):
+        self.assertEqual(
+            self.step(
+                "register_and_get_tokens // No Auth/create_users/"
+                "create_first_user"
+            ).captures,
+            (Capture("userId", ("id",)),),
+        )
+        captures = self.step(
+            "ingredients/get_ingradients/get_ingredients_list // User"
+        ).captures
+        self.assertIn(Capture("secondIndredientId", (1, "id")), captures)
+        capture = Capture("ingredientNameFirstLatter", (0, "name"), 1)
+        self.assertIn(capture, captures)
+        self.assertEqual(extract([{"name": "Соль"}], capture), "С")
+        self.assertIsNone(extract([], capture))
+
+    def test_folder_auth_is_inherited(self):
+        step = self.step(
+            "subscriptions/get_subscriptions/get_subscription_list // User"
+        )
+        self.assertEqual(
+            step.headers, {"Authorization": "Token {{userToken}}"}
+        )
+        self.assertEqual(self.step(
+            "users/get_user_info/get_user_list // No Auth"
+        ).headers, {})
+
+    def test_setup_and_weights(self):
+        self.assertEqual(
+            self.scenario.setup[-1].name,
+            "recipes/create_recipes/create_fifth_recipe // User",
+        )
+        names = {step.name for step in self.scenario.mix}
+        self.assertIn("recipes/get_recipes/get_recipes_list // User", names)
+        self.assertNotIn(
+            "register_and_get_tokens // No Auth/logout/logout // User", names
+        )
+        self.assertFalse(any(
+            name.startswith("delete_requests/recipes/") for name in names
+        ))
+        scenario = Scenario(
+            self.steps, self.variables, [("GET recipes/*", 0)]
+        )
+        self.assertFalse(any(
+            step.method == "GET" and step.name.startswith("recipes/")
+            for step in scenario.mix
+        ))
+
+    def test_virtual_user_variables(self):
+        user = VirtualUser(self.variables, "http://testserver", "vu-", 1)
+        self.assertEqual(user.variables["username"], '"vu-vasya.ivanov"')
+        self.assertEqual(
+            user.render("{{baseUrl}}/api/users/{{userId}}/"),
+            "http://testserver/api/users/{{userId}}/",
+        )
+
+
+class ReplayLoadCommandTests(LiveServerTestCase):
+    def setUp(self):
+        # Коллекция загружает аватары и изображения рецептов
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        Ingredient.objects.bulk_create([
+            Ingredient(name="Соль", measurement_unit="г"),
+            Ingredient(name="Мука", measurement_unit="г"),
+        ])
+        self.output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(self.output.close)
+
+    def test_replay(self):
+        call_command(
+            "replay_load", "--base-url", self.live_server_url,
+            "--users", "2", "--iterations", "15",
+            "--output", self.output.name,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        with open(self.output.name, encoding="utf-8") as file:
+            report = json.load(file)
+        self.assertEqual(report["meta"]["requests"], 30)
+        self.assertEqual(report["setup"][
+            "recipes/create_recipes/create_fifth_recipe // User"
+        ], {"201": 2})
+        self.assertEqual(report["setup"][
+            "users/reset_password/get_token_with_new_password"
+        ], {"200": 2})
+        self.assertEqual(
+            User.objects.filter(username__startswith=USER_PREFIX).count(), 6
+        )
+        for name, result in report["endpoints"].items():
+            with self.subTest(name):
+                self.assertFalse([
+                    status for status in result["statuses"]
+                    if not status.isdigit() or status >= "500"
+                ])
+
+
+class MicroBenchmarkTests(TestCase):
+    def test_describe(self):
+        stats = describe([0.001, 0.002, 0.003, 0.004, 0.010])
+        self.assertEqual(stats["min_us"], 1000)
+        self.assertEqual(stats["median_us"], 3000)
+        self.assertEqual(stats["max_us"], 10000)
+        self.assertEqual(stats["ops_per_s"], 333.3)
+        self.assertGreater(stats["iqr_us"], 0)
+        self.assertEqual(describe([0.5])["stdev_us"], 0)
+
+    def test_calibrate_reaches_min_time(self):
+        def pause():
+            time.sleep(0.001)
+
+        iterations = calibrate(pause, 0.005)
+        self.assertGreaterEqual(iterations, 2)
+        self.assertLessEqual(iterations, 10)
+        self.assertGreaterEqual(run_round(pause, iterations), 0.001)
+
+    def test_measure_counts_queries(self):
+        benchmark = MicroBenchmark(rounds=3, warmup=1, iterations=2)
+        result = benchmark.measure(
+            Case("count", lambda: Ingredient.objects.count())
+        )
+        self.assertEqual(result["queries"], 1)
+        self.assertEqual((result["rounds"], result["iterations"]), (3, 2))
+        self.assertLessEqual(result["min_us"], result["median_us"])
+
+
+class BenchSerializersCommandTests(TestCase):
+    def setUp(self):
+        self.output = tempfile.NamedTemporaryFile(suffix=".json")
+        self.addCleanup(self.output.close)
+
+    def bench(self, *args):
+        stdout = StringIO()
+        call_command(
+            "bench_serializers", "--rounds", "2", "--warmup", "0",
+            "--iterations", "1", "--host", "testserver",
+            "--output", self.output.name, *args,
+            stdout=stdout, stderr=StringIO(),
+        )
+        with open(self.output.name, encoding="utf-8") as file:
+            return json.load(file), stdout.getvalue()
+
+    def test_report(self):
+        report, _ = self.bench()
+        benchmarks = report["benchmarks"]
+        self.assertEqual(list(benchmarks), [
+            "recipe_read_serializer", "recipe_write_validate_ingredients",
+            "user_serializer", "ingredient_filter", "shopping_list_text",
+        ])
+        self.assertGreater(benchmarks["recipe_read_serializer"]["queries"], 0)
+        for name in ("user_serializer", "ingredient_filter",
+                     "shopping_list_text"):
+            self.assertEqual(benchmarks[name]["queries"], 0)
+        # Фикстуры в базе откатываются
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_max_regression(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as previous:
+            report, _ = self.bench("--only", "shopping_list_text")
+            report["benchmarks"]["shopping_list_text"]["median_us"] /= 100
+            json.dump(report, previous)
+            previous.flush()
+            with self.assertRaisesMessage(CommandError, "shopping_list_text"):
+                self.bench(
+                    "--only", "shopping_list_text",
+                    "--compare", previous.name, "--max-regression", "50",
+                )
@@ -1,9 +1,13 @@
 # Сторонние библиотеки
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 # Локальные импорты
+from dbpool.views import PoolStatsView
+from recipes import async_views as recipes_async_views
 from recipes.views import IngredientViewSet, RecipeViewSet
+from users import async_views as users_async_views
 from users.views import AuthTokenView, LogoutView, UserViewSet
 
 router = DefaultRouter()
@@ -11,8 +15,31 @@ router.register("users", UserViewSet, basename="user")
 router.register("recipes", RecipeViewSet, basename="recipe")
 router.register("ingredients", IngredientViewSet, basename="ingredient")
 
+token_login = (
+    users_async_views.token_login
+    if settings.ASYNC_API
+    else AuthTokenView.as_view()
+)
+
 urlpatterns = [
     path("", include(router.urls)),
-    path("auth/token/login/", AuthTokenView.as_view(), name="token_login"),
+    path("auth/token/login/", token_login, name="token_login"),
     path("auth/token/logout/", LogoutView.as_view(), name="token_logout"),
-] 
\ No newline at end of file
+    path(
+        "internal/db-pool/", PoolStatsView.as_view(), name="db_pool_stats"
+    ),
+]
+
+if settings.ASYNC_API:
+    # Асинхронные варианты горячих эндпоинтов чтения и эндпоинтов,
+    # хеширующих пароль; остальные методы этих адресов они передают
+    # представлениям DRF
+    urlpatterns = [
+        path("recipes/", recipes_async_views.recipe_list),
+        path("recipes/<int:pk>/", recipes_async_views.recipe_detail),
+        path("ingredients/", recipes_async_views.ingredient_list),
+        path("users/", users_async_views.user_list),
+        path("users/me/", users_async_views.user_me),
+        path("users/set_password/", users_async_views.set_password),
+        path("users/subscriptions/", users_async_views.user_subscriptions),
+    ] + urlpatterns
@@ -0,0 +1,127 @@
+"""
+Маршрутизация чтения на реплики с закреплением за основной базой
+после записи (read-your-writes).
+
+ReplicaRoutingMiddleware разрешает чтение с реплик только для безопасных
+запросов клиента, который в последние READ_YOUR_WRITES_SECONDS секунд
+ничего не записывал. Клиент определяется по токену из заголовка
+Authorization (метка хранится в кеше READ_YOUR_WRITES_CACHE, который
+должен быть общим для воркеров) и по cookie, которую браузер возвращает
+любому воркеру. Вход закрепляет выданный токен функцией pin: первое
+чтение с новым токеном не попадает на отстающую реплику.
+"""
+
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from rest_framework.authentication import get_authorization_header
+
+PRIMARY = "default"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+PIN_COOKIE = "primary_db"
+
+#: Можно ли текущему запросу читать с реплик
+_replicas_allowed = ContextVar("replicas_allowed", default=False)
+
+
+def get_replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def get_cache():
+    return caches[settings.READ_YOUR_WRITES_CACHE]
+
+
+def pin_key(token):
+    return "primary-pin:" + hashlib.sha256(token.encode()).hexdigest()
+
+
+def pin(token):
+    """
+    Закрепляет клиента с токеном ``token`` за основной базой на
+    READ_YOUR_WRITES_SECONDS секунд.
+    """
+    if get_replicas():
+        get_cache().set(
+            pin_key(token), 1, timeout=settings.READ_YOUR_WRITES_SECONDS
+        )
+
+
+class PrimaryReplicaRouter:
+    """Запись и чтение вне безопасных запросов — в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if (
+            not replicas
+            or not _replicas_allowed.get()
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Запись посреди запроса переключает его оставшиеся чтения на primary
+        _replicas_allowed.set(False)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if get_replicas() and isinstance(
+            get_cache(), (LocMemCache, DummyCache)
+        ):
+            # Метку, поставленную одним воркером, должны видеть все
+            raise ImproperlyConfigured(
+                "READ_YOUR_WRITES_CACHE must point to a cache shared by all "
+                "workers when DATABASE_REPLICAS are configured."
+            )
+
+    def request_token(self, request):
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2:
+            return None
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            return None
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+        cache = get_cache()
+        token = self.request_token(request)
+        key = pin_key(token) if token else None
+        is_safe = request.method in SAFE_METHODS
+        pinned = PIN_COOKIE in request.COOKIES or (
+            key is not None and cache.get(key) is not None
+        )
+        state = _replicas_allowed.set(is_safe and not pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            _replicas_allowed.reset(state)
+        if not is_safe:
+            window = settings.READ_YOUR_WRITES_SECONDS
+            if key is not None:
+                cache.set(key, 1, timeout=window)
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=window, httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -28,6 +28,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Адрес сайта для коротких ссылок на рецепты
+BASE_URL = os.getenv("BASE_URL", "http://localhost")
+
 
 # Application definition
 
@@ -47,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.query_inspector.QueryInspectorMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -54,6 +58,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "config.replicas.ReplicaRoutingMiddleware",
+    "api.http_cache.HttpCacheMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -76,21 +82,75 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+# Асинхронные варианты представлений (требуют запуска под ASGI-сервером)
+ASYNC_API = os.getenv("ASYNC_API", "False").lower() in ("1", "true")
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        # PostgreSQL с пулом соединений процесса (см. dbpool)
+        "ENGINE": "dbpool",
         "NAME": os.getenv("POSTGRES_DB", "foodgram-db"),
         "USER": os.getenv("POSTGRES_USER", "postgres"),
         "PASSWORD": os.getenv("POSTGRES_PASSWORD", "postgres"),
         "HOST": os.getenv("DB_HOST", "localhost"),
         "PORT": os.getenv("DB_PORT", "5432"),
+        # Соединения переиспользует пул, а не Django
+        "CONN_MAX_AGE": 0,
+        "POOL": {
+            "MIN_SIZE": int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+            "MAX_SIZE": int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+            "TIMEOUT": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            "MAX_IDLE": float(os.getenv("DB_POOL_MAX_IDLE", 600)),
+            "CHECK_AFTER": float(os.getenv("DB_POOL_CHECK_AFTER", 30)),
+        },
     }
 }
 
+# Кеши. "shared" общий для всех процессов и хостов: через него процессы
+# узнают о выходе пользователя, записи клиента и изменениях индексов.
+# По умолчанию это таблица в основной базе (manage.py createcachetable),
+# для быстрого кеша: SHARED_CACHE_BACKEND=
+# django.core.cache.backends.redis.RedisCache, SHARED_CACHE_LOCATION=
+# redis://redis:6379/0
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": os.getenv(
+            "SHARED_CACHE_BACKEND",
+            "django.core.cache.backends.db.DatabaseCache",
+        ),
+        "LOCATION": os.getenv("SHARED_CACHE_LOCATION", "shared_cache"),
+    },
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2:5432
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1
+):
+    host, _, port = address.strip().partition(":")
+    alias = f"replica_{number}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["config.replicas.PrimaryReplicaRouter"]
+
+# Сколько секунд после записи клиент читает из основной базы
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+# Кеш меток закрепления; при репликах обязан быть общим для воркеров
+READ_YOUR_WRITES_CACHE = "shared"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -110,6 +170,30 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+PASSWORD_HASHERS = [
+    "users.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# Стоимость PBKDF2; хеши с другим значением пересчитываются при входе
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.getenv("PASSWORD_PBKDF2_ITERATIONS", 600000)
+)
+
+# Пул потоков для хеширования паролей (users.hashing)
+PASSWORD_HASHING = {
+    "WORKERS": int(os.getenv("PASSWORD_HASHING_WORKERS", os.cpu_count() or 1)),
+    "MAX_PENDING": int(os.getenv("PASSWORD_HASHING_MAX_PENDING", 64)),
+    "QUEUE_TIMEOUT": int(os.getenv("PASSWORD_HASHING_QUEUE_TIMEOUT", 5)),
+}
+
+AUTHENTICATION_BACKENDS = [
+    "users.backends.HashingPoolModelBackend",
+]
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -139,13 +223,123 @@ AUTH_USER_MODEL = "users.User"
 # REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "users.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 6,
+    # orjson, если установлен, иначе стандартный json (api.renderers)
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "api.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+# Кеш токенов аутентификации (users.authentication.CachedTokenAuthentication)
+# Токены кешируются в процессе; общий кеш TOKEN_CACHE_ALIAS хранит только
+# ревизию отзывов, которую процесс читает раз в CHECK_INTERVAL секунд:
+# выход из системы в других процессах заметят не позже этого интервала.
+# Пустой TOKEN_CACHE_ALIAS оставляет только кеш процесса: выход заметят
+# не раньше TTL, годится лишь для одного процесса
+TOKEN_CACHE = {
+    "MAX_SIZE": int(os.getenv("TOKEN_CACHE_MAX_SIZE", 10000)),
+    "TTL": int(os.getenv("TOKEN_CACHE_TTL", 300)),
+    "CHECK_INTERVAL": int(os.getenv("TOKEN_CACHE_CHECK_INTERVAL", 5)),
+    "CACHE_ALIAS": os.getenv("TOKEN_CACHE_ALIAS", "shared") or None,
+}
+
+# Лента подписок (recipes.feed): авторы с FANOUT_LIMIT и более
+# подписчиками не раскладывают рецепты по лентам при публикации
+FEED = {
+    "FANOUT_LIMIT": int(os.getenv("FEED_FANOUT_LIMIT", 1000)),
+    "BACKFILL_RECIPES": int(os.getenv("FEED_BACKFILL_RECIPES", 50)),
+}
+
+# Рейтинг популярности (recipes.trending), пересчитывается командой
+# update_trending
+TRENDING = {
+    "HALF_LIFE_HOURS": float(os.getenv("TRENDING_HALF_LIFE_HOURS", 48)),
+    "FAVORITE_WEIGHT": float(os.getenv("TRENDING_FAVORITE_WEIGHT", 1.0)),
+    "SHOPPING_CART_WEIGHT": float(
+        os.getenv("TRENDING_SHOPPING_CART_WEIGHT", 0.5)
+    ),
+}
+
+# Похожие рецепты по совместному избранному (recipes.related),
+# пересчитываются командой build_related
+RELATED = {
+    "TOP_K": int(os.getenv("RELATED_TOP_K", 10)),
+    "MIN_COMMON": int(os.getenv("RELATED_MIN_COMMON", 2)),
+    "MAX_FAN_IN": int(os.getenv("RELATED_MAX_FAN_IN", 1000)),
+}
+
+# Индекс ингредиентов для подбора рецептов (recipes.ingredient_index).
+# Журнал изменений хранится в базе, процесс сверяется с ним раз
+# в CHECK_INTERVAL секунд; INGREDIENT_INDEX_JOURNAL=False годится
+# только для одного процесса
+INGREDIENT_INDEX = {
+    "JOURNAL": os.getenv("INGREDIENT_INDEX_JOURNAL", "True").lower() in (
+        "1", "true"
+    ),
+    "CHECK_INTERVAL": int(os.getenv("INGREDIENT_INDEX_CHECK_INTERVAL", 5)),
+    "MAX_CHANGES": int(os.getenv("INGREDIENT_INDEX_MAX_CHANGES", 1000)),
+}
+
+# Похожие рецепты по составу ингредиентов (recipes.similar): MinHash
+# из NUM_PERM функций, BANDS полос LSH
+SIMILAR_RECIPES = {
+    "NUM_PERM": int(os.getenv("SIMILAR_RECIPES_NUM_PERM", 64)),
+    "BANDS": int(os.getenv("SIMILAR_RECIPES_BANDS", 16)),
+    "TOP_K": int(os.getenv("SIMILAR_RECIPES_TOP_K", 10)),
+}
+
+# Кеш ответов анонимным пользователям (api.response_cache). Ответы
+# хранятся в RESPONSE_CACHE_ALIAS (может быть кешем процесса), поколение
+# содержимого — в общем кеше RESPONSE_CACHE_GENERATION_ALIAS; процессы
+# замечают изменения не позже GENERATION_CHECK_INTERVAL секунд
+RESPONSE_CACHE = {
+    "ENABLED": os.getenv("RESPONSE_CACHE_ENABLED", "True").lower() in (
+        "1", "true"
+    ),
+    "CACHE_ALIAS": os.getenv("RESPONSE_CACHE_ALIAS", "default"),
+    "GENERATION_CACHE_ALIAS": os.getenv(
+        "RESPONSE_CACHE_GENERATION_ALIAS", "shared"
+    ),
+    "GENERATION_CHECK_INTERVAL": int(
+        os.getenv("RESPONSE_CACHE_GENERATION_CHECK_INTERVAL", 1)
+    ),
+    "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TIMEOUT", 60)),
+}
+
+# Заголовки кеширования ответов API для nginx (api.http_cache).
+# Кеш прокси не сбрасывается при изменениях: анонимный клиент получает
+# прежний ответ не дольше MAX_AGE + STALE_WHILE_REVALIDATE +
+# RESPONSE_CACHE["GENERATION_CHECK_INTERVAL"] секунд (по умолчанию 41)
+HTTP_CACHE = {
+    "MAX_AGE": int(os.getenv("HTTP_CACHE_MAX_AGE", 10)),
+    "STALE_WHILE_REVALIDATE": int(
+        os.getenv("HTTP_CACHE_STALE_WHILE_REVALIDATE", 30)
+    ),
+}
+
+# Поиск N+1 при разработке (api.query_inspector): запросы одной формы,
+# выполненные THRESHOLD и более раз, попадают в журнал или, при RAISE,
+# вызывают исключение
+QUERY_INSPECTOR = {
+    "ENABLED": os.getenv("QUERY_INSPECTOR_ENABLED", "False").lower() in (
+        "1", "true"
+    ),
+    "THRESHOLD": int(os.getenv("QUERY_INSPECTOR_THRESHOLD", 3)),
+    "RAISE": os.getenv("QUERY_INSPECTOR_RAISE", "False").lower() in (
+        "1", "true"
+    ),
 }
 
 # Media files
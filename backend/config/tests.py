@@ -0,0 +1,132 @@
+import tempfile
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from config.replicas import (
+    PIN_COOKIE,
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    _replicas_allowed,
+    pin_key,
+)
+from recipes.models import Recipe
+from users.models import User
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        # Общий для процессов кеш без базы данных
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_settings = override_settings(CACHES={
+            **settings.CACHES,
+            'shared': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory.name,
+            },
+        })
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def route(self, request):
+        """Куда уйдёт чтение внутри запроса и ответ middleware."""
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(Recipe))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return routed[0], response
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Recipe), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        database, _ = self.route(self.factory.get('/api/recipes/'))
+        self.assertEqual(database, 'replica')
+
+    def test_write_switches_request_to_primary(self):
+        state = _replicas_allowed.set(True)
+        try:
+            self.assertEqual(self.router.db_for_read(Recipe), 'replica')
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+        finally:
+            _replicas_allowed.reset(state)
+
+    def test_reads_stick_to_primary_after_write(self):
+        headers = {'HTTP_AUTHORIZATION': 'Token abc'}
+        database, response = self.route(
+            self.factory.post('/api/recipes/1/favorite/', **headers)
+        )
+        self.assertEqual(database, 'default')
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        database, _ = self.route(self.factory.get('/api/recipes/', **headers))
+        self.assertEqual(database, 'default')
+
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        database, _ = self.route(request)
+        self.assertEqual(database, 'default')
+
+        other = {'HTTP_AUTHORIZATION': 'Token other'}
+        database, _ = self.route(self.factory.get('/api/recipes/', **other))
+        self.assertEqual(database, 'replica')
+
+    @override_settings(READ_YOUR_WRITES_CACHE='default')
+    def test_per_process_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(lambda request: HttpResponse())
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class LoginPinTests(TestCase):
+    def test_login_pins_issued_token(self):
+        User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='validPass123',
+        )
+        response = APIClient().post(reverse('token_login'), {
+            'email': 'reader@example.com', 'password': 'validPass123',
+        })
+        self.assertEqual(response.status_code, 200)
+        key = pin_key(response.data['auth_token'])
+        self.assertIsNotNone(
+            caches[settings.READ_YOUR_WRITES_CACHE].get(key)
+        )
+
+
+@skipUnless(
+    settings.DATABASE_REPLICAS,
+    'Requires a replica database (DB_REPLICA_HOSTS)',
+)
+class ReplicaDatabaseTests(TransactionTestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def test_recipe_list_is_read_from_replica(self):
+        replica = connections[settings.DATABASE_REPLICAS[0]]
+        with CaptureQueriesContext(replica) as queries:
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries.captured_queries)
@@ -1,4 +1,5 @@
 DEFAULT_PAGE_SIZE = 6
+ESTIMATED_COUNT_THRESHOLD = 10000
 NAME_MAX_LENGTH = 200
 UNIT_MAX_LENGTH = 50
 
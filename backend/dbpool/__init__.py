@@ -0,0 +1,6 @@
+"""
+Бэкенд PostgreSQL с пулом соединений процесса.
+
+Подключается через ENGINE = "dbpool", параметры пула задаются ключом
+POOL в настройках базы данных.
+"""
@@ -0,0 +1,135 @@
+import os
+import threading
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from .pool import ConnectionPool
+
+#: Параметры пула по умолчанию, переопределяются ключом POOL базы данных
+DEFAULTS = {
+    "MIN_SIZE": 0,
+    "MAX_SIZE": 10,
+    "TIMEOUT": 30,
+    "MAX_IDLE": 600,
+    "CHECK_AFTER": 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pools():
+    """Пулы текущего процесса: {"псевдоним/имя базы": пул}."""
+    with _pools_lock:
+        return {
+            f"{alias}/{name}": pool
+            for (pid, alias, name), pool in _pools.items()
+            if pid == os.getpid()
+        }
+
+
+def close_pools(name=None):
+    """
+    Закрывает пулы процесса (только пулы базы ``name``, если она задана)
+    и убирает их из реестра: следующее соединение создаст новый пул.
+    """
+    with _pools_lock:
+        keys = [
+            key for key in _pools
+            if key[0] == os.getpid() and name in (None, key[2])
+        ]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close_all()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Перед удалением и клонированием тестовой базы закрывает её пулы:
+    PostgreSQL не удаляет базу и не копирует шаблон, пока к ним открыты
+    соединения.
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        self.connection.close()
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        self.connection.close()
+        close_pools(self.connection.settings_dict["NAME"])
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL-бэкенд, берущий соединения из пула процесса вместо
+    открытия нового соединения на каждый запрос. close() возвращает
+    соединение в пул, поэтому CONN_MAX_AGE должен оставаться равным 0.
+    """
+
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_pool(self, conn_params):
+        # Ключ включает pid: после fork воркера пул создаётся заново
+        key = (os.getpid(), self.alias, self.settings_dict["NAME"])
+        with _pools_lock:
+            pool = _pools.get(key)
+            created = pool is None
+            if created:
+                options = {**DEFAULTS, **self.settings_dict.get("POOL", {})}
+                pool = _pools[key] = ConnectionPool(
+                    connect=lambda: super(DatabaseWrapper, self)
+                    .get_new_connection(conn_params),
+                    check=self.check_connection,
+                    close=lambda conn: conn.close(),
+                    min_size=options["MIN_SIZE"],
+                    max_size=options["MAX_SIZE"],
+                    timeout=options["TIMEOUT"],
+                    max_idle=options["MAX_IDLE"],
+                    check_after=options["CHECK_AFTER"],
+                )
+        if created:
+            pool.prefill()
+        return pool
+
+    def get_new_connection(self, conn_params):
+        if self.alias == NO_DB_ALIAS:
+            # Служебные соединения к базе postgres (создание и удаление
+            # тестовой базы) не держат сокет открытым
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = self.get_pool(conn_params)
+        return self.pool.getconn()
+
+    @staticmethod
+    def check_connection(conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except base.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        pool = self.pool
+        if self.connection is None or pool is None:
+            return super()._close()
+        conn = self.connection
+        if self.in_atomic_block:
+            # Django сохранит ссылку на соединение до выхода из atomic,
+            # поэтому вернуть его в пул нельзя
+            pool.putconn(conn, discard=True)
+            return
+        try:
+            # Соединение возвращается в пул без открытой транзакции
+            conn.rollback()
+            conn.autocommit = self.settings_dict["AUTOCOMMIT"]
+        except base.Database.Error:
+            pool.putconn(conn, discard=True)
+        else:
+            pool.putconn(conn, discard=bool(conn.closed))
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с ограничениями min/max.
+
+    ``connect`` создаёт новое соединение, ``check`` проверяет соединение
+    перед выдачей (вызывается для соединений, простоявших дольше
+    ``check_after`` секунд), ``close`` закрывает соединение.
+    """
+
+    def __init__(
+        self, connect, check, close, min_size=0, max_size=10, timeout=30,
+        max_idle=600, check_after=0,
+    ):
+        self.connect = connect
+        self.check = check
+        self.close = close
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._idle = deque()
+        self._closed = False
+        self._size = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+            "checkout_time_total": 0.0,
+            "checkout_time_max": 0.0,
+        }
+
+    def prefill(self):
+        """Открывает соединения до min_size."""
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+                self._in_use += 1
+            self.putconn(self._create())
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            conn, idle_since = self._reserve(deadline)
+            if conn is None:
+                conn = self._create()
+            elif not self._healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+            break
+        elapsed = time.monotonic() - started
+        with self._condition:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_time_total"] += elapsed
+            self._stats["checkout_time_max"] = max(
+                self._stats["checkout_time_max"], elapsed
+            )
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if discard or self._closed:
+            self._discard(conn)
+            return
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append((conn, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """
+        Закрывает простаивающие соединения; выданные закроются при
+        возврате. Закрытый пул новых соединений не выдаёт.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._stats["connections_closed"] += len(idle)
+            self._condition.notify_all()
+        for conn in idle:
+            try:
+                self.close(conn)
+            except Exception:
+                pass
+
+    def _reserve(self, deadline):
+        """
+        Забирает простаивающее соединение или место под новое.
+        Возвращает (None, None), если нужно создать соединение.
+        """
+        waited = False
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("The pool is closed.")
+                self._expire_idle()
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    return None, None
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    if self._idle or self._size < self.max_size:
+                        continue
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No connection available within {self.timeout}s "
+                        f"(max_size={self.max_size})."
+                    )
+
+    def _create(self):
+        try:
+            conn = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _healthy(self, conn, idle_since):
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        if self.check(conn):
+            return True
+        with self._condition:
+            self._stats["health_check_failures"] += 1
+        return False
+
+    def _discard(self, conn):
+        try:
+            self.close(conn)
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._in_use -= 1
+            self._stats["connections_closed"] += 1
+            self._condition.notify()
+
+    def _expire_idle(self):
+        """Закрывает самые старые простаивающие соединения сверх min_size."""
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.max_idle
+        ):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            try:
+                self.close(conn)
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(
+                size=self._size,
+                in_use=self._in_use,
+                idle=len(self._idle),
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        checkouts = stats["checkouts"]
+        stats["checkout_time_avg"] = (
+            stats["checkout_time_total"] / checkouts if checkouts else 0.0
+        )
+        return stats
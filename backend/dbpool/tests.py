@@ -0,0 +1,143 @@
+import threading
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from dbpool.base import DatabaseWrapper, get_pools
+from dbpool.pool import ConnectionPool, PoolTimeout
+from users.models import User
+
+
+class Connection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+
+def make_pool(**kwargs):
+    return ConnectionPool(
+        connect=Connection,
+        check=lambda conn: conn.healthy,
+        close=lambda conn: setattr(conn, 'closed', True),
+        **kwargs
+    )
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def test_connection_is_reused(self):
+        pool = make_pool(max_size=2)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        stats = pool.stats()
+        self.assertEqual(stats['connections_created'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = make_pool(max_size=1, timeout=0.05)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        stats = pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = make_pool(max_size=1, timeout=5)
+        conn = pool.getconn()
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(pool.getconn()))
+        waiter.start()
+        pool.putconn(conn)
+        waiter.join()
+        self.assertEqual(result, [conn])
+        self.assertEqual(pool.stats()['connections_created'], 1)
+
+    def test_unhealthy_connection_is_replaced(self):
+        pool = make_pool(max_size=1, check_after=0)
+        conn = pool.getconn()
+        conn.healthy = False
+        pool.putconn(conn)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+    def test_idle_connections_expire_down_to_min_size(self):
+        pool = make_pool(min_size=1, max_size=3, max_idle=0)
+        pool.prefill()
+        connections = [pool.getconn() for _ in range(3)]
+        for conn in connections:
+            pool.putconn(conn)
+        pool.getconn()
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['connections_closed'], 2)
+
+    def test_close_all_closes_idle_and_returned_connections(self):
+        pool = make_pool(min_size=1, max_size=2)
+        pool.prefill()
+        idle = pool.getconn()
+        used = pool.getconn()
+        pool.putconn(idle)
+        pool.close_all()
+        self.assertTrue(idle.closed)
+        self.assertFalse(used.closed)
+        pool.putconn(used)
+        self.assertTrue(used.closed)
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['in_use'], 0)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+
+@skipUnless(
+    isinstance(connections['default'], DatabaseWrapper),
+    'Requires the dbpool PostgreSQL backend',
+)
+class PostgresPoolTests(TransactionTestCase):
+    def test_threads_share_bounded_pool(self):
+        def query():
+            from django.db import connection as thread_connection
+            for _ in range(5):
+                User.objects.count()
+                thread_connection.close()
+
+        User.objects.count()
+        pool = connection.pool
+        before = pool.stats()
+        threads = [threading.Thread(target=query) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        after = pool.stats()
+        self.assertLessEqual(after['size'], pool.max_size)
+        self.assertEqual(after['in_use'], before['in_use'])
+        self.assertEqual(after['checkouts'] - before['checkouts'], 40)
+        self.assertLess(
+            after['connections_created'] - before['connections_created'], 40
+        )
+
+
+class PoolStatsViewTests(TestCase):
+    def test_stats_require_admin(self):
+        client = APIClient()
+        url = reverse('db_pool_stats')
+        self.assertEqual(client.get(url).status_code, 401)
+        admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='validPass123'
+        )
+        client.force_authenticate(user=admin)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(response.data['pools']), set(get_pools())
+        )
@@ -0,0 +1,23 @@
+import os
+
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .base import get_pools
+
+
+class PoolStatsView(APIView):
+    """
+    Статистика пулов соединений процесса, обслужившего запрос:
+    занятые и свободные соединения, ожидания, время выдачи соединения.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "pid": os.getpid(),
+            "pools": {
+                name: pool.stats() for name, pool in get_pools().items()
+            },
+        })
@@ -7,12 +7,17 @@ from .models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from .paginations import EstimatedCountPaginator
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
     min_num = 1
+    autocomplete_fields = ("ingredient",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("ingredient")
 
 
 @admin.register(Ingredient)
@@ -25,8 +30,12 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "author", "cooking_time", "favorites_count")
+    list_select_related = ("author",)
     search_fields = ("name", "author__username")
+    autocomplete_fields = ("author",)
     inlines = [RecipeIngredientInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -37,24 +46,32 @@ class RecipeAdmin(admin.ModelAdmin):
         }),
     )
 
-    def favorites_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-    favorites_count.short_description = "Добавлено в избранное"
-
 
 @admin.register(RecipeIngredient)
 class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = ("id", "recipe", "ingredient", "amount")
+    list_select_related = ("recipe", "ingredient")
     search_fields = ("recipe__name", "ingredient__name")
+    autocomplete_fields = ("recipe", "ingredient")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "recipe")
+    list_select_related = ("user", "recipe")
     search_fields = ("user__username", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "recipe")
+    list_select_related = ("user", "recipe")
     search_fields = ("user__username", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
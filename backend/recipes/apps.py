@@ -1,6 +1,27 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.models.signals import post_migrate
+
+
+def restore_raw_indexes(sender, using, **kwargs):
+    """
+    SQLite пересоздаёт таблицу при части миграций, теряя созданные
+    вручную триггеры и индексы, поэтому после миграций они
+    восстанавливаются.
+    """
+    from . import indexes, search
+
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        search.install(connection)
+        indexes.install(connection)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(restore_raw_indexes, sender=self)
@@ -0,0 +1,161 @@
+"""
+Асинхронные представления чтения рецептов и ингредиентов (ASYNC_API).
+Запросы к базе выполняются через async ORM; в Django 4.2 он передаёт их
+по одному в общий синхронный поток, поэтому запросы идут друг за другом.
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import Http404
+from rest_framework.exceptions import ValidationError
+
+from api.async_utils import (
+    alist,
+    apaginate,
+    aset,
+    async_api_view,
+    json_response,
+    paginated_data,
+)
+from api.sparse import FIELDS_PARAM, OMIT_PARAM
+from users.models import Subscription, User
+from .filters import filter_by_user_lists
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from .paginations import RecipePagination
+from .serializers.projections import (
+    INGREDIENT_FIELDS,
+    RECIPE_FIELDS,
+    USER_FIELDS,
+    assemble_recipes,
+)
+from .views import IngredientViewSet, RecipeViewSet
+
+
+async def filter_recipes(request):
+    """Тот же набор фильтров, что у RecipeViewSet."""
+    queryset = filter_by_user_lists(
+        Recipe.objects.all(), request.user, request.GET
+    )
+    author = request.GET.get("author")
+    if author:
+        if (
+            not author.isdigit()
+            or not await User.objects.filter(pk=author).aexists()
+        ):
+            raise ValidationError({"author": [
+                "Select a valid choice. "
+                "That choice is not one of the available choices."
+            ]})
+        queryset = queryset.filter(author_id=author)
+    return queryset
+
+
+async def build_recipes(rows, request):
+    """
+    Собирает представления рецептов страницы: авторы, ингредиенты
+    и отметки текущего пользователя.
+    """
+    recipe_ids = [row["id"] for row in rows]
+    author_ids = {row["author_id"] for row in rows}
+    authors = await alist(
+        User.objects.filter(id__in=author_ids).values(*USER_FIELDS)
+    )
+    ingredients = await alist(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values(*INGREDIENT_FIELDS))
+    user = request.user
+    if user.is_authenticated:
+        favorited = await aset(Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list("recipe_id", flat=True))
+        in_cart = await aset(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list("recipe_id", flat=True))
+        subscribed = await aset(Subscription.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list("author_id", flat=True))
+    else:
+        favorited, in_cart, subscribed = set(), set(), set()
+    return assemble_recipes(
+        rows, authors, ingredients, favorited, in_cart, subscribed, request
+    )
+
+
+recipe_list_view = RecipeViewSet.as_view({"get": "list", "post": "create"})
+
+
+recipe_detail_view = RecipeViewSet.as_view({
+    "get": "retrieve",
+    "put": "update",
+    "patch": "partial_update",
+    "delete": "destroy",
+})
+
+
+def sync_recipe_list(request):
+    return recipe_list_view(request).render()
+
+
+def sync_recipe_detail(request, pk):
+    return recipe_detail_view(request, pk=pk).render()
+
+
+def is_sparse(request):
+    return FIELDS_PARAM in request.GET or OMIT_PARAM in request.GET
+
+
+@async_api_view(fallback=recipe_list_view)
+async def recipe_list(request):
+    """
+    Асинхронный аналог RecipeViewSet.list. Поиск с курсорной пагинацией,
+    подбор по ингредиентам и выборку полей выполняет синхронное
+    представление.
+    """
+    if (
+        request.GET.get("search", "").strip()
+        or "ingredients" in request.GET
+        or is_sparse(request)
+    ):
+        return await sync_to_async(sync_recipe_list)(request)
+    queryset = await filter_recipes(request)
+    pagination, rows = await apaginate(
+        queryset,
+        request,
+        RecipePagination,
+        lambda page: alist(page.values(*RECIPE_FIELDS)),
+    )
+    results = await build_recipes(rows, request) if rows else []
+    return json_response(paginated_data(pagination, results))
+
+
+@async_api_view(fallback=recipe_detail_view)
+async def recipe_detail(request, pk):
+    """
+    Асинхронный аналог RecipeViewSet.retrieve. Выборку полей выполняет
+    синхронное представление.
+    """
+    if is_sparse(request):
+        return await sync_to_async(sync_recipe_detail)(request, pk)
+    queryset = await filter_recipes(request)
+    rows = await alist(queryset.filter(pk=pk).values(*RECIPE_FIELDS))
+    if not rows:
+        raise Http404("No Recipe matches the given query.")
+    data, = await build_recipes(rows, request)
+    return json_response(data)
+
+
+@async_api_view(fallback=IngredientViewSet.as_view({"get": "list"}))
+async def ingredient_list(request):
+    """Асинхронный аналог IngredientViewSet.list с поиском по началу имени."""
+    queryset = Ingredient.objects.order_by("name")
+    name = request.GET.get("name")
+    if name:
+        queryset = queryset.filter(name__istartswith=name)
+    return json_response(
+        await alist(queryset.values("id", "name", "measurement_unit"))
+    )
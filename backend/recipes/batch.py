@@ -0,0 +1,68 @@
+"""
+Пакетное добавление рецептов в избранное/корзину и удаление из них.
+
+Проверка рецептов, вставка или удаление и изменение счётчиков
+выполняются одним запросом (recipes.toggles). Статус каждого рецепта
+определяется по строкам, которые запрос действительно вставил или
+удалил, поэтому одновременные запросы не получают одинаковых статусов.
+Сигналы моделей не отправляются: вклады удалённых связей вычитаются
+из рейтинга популярности одним вызовом.
+"""
+
+from django.db import transaction
+
+from . import trending
+from .models import Favorite, ShoppingCart
+from .toggles import FAVORITE, SHOPPING_CART
+
+CREATED = "created"
+EXISTS = "exists"
+DELETED = "deleted"
+ABSENT = "absent"
+NOT_FOUND = "not_found"
+
+TOGGLES = {Favorite: FAVORITE, ShoppingCart: SHOPPING_CART}
+
+
+def _results(recipe_ids, changed, done, unchanged):
+    return [
+        {
+            "id": recipe_id,
+            "status": (
+                NOT_FOUND if recipe_id not in changed
+                else done if changed[recipe_id] else unchanged
+            ),
+        }
+        for recipe_id in recipe_ids
+    ]
+
+
+def add_relations(model, user, recipe_ids):
+    """
+    Добавляет рецепты в избранное/корзину пользователя.
+    Возвращает статус по каждому id в порядке запроса.
+    """
+    created = TOGGLES[model].add_many(user.id, recipe_ids)
+    return _results(recipe_ids, created, CREATED, EXISTS)
+
+
+@transaction.atomic
+def remove_relations(model, user, recipe_ids):
+    """
+    Удаляет рецепты из избранного/корзины пользователя.
+    Возвращает статус по каждому id в порядке запроса.
+    """
+    results = TOGGLES[model].remove_many(
+        user.id, recipe_ids, ("id", "created_at")
+    )
+    events = [
+        (row["id"], recipe_id, row["created_at"])
+        for recipe_id, (deleted, row) in results.items() if deleted
+    ]
+    if events:
+        trending.withdraw(model, events)
+    return _results(
+        recipe_ids,
+        {recipe_id: deleted for recipe_id, (deleted, _) in results.items()},
+        DELETED, ABSENT,
+    )
@@ -0,0 +1,44 @@
+"""
+Денормализованные счётчики: атомарное изменение через F() и пересчёт
+по фактическим данным для исправления расхождений.
+"""
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счётчик ``field`` объекта ``model`` на ``delta``.
+    Уменьшение не опускает значение ниже нуля.
+    """
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(model, field):
+    """
+    Подзапрос с фактическим количеством строк ``model``,
+    ссылающихся на внешний объект через внешний ключ ``field``.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )
+
+
+def sync_counter(queryset, field, related_model, related_field):
+    """
+    Приводит счётчик ``field`` к фактическому количеству связанных строк.
+    Обновляет только разошедшиеся записи и возвращает их число.
+    """
+    actual = actual_count(related_model, related_field)
+    return queryset.exclude(**{field: actual}).update(**{field: actual})
@@ -0,0 +1,207 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Рецепты обычных авторов раскладываются по лентам подписчиков
+при публикации (fan-out-on-write, модель TimelineEntry).
+Автор, у которого при публикации не меньше FANOUT_LIMIT подписчиков,
+отмечается PopularAuthor: записи для него не создаются, его рецепты
+добавляются к ленте при чтении (fan-out-on-read). Когда подписчиков
+становится меньше FANOUT_LIMIT, отметка снимается в одной транзакции
+с заполнением лент оставшихся подписчиков последними рецептами автора.
+
+Страница ленты читается по индексу записей (user, -created_at, -recipe)
+от позиции курсора и объединяется (UNION) с рецептами популярных авторов
+в одном запросе; затем загружаются только рецепты страницы.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from users.models import Subscription, User
+from .models import PopularAuthor, Recipe, TimelineEntry
+
+#: Настройки по умолчанию, переопределяются словарём FEED в settings
+DEFAULTS = {
+    "FANOUT_LIMIT": 1000,
+    # Сколько последних рецептов автора попадает в ленту при подписке
+    "BACKFILL_RECIPES": 50,
+    "BATCH_SIZE": 1000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "FEED", {}).get(name, DEFAULTS[name])
+
+
+def is_popular(author):
+    return author.subscribers_count >= get_setting("FANOUT_LIMIT")
+
+
+def add_entries(pairs):
+    """
+    Создаёт записи лент для пар (id подписчика, рецепт), пропуская
+    существующие. Возвращает число обработанных пар.
+    """
+    return len(TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe.id,
+                created_at=recipe.created_at,
+            )
+            for user_id, recipe in pairs
+        ),
+        batch_size=get_setting("BATCH_SIZE"),
+        ignore_conflicts=True,
+    ))
+
+
+def fan_out_recipe(recipe_id):
+    """Добавляет опубликованный рецепт в ленты подписчиков автора."""
+    recipe = Recipe.objects.select_related("author").filter(
+        pk=recipe_id
+    ).first()
+    if recipe is None:
+        return 0
+    if is_popular(recipe.author):
+        PopularAuthor.objects.bulk_create(
+            [PopularAuthor(author_id=recipe.author_id)],
+            ignore_conflicts=True,
+        )
+        return 0
+    # Отметка могла остаться, если отписка не успела её снять
+    demote_author(recipe.author_id)
+    subscriber_ids = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list("user_id", flat=True).iterator()
+    return add_entries(
+        (user_id, recipe) for user_id in subscriber_ids
+    )
+
+
+def backfill(subscriptions, recipes_per_author=None):
+    """
+    Добавляет в ленты последние рецепты авторов для подписок
+    из queryset ``subscriptions``. Авторы с fan-out-on-read пропускаются.
+    """
+    if recipes_per_author is None:
+        recipes_per_author = get_setting("BACKFILL_RECIPES")
+    subscribers = {}
+    for user_id, author_id in subscriptions.filter(
+        author__popular_author__isnull=True
+    ).values_list("user_id", "author_id").order_by().iterator():
+        subscribers.setdefault(author_id, []).append(user_id)
+    created = 0
+    for author_id, user_ids in subscribers.items():
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id)
+            .only("id", "created_at")
+            .order_by("-created_at")[:recipes_per_author]
+        )
+        created += add_entries(
+            (user_id, recipe) for user_id in user_ids for recipe in recipes
+        )
+    return created
+
+
+def remove_author(user_id, author_id):
+    """
+    Убирает из ленты рецепты автора после отписки; после коммита
+    проверяет, не пора ли вернуть автора к раскладке при публикации.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+    transaction.on_commit(lambda: demote_author(author_id))
+
+
+@transaction.atomic
+def demote_author(author_id):
+    """
+    Возвращает к раскладке при публикации популярного автора, у которого
+    стало меньше FANOUT_LIMIT подписчиков, и заполняет ленты его
+    подписчиков: иначе рецепты, опубликованные без записей, пропали бы
+    из лент. Удаление отметки одним DELETE гарантирует, что при
+    одновременных отписках ленты заполнит только одна из них.
+    Возвращает число обработанных записей лент.
+    """
+    deleted, _ = PopularAuthor.objects.filter(
+        author_id=author_id,
+        author__subscribers_count__lt=get_setting("FANOUT_LIMIT"),
+    ).delete()
+    if not deleted:
+        return 0
+    return backfill(Subscription.objects.filter(author_id=author_id))
+
+
+def sync_popular_authors():
+    """
+    Приводит отметки PopularAuthor к счётчикам подписчиков (например,
+    после массовой загрузки в обход сигналов). Возвращает число
+    обработанных записей лент у авторов, снова раскладываемых при
+    публикации.
+    """
+    limit = get_setting("FANOUT_LIMIT")
+    PopularAuthor.objects.bulk_create(
+        (
+            PopularAuthor(author_id=author_id)
+            for author_id in User.objects.filter(
+                subscribers_count__gte=limit, popular_author__isnull=True
+            ).values_list("id", flat=True).iterator()
+        ),
+        batch_size=get_setting("BATCH_SIZE"),
+        ignore_conflicts=True,
+    )
+    return sum(
+        demote_author(author_id)
+        for author_id in PopularAuthor.objects.filter(
+            author__subscribers_count__lt=limit
+        ).values_list("author_id", flat=True)
+    )
+
+
+def _after(queryset, created_field, id_field, position, reverse):
+    """
+    Пары (дата, id рецепта) queryset после позиции курсора: по убыванию,
+    а при reverse=True — по возрастанию (страница перед позицией).
+    """
+    if position is not None:
+        created_at, recipe_id = position
+        lookup = "gt" if reverse else "lt"
+        queryset = queryset.filter(
+            Q(**{f"{created_field}__{lookup}": created_at})
+            | Q(**{
+                created_field: created_at, f"{id_field}__{lookup}": recipe_id,
+            })
+        )
+    prefix = "" if reverse else "-"
+    return queryset.order_by(
+        prefix + created_field, prefix + id_field
+    ).values_list(created_field, id_field)
+
+
+def feed_page(user, limit, position=None, reverse=False):
+    """
+    До ``limit`` пар (дата публикации, id рецепта) ленты после позиции
+    ``position`` в порядке убывания, при reverse=True — в порядке
+    возрастания. Записи ленты и рецепты популярных авторов читаются
+    не больше чем по ``limit`` строк.
+    """
+    timeline = _after(
+        TimelineEntry.objects.filter(user=user),
+        "created_at", "recipe_id", position, reverse,
+    )[:limit]
+    popular = _after(
+        Recipe.objects.filter(author_id__in=PopularAuthor.objects.filter(
+            author__subscribers__user=user,
+        ).values("author_id")),
+        "created_at", "id", position, reverse,
+    )[:limit]
+    # UNION убирает повторы: рецепт автора, ставшего популярным после
+    # публикации, есть и в записях ленты, и среди рецептов популярных
+    # авторов
+    prefix = "" if reverse else "-"
+    return list(timeline.union(popular).order_by(
+        prefix + "created_at", prefix + "recipe_id"
+    )[:limit])
@@ -1,11 +1,122 @@
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
+from .ingredient_index import ingredient_index
 from .models import Ingredient
 
+INGREDIENTS_MATCH_ALL = "all"
+INGREDIENTS_MATCH_ANY = "any"
+
 
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(field_name="name", lookup_expr="istartswith")
 
     class Meta:
         model = Ingredient
-        fields = ["name"] 
\ No newline at end of file
+        fields = ["name"]
+
+
+def filter_by_user_lists(queryset, user, query_params):
+    """
+    Фильтрация рецептов по корзине (is_in_shopping_cart)
+    и избранному (is_favorited) текущего пользователя.
+    """
+    if not user.is_authenticated:
+        return queryset
+
+    is_in_shopping_cart = query_params.get("is_in_shopping_cart")
+    if is_in_shopping_cart is not None:
+        queryset = (
+            queryset.filter(shoppingcart__user=user)
+            if is_in_shopping_cart == "1"
+            else queryset.exclude(shoppingcart__user=user)
+        )
+
+    is_favorited = query_params.get("is_favorited")
+    if is_favorited is not None:
+        queryset = (
+            queryset.filter(favorite__user=user)
+            if is_favorited == "1"
+            else queryset.exclude(favorite__user=user)
+        )
+
+    return queryset
+
+
+def _parse_ingredient_ids(value):
+    try:
+        ids = {int(pk) for pk in value.split(",") if pk.strip()}
+    except ValueError:
+        ids = None
+    if not ids:
+        raise ValidationError({"ingredients": [
+            "Укажите id ингредиентов через запятую."
+        ]})
+    return ids
+
+
+def _parse_max_missing(value):
+    if not value.isdigit():
+        raise ValidationError({"max_missing": [
+            "Укажите целое неотрицательное число."
+        ]})
+    return int(value)
+
+
+def rank_by_ingredients(query_params):
+    """
+    Подбор рецептов по имеющимся ингредиентам (ingredients=1,2,3)
+    с помощью инвертированного индекса. Возвращает id подходящих рецептов
+    в порядке выдачи или None, если параметр ingredients не задан:
+
+    * ingredients_match=all (по умолчанию) — есть все ингредиенты,
+      новые рецепты первыми;
+    * ingredients_match=any — есть хотя бы один, рецепты с большим числом
+      имеющихся ингредиентов идут первыми;
+    * max_missing=k — рецепту не хватает не более k ингредиентов,
+      порядок по числу имеющихся, затем по числу недостающих.
+    """
+    value = query_params.get("ingredients")
+    if value is None:
+        return None
+    ingredient_ids = _parse_ingredient_ids(value)
+
+    max_missing = query_params.get("max_missing")
+    if max_missing is not None:
+        found = ingredient_index.missing_at_most(
+            ingredient_ids, _parse_max_missing(max_missing)
+        )
+        return ingredient_index.newest_first(
+            found, key=lambda recipe_id: (
+                -found[recipe_id][0], found[recipe_id][1]
+            )
+        )
+
+    match = query_params.get("ingredients_match", INGREDIENTS_MATCH_ALL)
+    if match == INGREDIENTS_MATCH_ALL:
+        return ingredient_index.newest_first(
+            ingredient_index.contains_all(ingredient_ids)
+        )
+    if match == INGREDIENTS_MATCH_ANY:
+        matched = ingredient_index.matched(ingredient_ids)
+        return ingredient_index.newest_first(
+            matched, key=lambda recipe_id: (-matched[recipe_id],)
+        )
+    raise ValidationError({"ingredients_match": [
+        f"Допустимые значения: {INGREDIENTS_MATCH_ALL}, "
+        f"{INGREDIENTS_MATCH_ANY}."
+    ]})
+
+
+def restrict_ranked(queryset, recipe_ids):
+    """
+    Рецепты из ``recipe_ids`` (в том же порядке), которые проходят
+    остальные фильтры ``queryset``. Без фильтров база не читается, иначе
+    читаются только id из ``recipe_ids``.
+    """
+    if not queryset.query.where:
+        return list(recipe_ids)
+    allowed = set(queryset.filter(id__in=recipe_ids).order_by().values_list(
+        "id", flat=True
+    ))
+    return [recipe_id for recipe_id in recipe_ids if recipe_id in allowed]
@@ -0,0 +1,56 @@
+"""
+Индексы, которые нельзя описать в Meta.indexes переносимо.
+
+Поиск ингредиентов по началу названия (name__istartswith) в PostgreSQL
+выполняется как UPPER(name::text) LIKE UPPER('…%'), и использовать
+индекс он может только по тому же выражению с text_pattern_ops.
+В SQLite тот же LIKE использует индекс по name COLLATE NOCASE.
+"""
+
+INGREDIENT_NAME_INDEX = "recipes_ingredient_name_prefix_idx"
+
+POSTGRESQL_INSTALL = (
+    f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS {INGREDIENT_NAME_INDEX}
+    ON recipes_ingredient (UPPER(name::text) text_pattern_ops)
+    """,
+)
+
+SQLITE_INSTALL = (
+    f"""
+    CREATE INDEX IF NOT EXISTS {INGREDIENT_NAME_INDEX}
+    ON recipes_ingredient (name COLLATE NOCASE)
+    """,
+)
+
+POSTGRESQL_UNINSTALL = (
+    f"DROP INDEX CONCURRENTLY IF EXISTS {INGREDIENT_NAME_INDEX}",
+)
+
+SQLITE_UNINSTALL = (
+    f"DROP INDEX IF EXISTS {INGREDIENT_NAME_INDEX}",
+)
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install(connection):
+    """
+    Создаёт недостающие индексы. В PostgreSQL индекс строится
+    без блокировки записи, поэтому вызывать вне транзакции.
+    """
+    _execute(connection, {
+        "postgresql": POSTGRESQL_INSTALL,
+        "sqlite": SQLITE_INSTALL,
+    }.get(connection.vendor, ()))
+
+
+def uninstall(connection):
+    _execute(connection, {
+        "postgresql": POSTGRESQL_UNINSTALL,
+        "sqlite": SQLITE_UNINSTALL,
+    }.get(connection.vendor, ()))
@@ -0,0 +1,322 @@
+"""
+Инвертированный индекс ингредиент -> рецепты для подбора рецептов
+по имеющимся ингредиентам.
+
+Индекс хранится в памяти процесса и строится при первом обращении.
+Кроме состава он хранит дату публикации рецептов: подходящие рецепты
+упорядочиваются в памяти, и из базы читается только нужная страница.
+После коммита транзакции, изменившей состав рецепта, рецепт отмечается
+изменённым и перечитывается из базы при следующем запросе к индексу.
+Процессы обмениваются номерами изменённых рецептов через журнал в базе
+(при JOURNAL): каждое изменение получает следующую версию из строки
+IngredientIndexState и записывается в IngredientIndexChange.
+Версия увеличивается UPDATE в той же транзакции, что и запись журнала:
+блокировка строки упорядочивает писателей, поэтому версии не повторяются,
+а закоммиченная версия означает, что закоммичены и все записи до неё.
+Процесс сверяет версию не чаще раза в CHECK_INTERVAL секунд и
+перечитывает только изменённые рецепты (или весь индекс, если журнал
+изменений уже очищен). Изменения своего процесса видны сразу. Без
+JOURNAL индекс видит только изменения своего процесса и годится лишь
+для одного процесса.
+
+Производные индексы (recipes.similar) подписываются на изменения через
+``listeners``: метод ``recipes_loaded(recipes, full)`` получает новый
+состав рецептов (пустой — рецепт удалён), при full=True — всех рецептов.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .models import (
+    IngredientIndexChange,
+    IngredientIndexState,
+    Recipe,
+    RecipeIngredient,
+)
+
+#: Настройки по умолчанию, переопределяются словарём INGREDIENT_INDEX
+DEFAULTS = {
+    "JOURNAL": True,
+    "CHECK_INTERVAL": 5,
+    # Отставание, после которого индекс проще построить заново; более
+    # старые записи журнала удаляются
+    "MAX_CHANGES": 1000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "INGREDIENT_INDEX", {}).get(name, DEFAULTS[name])
+
+
+class IngredientIndex:
+    """
+    Множества рецептов для каждого ингредиента, состав и дата публикации
+    (timestamp) каждого рецепта. Запросы отвечают пересечениями
+    и объединениями множеств.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.postings = defaultdict(set)
+        self.recipes = {}
+        self.created = {}
+        self.dirty = set()
+        self.version = None
+        self.checked_at = None
+        self.listeners = []
+
+    # Журнал изменений
+
+    @staticmethod
+    def shared_version():
+        if not get_setting("JOURNAL"):
+            return 0
+        return IngredientIndexState.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk=1
+        ).values_list("version", flat=True).first() or 0
+
+    @staticmethod
+    def advance(step):
+        """
+        Увеличивает версию журнала и возвращает новую. Вызывается внутри
+        транзакции: строка версии заблокирована до её конца.
+        """
+        states = IngredientIndexState.objects.using(DEFAULT_DB_ALIAS)
+        states.get_or_create(pk=1)
+        states.filter(pk=1).update(version=F("version") + step)
+        return states.filter(pk=1).values_list("version", flat=True).get()
+
+    def needs_check(self):
+        """Пора ли сверить версию с журналом."""
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at
+            >= get_setting("CHECK_INTERVAL")
+        )
+
+    # Построение и обновление
+
+    def _set_recipe(self, recipe_id, ingredient_ids, created=None):
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            postings = self.postings[ingredient_id]
+            postings.discard(recipe_id)
+            if not postings:
+                del self.postings[ingredient_id]
+        self.created.pop(recipe_id, None)
+        if ingredient_ids and created is not None:
+            self.recipes[recipe_id] = frozenset(ingredient_ids)
+            self.created[recipe_id] = created
+            for ingredient_id in ingredient_ids:
+                self.postings[ingredient_id].add(recipe_id)
+
+    def rebuild(self):
+        with self._lock:
+            # Версия читается до загрузки: изменения, сделанные во время
+            # загрузки, будут применены повторно, а не потеряны
+            version = self.shared_version()
+            recipes = defaultdict(set)
+            rows = RecipeIngredient.objects.using(
+                DEFAULT_DB_ALIAS
+            ).values_list("recipe_id", "ingredient_id").order_by()
+            for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+                recipes[recipe_id].add(ingredient_id)
+            created = {
+                recipe_id: created_at.timestamp()
+                for recipe_id, created_at in Recipe.objects.using(
+                    DEFAULT_DB_ALIAS
+                ).values_list("id", "created_at").order_by().iterator(
+                    chunk_size=10000
+                )
+            }
+            self.postings = defaultdict(set)
+            self.recipes = {}
+            self.created = {}
+            self.dirty.clear()
+            for recipe_id, ingredient_ids in recipes.items():
+                # Рецепт, удалённый во время загрузки, в индекс не попадает
+                self._set_recipe(
+                    recipe_id, ingredient_ids, created.get(recipe_id)
+                )
+            self.version = version
+            self.checked_at = time.monotonic()
+            self._notify(self.recipes, full=True)
+
+    def reload(self, recipe_ids):
+        """
+        Перечитывает состав рецептов из основной базы: реплика может
+        ещё не содержать только что закоммиченных изменений.
+        """
+        recipes = {recipe_id: set() for recipe_id in recipe_ids}
+        created = {}
+        rows = RecipeIngredient.objects.using(DEFAULT_DB_ALIAS).filter(
+            recipe_id__in=recipe_ids
+        ).values_list(
+            "recipe_id", "ingredient_id", "recipe__created_at"
+        ).order_by()
+        for recipe_id, ingredient_id, created_at in rows:
+            recipes[recipe_id].add(ingredient_id)
+            created[recipe_id] = created_at.timestamp()
+        with self._lock:
+            for recipe_id, ingredient_ids in recipes.items():
+                self._set_recipe(
+                    recipe_id, ingredient_ids, created.get(recipe_id)
+                )
+            self._notify({
+                recipe_id: self.recipes.get(recipe_id, frozenset())
+                for recipe_id in recipes
+            })
+
+    def _notify(self, recipes, full=False):
+        for listener in self.listeners:
+            listener.recipes_loaded(recipes, full)
+
+    def sync(self):
+        """
+        Перечитывает рецепты, изменённые этим процессом, и догоняет
+        изменения, сделанные другими процессами.
+        """
+        with self._lock:
+            if self.version is None:
+                self.rebuild()
+                return
+            changed = set(self.dirty)
+            version = self.version
+            if self.needs_check():
+                version = self.shared_version()
+                self.checked_at = time.monotonic()
+            if version != self.version:
+                if not self.version < version <= (
+                    self.version + get_setting("MAX_CHANGES")
+                ):
+                    self.rebuild()
+                    return
+                changes = IngredientIndexChange.objects.using(
+                    DEFAULT_DB_ALIAS
+                ).filter(
+                    version__gt=self.version, version__lte=version
+                ).values_list("recipe_id", flat=True)
+                changes = list(changes)
+                if len(changes) != version - self.version:
+                    self.rebuild()
+                    return
+                changed.update(changes)
+            if changed:
+                self.reload(changed)
+            self.dirty.clear()
+            self.version = version
+
+    def recipe_changed(self, recipe_id):
+        """
+        Отмечает рецепт изменённым: он будет перечитан при следующем
+        запросе к индексу в этом и в остальных процессах.
+        """
+        if get_setting("JOURNAL"):
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                version = self.advance(1)
+                changes = IngredientIndexChange.objects.using(
+                    DEFAULT_DB_ALIAS
+                )
+                changes.create(version=version, recipe_id=recipe_id)
+                changes.filter(
+                    version__lte=version - get_setting("MAX_CHANGES")
+                ).delete()
+        with self._lock:
+            self.dirty.add(recipe_id)
+
+    def all_changed(self):
+        """
+        Отмечает изменёнными все рецепты (например, после массовой
+        загрузки в обход сигналов): индексы этого и остальных процессов
+        будут построены заново.
+        """
+        if get_setting("JOURNAL"):
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                self.advance(get_setting("MAX_CHANGES") + 1)
+        with self._lock:
+            self.version = None
+
+    def clear(self):
+        with self._lock:
+            self.postings = defaultdict(set)
+            self.recipes = {}
+            self.created = {}
+            self.dirty.clear()
+            self.version = None
+            self.checked_at = None
+            self._notify({}, full=True)
+
+    # Запросы
+
+    def _postings(self, ingredient_ids):
+        return [self.postings.get(pk, set()) for pk in set(ingredient_ids)]
+
+    def contains_all(self, ingredient_ids):
+        """Рецепты, в которых есть все ингредиенты."""
+        self.sync()
+        with self._lock:
+            postings = sorted(self._postings(ingredient_ids), key=len)
+            if not postings:
+                return set()
+            return set(postings[0]).intersection(*postings[1:])
+
+    def contains_any(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов."""
+        self.sync()
+        with self._lock:
+            return set().union(*self._postings(ingredient_ids))
+
+    def matched(self, ingredient_ids):
+        """Число имеющихся ингредиентов для каждого рецепта, где они есть."""
+        self.sync()
+        with self._lock:
+            counts = Counter()
+            for postings in self._postings(ingredient_ids):
+                counts.update(postings)
+            return counts
+
+    def missing_at_most(self, ingredient_ids, k):
+        """
+        Рецепты, для которых не хватает не более k ингредиентов:
+        id рецепта -> (число имеющихся, число недостающих).
+        Рассматриваются рецепты хотя бы с одним имеющимся ингредиентом.
+        """
+        counts = self.matched(ingredient_ids)
+        with self._lock:
+            result = {}
+            for recipe_id, count in counts.items():
+                ingredients = self.recipes.get(recipe_id)
+                if ingredients is None:
+                    continue
+                missing = len(ingredients) - count
+                if missing <= k:
+                    result[recipe_id] = (count, missing)
+            return result
+
+    def newest_first(self, recipe_ids, key=None):
+        """
+        id рецептов по убыванию даты публикации, а если задана функция
+        ``key`` от id рецепта — сначала по возрастанию key.
+        """
+        with self._lock:
+            created = self.created
+            return sorted(recipe_ids, key=lambda recipe_id: (
+                *(key(recipe_id) if key else ()),
+                -created.get(recipe_id, 0),
+                -recipe_id,
+            ))
+
+
+#: Индекс процесса
+ingredient_index = IngredientIndex()
+
+
+def recipe_changed(recipe_id):
+    """Отмечает изменение состава рецепта после коммита транзакции."""
+    transaction.on_commit(
+        lambda: ingredient_index.recipe_changed(recipe_id)
+    )
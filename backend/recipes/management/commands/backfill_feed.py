@@ -0,0 +1,35 @@
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand
+
+# Локальные импорты
+from recipes import feed
+from users.models import Subscription
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill subscription feeds with the latest recipes of followed "
+        "authors (fan-out-on-write authors only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", dest="users",
+            help="Only backfill feeds of these user ids (repeatable)",
+        )
+        parser.add_argument(
+            "--recipes", type=int, default=None,
+            help="Recipes per author (default: FEED['BACKFILL_RECIPES'])",
+        )
+
+    def handle(self, *args, **options):
+        demoted = feed.sync_popular_authors()
+        subscriptions = Subscription.objects.all()
+        if options["users"]:
+            subscriptions = subscriptions.filter(user_id__in=options["users"])
+        processed = demoted + feed.backfill(
+            subscriptions, options["recipes"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Feeds backfilled: {processed} entries processed."
+        ))
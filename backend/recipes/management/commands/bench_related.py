@@ -0,0 +1,61 @@
+# Стандартные библиотеки
+import resource
+import time
+import tracemalloc
+
+# Сторонние библиотеки
+import numpy as np
+from django.core.management.base import BaseCommand
+
+# Локальные импорты
+from recipes import related
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the related recipes computation on synthetic favorites "
+        "(Zipf-distributed popularity, no database access)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--favorites", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--recipes", type=int, default=50_000)
+        parser.add_argument("--zipf", type=float, default=1.3)
+        parser.add_argument("--seed", type=int, default=38)
+
+    def synthetic_favorites(self, options):
+        rng = np.random.default_rng(options["seed"])
+        target = options["favorites"]
+        size = target
+        while True:
+            user_ids = rng.integers(1, options["users"] + 1, size=size)
+            recipe_ids = (
+                rng.zipf(options["zipf"], size=size) - 1
+            ) % options["recipes"] + 1
+            # Повторное добавление в избранное невозможно
+            pairs = np.unique(np.column_stack((user_ids, recipe_ids)), axis=0)
+            if len(pairs) >= target or size >= target * 8:
+                break
+            size *= 2
+        pairs = pairs[rng.permutation(len(pairs))[:target]]
+        return pairs[:, 0], pairs[:, 1]
+
+    def handle(self, *args, **options):
+        user_ids, recipe_ids = self.synthetic_favorites(options)
+        tracemalloc.start()
+        started = time.perf_counter()
+        columns, results = related.compute(user_ids, recipe_ids)
+        rows = sum(len(src) for src, _, _ in results)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f"favorites: {len(user_ids)}\n"
+            f"recipes: {len(columns)}\n"
+            f"related rows: {rows}\n"
+            f"build time: {elapsed:.2f} s\n"
+            f"peak traced memory: {peak / 2 ** 20:.1f} MiB\n"
+            f"max RSS: {rss / 1024:.1f} MiB"
+        )
@@ -0,0 +1,32 @@
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand
+
+# Локальные импорты
+from recipes import related
+from recipes.models import RelatedState
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute 'users who favorited this also favorited' recipes: "
+        "incrementally for favorites added since the last run, or fully "
+        "with --full (run periodically, e.g. from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true",
+            help="Rebuild neighbours of all recipes (also reflects removals)",
+        )
+
+    def handle(self, *args, **options):
+        if options["full"] or not RelatedState.objects.exists():
+            written = related.build()
+            self.stdout.write(self.style.SUCCESS(
+                f"Related recipes rebuilt: {written} rows written."
+            ))
+            return
+        updated = related.update()
+        self.stdout.write(self.style.SUCCESS(
+            f"Related recipes updated for {updated} recipes."
+        ))
@@ -0,0 +1,263 @@
+# Стандартные библиотеки
+from datetime import timedelta
+
+# Сторонние библиотеки
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Локальные импорты
+from api import response_cache
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Subscription, User
+
+FIRST_NAMES = ("Иван", "Мария", "Алексей", "Ольга", "Сергей", "Анна")
+LAST_NAMES = ("Иванов", "Петрова", "Смирнов", "Кузнецова", "Попов")
+WORDS = (
+    "борщ", "суп", "пирог", "салат", "котлеты", "каша", "блины", "рагу",
+    "запеканка", "оладьи", "плов", "жаркое", "домашний", "быстрый",
+    "летний", "овощной", "куриный", "сырный", "бабушкин", "праздничный",
+)
+UNITS = ("г", "кг", "мл", "л", "шт.", "ст. л.", "ч. л.", "по вкусу")
+
+
+def zipf_choice(rng, exponent, count, size):
+    """
+    ``size`` индексов из range(count): малые индексы встречаются
+    чаще (закон Ципфа), как популярные рецепты и авторы.
+    """
+    return (rng.zipf(exponent, size=size) - 1) % count
+
+
+def unique_pairs(first, second):
+    """Пары без повторов, упорядоченные по первому элементу."""
+    return np.unique(np.column_stack((first, second)), axis=0)
+
+
+def sample_pairs(rng, left, right, target, exponent):
+    """
+    До ``target`` различных пар (левый, правый): левый выбирается
+    равномерно, правый — по закону Ципфа, пары из одинаковых значений
+    отбрасываются. Популярные значения дают много повторов, поэтому
+    выборка увеличивается, пока различных пар не станет достаточно.
+    """
+    size = target
+    while True:
+        pairs = unique_pairs(
+            left[rng.integers(len(left), size=size)],
+            right[zipf_choice(rng, exponent, len(right), size)],
+        )
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        if len(pairs) >= target or size >= target * 16:
+            break
+        size *= 2
+    chosen = np.sort(rng.permutation(len(pairs))[:target])
+    return pairs[chosen]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, recipes, favorites, shopping carts "
+        "and subscriptions with Zipf-distributed popularity from a fixed "
+        "seed (bulk inserts, for load testing)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument(
+            "--ingredients", type=int, default=2000,
+            help="Ingredients to create if the table is empty",
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe", type=float, default=8,
+            help="Mean number of ingredients in a recipe (Poisson)",
+        )
+        parser.add_argument("--favorites-per-user", type=float, default=20)
+        parser.add_argument("--carts-per-user", type=float, default=3)
+        parser.add_argument(
+            "--subscriptions-per-user", type=float, default=5
+        )
+        parser.add_argument("--zipf", type=float, default=1.3)
+        parser.add_argument("--seed", type=int, default=48)
+        parser.add_argument(
+            "--prefix", default="synthetic",
+            help="Username prefix of generated users",
+        )
+        parser.add_argument(
+            "--password", default="synthetic-password",
+            help="Password of all generated users",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--clear", action="store_true",
+            help="Delete users with the prefix (and their data) first",
+        )
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options["seed"])
+        self.batch_size = options["batch_size"]
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=prefix)
+        if options["clear"]:
+            existing.delete()
+        elif existing.exists():
+            raise CommandError(
+                f"Users with prefix {prefix!r} already exist, "
+                "use --clear or another --prefix"
+            )
+        with transaction.atomic():
+            ingredient_ids = self.ingredients(options["ingredients"])
+            user_ids = self.users(
+                options["users"], prefix, options["password"]
+            )
+            recipe_ids = self.recipes(
+                options["recipes"], user_ids, ingredient_ids, options
+            )
+            for model, per_user in (
+                (Favorite, options["favorites_per_user"]),
+                (ShoppingCart, options["carts_per_user"]),
+            ):
+                self.relations(
+                    model, user_ids, recipe_ids, per_user, options["zipf"]
+                )
+            self.subscriptions(
+                user_ids, options["subscriptions_per_user"],
+                options["zipf"],
+            )
+            # Массовая вставка обходит сигналы: производные данные
+            # пересчитываются целиком
+            call_command("sync_counters", stdout=self.stdout._out)
+            call_command("backfill_feed", stdout=self.stdout._out)
+            call_command("update_trending", stdout=self.stdout._out)
+            call_command("build_related", full=True, stdout=self.stdout._out)
+            transaction.on_commit(ingredient_index.all_changed)
+            transaction.on_commit(response_cache.bump)
+        # Статистика планировщика после массовой загрузки
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(user_ids)} users and {len(recipe_ids)} recipes."
+        ))
+
+    def bulk_create(self, model, objects):
+        created = model.objects.bulk_create(
+            objects, batch_size=self.batch_size
+        )
+        self.stdout.write(f"{model.__name__}: {len(created)} rows")
+        return created
+
+    def ingredients(self, count):
+        ids = list(Ingredient.objects.values_list("id", flat=True))
+        if not ids:
+            ids = [
+                ingredient.id for ingredient in self.bulk_create(
+                    Ingredient,
+                    [
+                        Ingredient(
+                            name=f"ингредиент {index:05}",
+                            measurement_unit=UNITS[index % len(UNITS)],
+                        )
+                        for index in range(count)
+                    ],
+                )
+            ]
+        # Популярность ингредиента (соль, лук) не зависит от его id
+        return np.array(ids)[self.rng.permutation(len(ids))]
+
+    def users(self, count, prefix, password):
+        # Хеш один на всех: PBKDF2 для каждого пользователя занял бы минуты
+        password = make_password(password)
+        first = self.rng.integers(len(FIRST_NAMES), size=count)
+        last = self.rng.integers(len(LAST_NAMES), size=count)
+        users = self.bulk_create(User, [
+            User(
+                username=f"{prefix}{index}",
+                email=f"{prefix}{index}@example.com",
+                first_name=FIRST_NAMES[first[index]],
+                last_name=LAST_NAMES[last[index]],
+                password=password,
+            )
+            for index in range(count)
+        ])
+        return np.array([user.id for user in users])
+
+    def recipes(self, count, user_ids, ingredient_ids, options):
+        rng = self.rng
+        authors = user_ids[
+            zipf_choice(rng, options["zipf"], len(user_ids), count)
+        ]
+        names = rng.integers(len(WORDS), size=(count, 2))
+        cooking_times = rng.integers(5, 240, size=count)
+        recipes = self.bulk_create(Recipe, [
+            Recipe(
+                author_id=int(authors[index]),
+                name=" ".join(
+                    WORDS[word] for word in names[index]
+                ).capitalize(),
+                image=f"recipes/images/synthetic{index % 100}.png",
+                text=" ".join(
+                    WORDS[word] for word in rng.integers(len(WORDS), size=40)
+                ).capitalize(),
+                cooking_time=int(cooking_times[index]),
+            )
+            for index in range(count)
+        ])
+        recipe_ids = np.array([recipe.id for recipe in recipes])
+        sizes = np.clip(
+            rng.poisson(options["ingredients_per_recipe"], size=count),
+            1, len(ingredient_ids),
+        )
+        pairs = unique_pairs(
+            np.repeat(recipe_ids, sizes),
+            ingredient_ids[zipf_choice(
+                rng, options["zipf"], len(ingredient_ids), sizes.sum()
+            )],
+        )
+        amounts = rng.integers(1, 1000, size=len(pairs))
+        self.bulk_create(RecipeIngredient, [
+            RecipeIngredient(
+                recipe_id=int(recipe_id),
+                ingredient_id=int(ingredient_id),
+                amount=int(amount),
+            )
+            for (recipe_id, ingredient_id), amount in zip(pairs, amounts)
+        ])
+        return recipe_ids
+
+    def relations(self, model, user_ids, recipe_ids, per_user, exponent):
+        pairs = sample_pairs(
+            self.rng, user_ids, recipe_ids, int(len(user_ids) * per_user),
+            exponent,
+        )
+        # События за последнюю неделю: есть что считать популярным
+        now = timezone.now()
+        ages = self.rng.integers(0, 7 * 24 * 3600, size=len(pairs))
+        self.bulk_create(model, [
+            model(
+                user_id=int(user_id),
+                recipe_id=int(recipe_id),
+                created_at=now - timedelta(seconds=int(age)),
+            )
+            for (user_id, recipe_id), age in zip(pairs, ages)
+        ])
+
+    def subscriptions(self, user_ids, per_user, exponent):
+        pairs = sample_pairs(
+            self.rng, user_ids, user_ids, int(len(user_ids) * per_user),
+            exponent,
+        )
+        self.bulk_create(Subscription, [
+            Subscription(user_id=int(user_id), author_id=int(author_id))
+            for user_id, author_id in pairs
+        ])
@@ -0,0 +1,120 @@
+# Стандартные библиотеки
+import random
+import time
+
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand
+
+# Локальные импорты
+from recipes.ingredient_index import ingredient_index
+from recipes.similar import SimilarIndex, jaccard, similar_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the MinHash/LSH similar recipes index and measure build "
+        "time, query latency and recall against exact Jaccard top-K"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--synthetic", type=int, default=0, metavar="RECIPES",
+            help="Use generated recipes instead of the database",
+        )
+        parser.add_argument("--ingredients", type=int, default=2000)
+        parser.add_argument("--queries", type=int, default=1000)
+        parser.add_argument(
+            "--recall-sample", type=int, default=100,
+            help="Recipes to compare with brute force (0 to skip)",
+        )
+        parser.add_argument(
+            "--threshold", type=float, default=0.5,
+            help="Minimal Jaccard of exact neighbours counted in recall",
+        )
+        parser.add_argument("--top-k", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=39)
+
+    def synthetic_recipes(self, count, ingredients, rand):
+        """
+        Наборы ингредиентов с популярностью по Ципфу; часть рецептов —
+        вариации уже созданных, чтобы были близкие соседи.
+        """
+        weights = [1 / rank for rank in range(1, ingredients + 1)]
+        population = range(1, ingredients + 1)
+        recipes = {}
+        for recipe_id in range(1, count + 1):
+            if recipes and rand.random() < 0.3:
+                base = set(recipes[rand.randint(1, len(recipes))])
+                base.discard(rand.choice(sorted(base)))
+                base.update(rand.choices(population, weights, k=1))
+            else:
+                base = set(rand.choices(
+                    population, weights, k=rand.randint(5, 15)
+                ))
+            recipes[recipe_id] = frozenset(base)
+        return recipes
+
+    def handle(self, *args, **options):
+        rand = random.Random(options["seed"])
+        started = time.perf_counter()
+        if options["synthetic"]:
+            recipes = self.synthetic_recipes(
+                options["synthetic"], options["ingredients"], rand
+            )
+            started = time.perf_counter()
+            index = SimilarIndex()
+            index.recipes_loaded(recipes, full=True)
+        else:
+            ingredient_index.rebuild()
+            index = similar_index
+            recipes = index.sets
+        build_time = time.perf_counter() - started
+        self.stdout.write(
+            f"recipes: {len(index.sets)}\n"
+            f"buckets: {len(index.buckets)}\n"
+            f"build time: {build_time:.2f} s"
+        )
+        if not recipes:
+            return
+
+        recipe_ids = list(recipes)
+        queries = rand.choices(recipe_ids, k=options["queries"])
+        timings = []
+        for recipe_id in queries:
+            started = time.perf_counter()
+            index.similar(recipe_id, options["top_k"])
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(
+            f"query mean: {sum(timings) / len(timings) * 1e6:.0f} us\n"
+            f"query p50: {timings[len(timings) // 2] * 1e6:.0f} us\n"
+            f"query p99: {timings[int(len(timings) * 0.99)] * 1e6:.0f} us"
+        )
+
+        expected_total = found_total = 0
+        sample = rand.sample(
+            recipe_ids, min(options["recall_sample"], len(recipe_ids))
+        )
+        for recipe_id in sample:
+            exact = sorted(
+                (
+                    (-jaccard(recipes[recipe_id], ingredients), other)
+                    for other, ingredients in recipes.items()
+                    if other != recipe_id
+                ),
+            )[:options["top_k"]]
+            expected = {
+                other for score, other in exact
+                if -score >= options["threshold"]
+            }
+            found = {
+                other
+                for other, _ in index.similar(recipe_id, options["top_k"])
+            }
+            expected_total += len(expected)
+            found_total += len(expected & found)
+        if expected_total:
+            self.stdout.write(
+                f"recall@{options['top_k']} (Jaccard >= "
+                f"{options['threshold']}): {found_total / expected_total:.3f}"
+            )
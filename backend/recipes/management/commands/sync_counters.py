@@ -0,0 +1,31 @@
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Локальные импорты
+from recipes.counters import sync_counter
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+#: (модель, счётчик, связанная модель, внешний ключ связанной модели)
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (Recipe, "shopping_carts_count", ShoppingCart, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "subscribers_count", Subscription, "author"),
+)
+
+
+class Command(BaseCommand):
+    help = "Recalculate denormalized counters and fix any drift"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = sync_counter(
+                model.objects.all(), field, related_model, related_field
+            )
+            self.stdout.write(
+                f"{model.__name__}.{field}: fixed {fixed} rows"
+            )
+        self.stdout.write(self.style.SUCCESS("Counters synchronized."))
@@ -0,0 +1,18 @@
+# Сторонние библиотеки
+from django.core.management.base import BaseCommand
+
+# Локальные импорты
+from recipes.trending import update_scores
+
+
+class Command(BaseCommand):
+    help = (
+        "Add favorites and shopping cart additions made since the last run "
+        "to the trending recipes ranking (run periodically, e.g. from cron)"
+    )
+
+    def handle(self, *args, **options):
+        updated = update_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f"Trending scores updated for {updated} recipes."
+        ))
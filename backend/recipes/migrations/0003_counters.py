@@ -0,0 +1,54 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def set_counter(model, field, related_model, related_field):
+    """Записывает в ``field`` число строк ``related_model``."""
+    model.objects.update(**{field: Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )})
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+    set_counter(Recipe, "favorites_count", Favorite, "recipe")
+    set_counter(Recipe, "shopping_carts_count", ShoppingCart, "recipe")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Добавлено в избранное"
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="shopping_carts_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Добавлено в списки покупок",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:35
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from recipes import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0003_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
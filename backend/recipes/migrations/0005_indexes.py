@@ -0,0 +1,39 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+from recipes import indexes
+
+
+def install_indexes(apps, schema_editor):
+    indexes.install(schema_editor.connection)
+
+
+def uninstall_indexes(apps, schema_editor):
+    indexes.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY не выполняется внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("recipes", "0004_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["-created_at"], name="recipe_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["author", "-created_at"],
+                name="recipe_author_created_idx",
+            ),
+        ),
+        migrations.RunPython(install_indexes, uninstall_indexes),
+    ]
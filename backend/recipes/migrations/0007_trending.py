@@ -0,0 +1,51 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_timeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_favorite_id', models.BigIntegerField(default=0)),
+                ('last_shopping_cart_id', models.BigIntegerField(default=0)),
+                ('epoch', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Состояние рейтинга популярности',
+                'verbose_name_plural': 'Состояние рейтинга популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending_score', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг популярности',
+                'verbose_name_plural': 'Рейтинги популярности',
+                'indexes': [models.Index(fields=['-score'], name='trending_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_favorite_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Состояние похожих рецептов',
+                'verbose_name_plural': 'Состояние похожих рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Сходство')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_recipes', to='recipes.recipe', verbose_name='Рецепт')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='recipes.recipe', verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'indexes': [models.Index(fields=['recipe', '-score'], name='related_recipe_score_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'related'), name='unique_related_recipe'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.17 on 2026-10-19 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_timeline_cursor_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientIndexChange',
+            fields=[
+                ('version', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('recipe_id', models.BigIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Изменение индекса ингредиентов',
+                'verbose_name_plural': 'Изменения индекса ингредиентов',
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Версия индекса ингредиентов',
+                'verbose_name_plural': 'Версия индекса ингредиентов',
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.17 on 2026-10-19 13:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def mark_popular_authors(apps, schema_editor):
+    """
+    Авторы, которым рецепты уже не раскладывались по лентам: до этой
+    миграции это определялось только числом подписчиков.
+    """
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    PopularAuthor = apps.get_model("recipes", "PopularAuthor")
+    limit = getattr(settings, "FEED", {}).get("FANOUT_LIMIT", 1000)
+    PopularAuthor.objects.bulk_create(
+        PopularAuthor(author_id=author_id)
+        for author_id in User.objects.filter(
+            subscribers_count__gte=limit
+        ).values_list("id", flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_indexes'),
+        ('recipes', '0010_ingredient_index_journal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popular_author', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Популярный автор',
+                'verbose_name_plural': 'Популярные авторы',
+            },
+        ),
+        migrations.RunPython(
+            mark_popular_authors, migrations.RunPython.noop
+        ),
+    ]
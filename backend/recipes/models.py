@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from constants import NAME_MAX_LENGTH, UNIT_MAX_LENGTH
 
 User = get_user_model()
@@ -62,11 +64,30 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name="Дата создания",
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Добавлено в избранное",
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Добавлено в списки покупок",
+    )
+    # Заполняется триггером PostgreSQL, см. recipes.search
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["-created_at"], name="recipe_created_idx"),
+            models.Index(
+                fields=["author", "-created_at"],
+                name="recipe_author_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -116,6 +137,11 @@ class UserRecipeRelation(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name="Дата добавления",
+    )
 
     class Meta:
         abstract = True
@@ -157,3 +183,182 @@ class ShoppingCart(UserRecipeRelation):
                 name="unique_user_recipe_in_shopping_cart"
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Рецепт в ленте подписчика. Записи создаются при публикации рецепта
+    (fan-out-on-write), дата публикации копируется для сортировки ленты.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+        verbose_name="Подписчик",
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Рецепт",
+    )
+    created_at = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи лент"
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_timeline_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-recipe"],
+                name="timeline_user_created_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} <- {self.recipe}"
+
+
+class PopularAuthor(models.Model):
+    """
+    Автор, рецепты которого добавляются к лентам при чтении
+    (fan-out-on-read) и не раскладываются по лентам при публикации.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="popular_author",
+        verbose_name="Автор",
+    )
+
+    class Meta:
+        verbose_name = "Популярный автор"
+        verbose_name_plural = "Популярные авторы"
+
+    def __str__(self):
+        return f"{self.author}"
+
+
+class TrendingScore(models.Model):
+    """
+    Материализованный рейтинг популярности рецепта: сумма весов добавлений
+    в избранное и корзину, затухающая со временем (см. recipes.trending).
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending_score",
+        verbose_name="Рецепт",
+    )
+    score = models.FloatField(verbose_name="Рейтинг")
+
+    class Meta:
+        verbose_name = "Рейтинг популярности"
+        verbose_name_plural = "Рейтинги популярности"
+        indexes = [
+            models.Index(fields=["-score"], name="trending_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id}: {self.score}"
+
+
+class TrendingState(models.Model):
+    """
+    Состояние задачи пересчёта рейтинга: последние учтённые события
+    и момент, к которому приведены рейтинги.
+    """
+    last_favorite_id = models.BigIntegerField(default=0)
+    last_shopping_cart_id = models.BigIntegerField(default=0)
+    epoch = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Состояние рейтинга популярности"
+        verbose_name_plural = "Состояние рейтинга популярности"
+
+    def __str__(self):
+        return f"{self.updated_at}"
+
+
+class RelatedRecipe(models.Model):
+    """Рецепт, который часто добавляют в избранное вместе с данным."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="related_recipes",
+        verbose_name="Рецепт",
+    )
+    related = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="related_from",
+        verbose_name="Похожий рецепт",
+    )
+    score = models.FloatField(verbose_name="Сходство")
+
+    class Meta:
+        verbose_name = "Похожий рецепт"
+        verbose_name_plural = "Похожие рецепты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipe", "related"],
+                name="unique_related_recipe"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["recipe", "-score"], name="related_recipe_score_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} ~ {self.related_id}: {self.score}"
+
+
+class RelatedState(models.Model):
+    """Последнее избранное, учтённое в похожих рецептах."""
+    last_favorite_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Состояние похожих рецептов"
+        verbose_name_plural = "Состояние похожих рецептов"
+
+    def __str__(self):
+        return f"{self.updated_at}"
+
+
+class IngredientIndexState(models.Model):
+    """
+    Версия журнала изменений индекса ингредиентов (recipes.ingredient_index).
+    """
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Версия индекса ингредиентов"
+        verbose_name_plural = "Версия индекса ингредиентов"
+
+    def __str__(self):
+        return f"{self.version}"
+
+
+class IngredientIndexChange(models.Model):
+    """Запись журнала: рецепт, состав которого изменился в этой версии."""
+    version = models.BigIntegerField(primary_key=True)
+    recipe_id = models.BigIntegerField()
+
+    class Meta:
+        verbose_name = "Изменение индекса ингредиентов"
+        verbose_name_plural = "Изменения индекса ингредиентов"
+
+    def __str__(self):
+        return f"{self.version}: {self.recipe_id}"
@@ -1,8 +1,104 @@
-from rest_framework.pagination import PageNumberPagination
+from datetime import datetime
 
-from constants import DEFAULT_PAGE_SIZE
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor,
+    CursorPagination,
+    PageNumberPagination,
+)
+
+from constants import DEFAULT_PAGE_SIZE, ESTIMATED_COUNT_THRESHOLD
 
 
 class RecipePagination(PageNumberPagination):
     page_size = DEFAULT_PAGE_SIZE
-    page_size_query_param = "limit" 
\ No newline at end of file
+    page_size_query_param = "limit"
+
+
+class RecipeSearchPagination(CursorPagination):
+    """Курсорная пагинация результатов поиска по убыванию релевантности."""
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = "limit"
+    ordering = ("-search_rank", "-id")
+
+
+class RecipeFeedPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты подписок по дате публикации.
+    Позиция курсора — дата публикации и id рецепта; строки страницы
+    возвращает функция ``fetch(limit, position, reverse)``
+    (recipes.feed.feed_page).
+    """
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = "limit"
+    ordering = ("-created_at", "-id")
+
+    def paginate_rows(self, fetch, request):
+        """Пары (дата публикации, id рецепта) текущей страницы."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = None
+        if self.cursor and self.cursor.position:
+            created_at, _, recipe_id = self.cursor.position.rpartition("|")
+            try:
+                position = (
+                    datetime.fromisoformat(created_at), int(recipe_id)
+                )
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        rows = fetch(self.page_size + 1, position, reverse)
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        # Страница, с которой пришли по курсору, существует
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.rows = rows
+        return rows
+
+    def link(self, row, reverse):
+        created_at, recipe_id = row
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=reverse,
+            position=f"{created_at.isoformat()}|{recipe_id}",
+        ))
+
+    def get_next_link(self):
+        if not (self.has_next and self.rows):
+            return None
+        return self.link(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.rows):
+            return None
+        return self.link(self.rows[0], reverse=True)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для админки больших таблиц.
+    Для списка без фильтров берёт оценку числа строк из статистики
+    PostgreSQL вместо полного COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
@@ -0,0 +1,244 @@
+"""
+Рекомендации «добавившие этот рецепт в избранное добавляли также».
+
+Избранное загружается в разреженную матрицу пользователь x рецепт
+(scipy.sparse), совместная встречаемость рецептов считается
+произведением матриц блоками рецептов, сходство — косинусное:
+common / sqrt(n_i * n_j), где n — число добавлений рецепта в избранное.
+Для каждого рецепта сохраняются TOP_K соседей (модель RelatedRecipe).
+
+Инкрементальное обновление учитывает избранное с id больше сохранённого
+в RelatedState и пересчитывает только рецепты пользователей, добавивших
+его: их строки совместной встречаемости вычисляются по избранному
+пользователей, добавивших эти рецепты. Рецепты пересчитываются пачками
+по TARGET_BATCH_SIZE, а для каждого берутся не больше MAX_FAN_IN
+последних добавивших его пользователей: у популярного рецепта сходство
+оценивается по выборке, n берётся из счётчика рецепта. Удаления
+из избранного и изменение n у остальных соседей учитываются при полной
+перестройке (build --full).
+"""
+
+import itertools
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Favorite, Recipe, RelatedRecipe, RelatedState
+
+#: Настройки по умолчанию, переопределяются словарём RELATED в settings
+DEFAULTS = {
+    "TOP_K": 10,
+    # Минимум пользователей, добавивших оба рецепта
+    "MIN_COMMON": 2,
+    # Рецептов в одном блоке произведения матриц
+    "BLOCK_SIZE": 2000,
+    "BATCH_SIZE": 10000,
+    "SETTLE_SECONDS": 60,
+    # Рецептов в одной пачке инкрементального обновления
+    "TARGET_BATCH_SIZE": 500,
+    # Последних добавивших рецепт пользователей, по которым
+    # инкрементально пересчитываются его соседи
+    "MAX_FAN_IN": 1000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, "RELATED", {}).get(name, DEFAULTS[name])
+
+
+# Вычисления над массивами
+
+
+def favorites_matrix(user_ids, recipe_ids):
+    """
+    Бинарная матрица пользователь x рецепт из пар (user_ids[i],
+    recipe_ids[i]) и id рецептов, соответствующие её столбцам.
+    """
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    columns, recipe_index = np.unique(recipe_ids, return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(user_index), dtype=np.float32),
+            (user_index, recipe_index),
+        ),
+        shape=(len(users), len(columns)),
+    )
+    return matrix, columns
+
+
+def top_k(rows, cols, scores, k):
+    """Оставляет для каждой строки k элементов с наибольшей оценкой."""
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    sizes = np.diff(np.r_[starts, len(rows)])
+    rank = np.arange(len(rows)) - np.repeat(starts, sizes)
+    keep = rank < k
+    return rows[keep], cols[keep], scores[keep]
+
+
+def neighbours(matrix, counts, rows, k, min_common, block_size):
+    """
+    Соседи рецептов-столбцов ``rows`` по косинусному сходству.
+    ``counts`` — число добавлений каждого столбца в избранное.
+    Выдаёт по блокам массивы (столбец, столбец соседа, сходство).
+    """
+    by_column = matrix.tocsc()
+    counts = np.asarray(counts, dtype=np.float64)
+    for start in range(0, len(rows), block_size):
+        block = rows[start:start + block_size]
+        common = (by_column[:, block].T @ matrix).tocoo()
+        src = block[common.row]
+        dst = common.col
+        keep = (src != dst) & (common.data >= min_common)
+        src, dst = src[keep], dst[keep]
+        scores = common.data[keep] / np.sqrt(counts[src] * counts[dst])
+        if len(src):
+            yield top_k(src, dst, scores, k)
+
+
+# Работа с базой
+
+
+def load_favorites(queryset):
+    """Пары (пользователь, рецепт) избранного в виде двух массивов."""
+    pairs = np.fromiter(
+        itertools.chain.from_iterable(
+            queryset.values_list("user_id", "recipe_id").order_by().iterator(
+                chunk_size=get_setting("BATCH_SIZE")
+            )
+        ),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def store(columns, results):
+    """Записывает соседей; возвращает число записанных строк."""
+    written = 0
+    for src, dst, scores in results:
+        written += len(RelatedRecipe.objects.bulk_create(
+            (
+                RelatedRecipe(
+                    recipe_id=recipe, related_id=related, score=score
+                )
+                for recipe, related, score in zip(
+                    columns[src].tolist(),
+                    columns[dst].tolist(),
+                    scores.tolist(),
+                )
+            ),
+            batch_size=get_setting("BATCH_SIZE"),
+        ))
+    return written
+
+
+def compute(user_ids, recipe_ids, target_ids=None, counts=None):
+    """
+    Соседи рецептов target_ids (по умолчанию всех) по загруженному
+    избранному. ``counts`` — словарь id рецепта -> число добавлений;
+    если не задан, берётся из самой матрицы.
+    """
+    matrix, columns = favorites_matrix(user_ids, recipe_ids)
+    loaded = np.asarray(matrix.sum(axis=0)).ravel()
+    if counts is not None:
+        known = np.array([counts.get(pk, 0) for pk in columns.tolist()])
+        loaded = np.maximum(loaded, known)
+    if target_ids is None:
+        rows = np.arange(len(columns))
+    else:
+        rows = np.flatnonzero(np.isin(columns, list(target_ids)))
+    return columns, neighbours(
+        matrix,
+        loaded,
+        rows,
+        get_setting("TOP_K"),
+        get_setting("MIN_COMMON"),
+        get_setting("BLOCK_SIZE"),
+    )
+
+
+def fan_in(recipe_ids):
+    """
+    Id пользователей, добавивших рецепты ``recipe_ids``:
+    не больше MAX_FAN_IN последних для каждого рецепта.
+    """
+    return set(Favorite.objects.filter(recipe_id__in=recipe_ids).annotate(
+        rank=Window(
+            RowNumber(), partition_by=F("recipe_id"), order_by=F("id").desc()
+        )
+    ).filter(rank__lte=get_setting("MAX_FAN_IN")).values_list(
+        "user_id", flat=True
+    ))
+
+
+def lock_state():
+    state = RelatedState.objects.select_for_update().filter(pk=1).first()
+    return state or RelatedState.objects.create(pk=1)
+
+
+@transaction.atomic
+def build():
+    """Полностью перестраивает соседей всех рецептов."""
+    state = lock_state()
+    last_id = Favorite.objects.order_by("-id").values_list(
+        "id", flat=True
+    ).first() or 0
+    user_ids, recipe_ids = load_favorites(Favorite.objects.filter(
+        id__lte=last_id
+    ))
+    RelatedRecipe.objects.all().delete()
+    written = store(*compute(user_ids, recipe_ids))
+    state.last_favorite_id = last_id
+    state.updated_at = timezone.now()
+    state.save()
+    return written
+
+
+@transaction.atomic
+def update(now=None):
+    """
+    Пересчитывает соседей рецептов, затронутых новым избранным.
+    Возвращает число пересчитанных рецептов.
+    """
+    now = now or timezone.now()
+    state = lock_state()
+    until = now - timedelta(seconds=get_setting("SETTLE_SECONDS"))
+    last_id = state.last_favorite_id
+    users = set()
+    # Событие моложе until и все следующие ждут следующего запуска:
+    # меньший id может принадлежать ещё не завершённой транзакции
+    for event_id, user_id, created_at in Favorite.objects.filter(
+        id__gt=last_id
+    ).order_by("id").values_list("id", "user_id", "created_at").iterator(
+        chunk_size=get_setting("BATCH_SIZE")
+    ):
+        if created_at >= until:
+            break
+        users.add(user_id)
+        last_id = event_id
+    targets = sorted(set(Favorite.objects.filter(
+        user_id__in=users
+    ).values_list("recipe_id", flat=True).distinct()))
+    batch_size = get_setting("TARGET_BATCH_SIZE")
+    for start in range(0, len(targets), batch_size):
+        batch = targets[start:start + batch_size]
+        # Ограниченная выборка добавивших рецепты пачки и их избранное
+        user_ids, recipe_ids = load_favorites(
+            Favorite.objects.filter(user_id__in=fan_in(batch))
+        )
+        counts = dict(Recipe.objects.filter(
+            id__in=np.unique(recipe_ids).tolist()
+        ).values_list("id", "favorites_count"))
+        RelatedRecipe.objects.filter(recipe_id__in=batch).delete()
+        store(*compute(user_ids, recipe_ids, batch, counts))
+    state.last_favorite_id = last_id
+    state.updated_at = now
+    state.save()
+    return len(targets)
@@ -0,0 +1,182 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+PostgreSQL: колонка Recipe.search_vector (русская конфигурация, название
+с весом A, описание с весом B) поддерживается триггером и индексируется GIN.
+SQLite (разработка и тесты): внешняя таблица FTS5 над recipes_recipe,
+поддерживаемая триггерами. Русского стеммера в FTS5 нет, поэтому у слов
+запроса отбрасываются окончания и они ищутся как префиксы.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = "russian"
+RECIPE_TABLE = "recipes_recipe"
+FTS_TABLE = "recipes_recipe_fts"
+
+#: Веса названия и описания для bm25 в SQLite
+FTS_WEIGHTS = (10.0, 1.0)
+
+#: Окончания, отбрасываемые у слов запроса FTS5
+RUSSIAN_ENDING = re.compile(
+    r"(ами|ями|ого|его|ому|ему|ыми|ими|ой|ей|ий|ый|ая|яя|ое|ее|ые|ие"
+    r"|ам|ям|ах|ях|ом|ем|ов|ев|ую|юю|а|я|о|е|ы|и|у|ю|ь)$"
+)
+MIN_STEM_LENGTH = 3
+
+POSTGRESQL_INSTALL = (
+    f"""
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON {RECIPE_TABLE}",
+    # Пересчёт только при изменении текста: обновления счётчиков
+    # рецепта вектор не трогают
+    f"""
+    CREATE TRIGGER recipes_recipe_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON {RECIPE_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector()
+    """,
+    f"UPDATE {RECIPE_TABLE} SET name = name WHERE search_vector IS NULL",
+    f"""
+    CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin
+    ON {RECIPE_TABLE} USING gin (search_vector)
+    """,
+)
+
+POSTGRESQL_UNINSTALL = (
+    f"DROP TRIGGER IF EXISTS recipes_recipe_search_vector ON {RECIPE_TABLE}",
+    "DROP FUNCTION IF EXISTS recipes_recipe_search_vector()",
+    "DROP INDEX IF EXISTS recipes_recipe_search_vector_gin",
+)
+
+SQLITE_INSTALL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text, content='{RECIPE_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+SQLITE_UNINSTALL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install(connection):
+    """Создаёт (или восстанавливает) поисковый индекс и его триггеры."""
+    _execute(connection, {
+        "postgresql": POSTGRESQL_INSTALL,
+        "sqlite": SQLITE_INSTALL,
+    }.get(connection.vendor, ()))
+
+
+def uninstall(connection):
+    _execute(connection, {
+        "postgresql": POSTGRESQL_UNINSTALL,
+        "sqlite": SQLITE_UNINSTALL,
+    }.get(connection.vendor, ()))
+
+
+def stem(word):
+    """Грубая основа слова: без окончания, если основа не слишком коротка."""
+    word = word.lower()
+    stemmed = RUSSIAN_ENDING.sub("", word)
+    return stemmed if len(stemmed) >= MIN_STEM_LENGTH else word
+
+
+def fts_query(text):
+    """
+    Запрос FTS5 из пользовательской строки: все слова обязательны,
+    основа каждого ищется как префикс. Кавычки исключают синтаксис FTS5.
+    """
+    return " ".join(
+        f'"{stem(word)}"*' for word in re.findall(r"\w+", text)
+    )
+
+
+def search_recipes(queryset, text):
+    """
+    Оставляет рецепты, подходящие под запрос, и добавляет аннотацию
+    search_rank (чем больше, тем релевантнее).
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        # double precision вместо real: значение из курсора пагинации
+        # должно сравниваться с рангом без потери точности
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(
+                SearchRank(F("search_vector"), query), FloatField()
+            )
+        )
+    if vendor == "sqlite":
+        match = fts_query(text)
+        if not match:
+            return queryset.none()
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [match],
+        )).annotate(search_rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s "
+            f"AND {FTS_TABLE}.rowid = {RECIPE_TABLE}.id",
+            [match],
+            output_field=FloatField(),
+        ))
+    # Прочие СУБД: поиск подстроки без ранжирования
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
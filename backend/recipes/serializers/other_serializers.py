@@ -35,4 +35,17 @@ def get_recipe_relation_serializer(model):
 FavoriteSerializer = get_recipe_relation_serializer(Favorite)
 
 #: Сериализатор для рецептов в корзине покупок пользователя
-ShoppingCartSerializer = get_recipe_relation_serializer(ShoppingCart) 
\ No newline at end of file
+ShoppingCartSerializer = get_recipe_relation_serializer(ShoppingCart)
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетных операций с избранным и корзиной."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+    def validate_recipes(self, value):
+        """Убирает повторы, сохраняя порядок."""
+        return list(dict.fromkeys(value))
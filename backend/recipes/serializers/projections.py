@@ -0,0 +1,205 @@
+"""
+Представление пользователей и рецептов обычными словарями из строк values()
+в том же формате, что UserSerializer и RecipeReadSerializer.
+"""
+
+from collections import defaultdict
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from users.models import Subscription, User
+from ..models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+
+#: Поля values() для user_data
+USER_FIELDS = ("id", "username", "first_name", "last_name", "email", "avatar")
+
+#: Поля values() для recipe_data
+RECIPE_FIELDS = (
+    "id", "author_id", "name", "image", "text", "cooking_time",
+    "created_at", "favorites_count",
+)
+
+#: Поля values(), нужные для каждого поля ответа recipe_data
+RECIPE_COLUMNS = {
+    "id": ("id",),
+    "author": ("author_id",),
+    "name": ("name",),
+    "image": ("image",),
+    "text": ("text",),
+    "cooking_time": ("cooking_time",),
+    "is_favorited": (),
+    "is_in_shopping_cart": (),
+    "ingredients": (),
+    "created_at": ("created_at",),
+    "favorites_count": ("favorites_count",),
+}
+
+#: Поля values() для short_recipe_data
+SHORT_RECIPE_FIELDS = ("id", "name", "image", "cooking_time")
+
+#: Поля values() модели RecipeIngredient для ingredient_data
+INGREDIENT_FIELDS = (
+    "recipe_id", "ingredient_id", "ingredient__name",
+    "ingredient__measurement_unit", "amount",
+)
+
+DATETIME_FIELD = serializers.DateTimeField()
+
+
+def file_url(model, field, name, request):
+    """URL файла так же, как FileField.to_representation."""
+    if not name:
+        return None
+    url = model._meta.get_field(field).storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def user_data(row, is_subscribed, request):
+    return {
+        "id": row["id"],
+        "username": row["username"],
+        "first_name": row["first_name"],
+        "last_name": row["last_name"],
+        "email": row["email"],
+        "is_subscribed": is_subscribed,
+        "avatar": file_url(User, "avatar", row["avatar"], request),
+    }
+
+
+def ingredient_data(row):
+    return {
+        "id": row["ingredient_id"],
+        "name": row["ingredient__name"],
+        "measurement_unit": row["ingredient__measurement_unit"],
+        "amount": row["amount"],
+    }
+
+
+def recipe_data(
+    row, author, is_favorited, is_in_shopping_cart, ingredients, request
+):
+    return {
+        "id": row["id"],
+        "author": author,
+        "name": row["name"],
+        "image": file_url(Recipe, "image", row["image"], request),
+        "text": row["text"],
+        "cooking_time": row["cooking_time"],
+        "is_favorited": is_favorited,
+        "is_in_shopping_cart": is_in_shopping_cart,
+        "ingredients": ingredients,
+        "created_at": DATETIME_FIELD.to_representation(row["created_at"]),
+        "favorites_count": row["favorites_count"],
+    }
+
+
+def short_recipe_data(row, request):
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "image": file_url(Recipe, "image", row["image"], request),
+        "cooking_time": row["cooking_time"],
+    }
+
+
+def assemble_recipes(
+    rows, authors, ingredients, favorited, in_cart, subscribed, request
+):
+    """
+    Представления рецептов из строк values(*RECIPE_FIELDS), строк авторов
+    (USER_FIELDS), ингредиентов (INGREDIENT_FIELDS) и множеств id отмеченных
+    текущим пользователем рецептов и авторов.
+    """
+    authors = {
+        row["id"]: user_data(row, row["id"] in subscribed, request)
+        for row in authors
+    }
+    recipe_ingredients = defaultdict(list)
+    for row in ingredients:
+        recipe_ingredients[row["recipe_id"]].append(ingredient_data(row))
+    return [
+        recipe_data(
+            row,
+            authors.get(row["author_id"]),
+            row["id"] in favorited,
+            row["id"] in in_cart,
+            recipe_ingredients[row["id"]],
+            request,
+        )
+        for row in rows
+    ]
+
+
+def recipe_columns(fields):
+    """Поля values() для выбранных полей ответа (id нужен всегда)."""
+    return tuple(dict.fromkeys(
+        ("id", *(column for name in fields for column in RECIPE_COLUMNS[name]))
+    ))
+
+
+def build_recipes(rows, request, fields=None):
+    """
+    Представления рецептов страницы без сериализаторов: авторы,
+    ингредиенты и отметки текущего пользователя запрашиваются
+    по одному запросу на всю страницу. Если заданы ``fields``,
+    в ответе только эти поля, а запросы для остальных не выполняются.
+    """
+    wanted = set(RECIPE_COLUMNS if fields is None else fields)
+    recipe_ids = [row["id"] for row in rows]
+    author_ids = {row["author_id"] for row in rows if "author_id" in row}
+    user = request.user
+    favorited, in_cart, subscribed = set(), set(), set()
+    authors, ingredients = (), ()
+    if user.is_authenticated:
+        if "is_favorited" in wanted:
+            favorited = set(Favorite.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list("recipe_id", flat=True))
+        if "is_in_shopping_cart" in wanted:
+            in_cart = set(ShoppingCart.objects.filter(
+                user=user, recipe_id__in=recipe_ids
+            ).values_list("recipe_id", flat=True))
+        if "author" in wanted:
+            subscribed = set(Subscription.objects.filter(
+                user=user, author_id__in=author_ids
+            ).values_list("author_id", flat=True))
+    if "author" in wanted:
+        authors = User.objects.filter(id__in=author_ids).values(*USER_FIELDS)
+    if "ingredients" in wanted:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values(*INGREDIENT_FIELDS)
+    if fields is None:
+        return assemble_recipes(
+            rows, authors, ingredients, favorited, in_cart, subscribed,
+            request,
+        )
+    empty = dict.fromkeys(RECIPE_FIELDS)
+    return [
+        {name: value for name, value in data.items() if name in wanted}
+        for data in assemble_recipes(
+            [{**empty, **row} for row in rows],
+            authors, ingredients, favorited, in_cart, subscribed, request,
+        )
+    ]
+
+
+def recipes_by_author(author_ids, limit=None):
+    """
+    Строки SHORT_RECIPE_FIELDS рецептов авторов одним запросом, не более
+    ``limit`` последних рецептов на автора. Возвращает словарь
+    id автора -> список строк.
+    """
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if limit:
+        recipes = recipes.annotate(position=Window(
+            RowNumber(),
+            partition_by=F("author_id"),
+            order_by=F("created_at").desc(),
+        )).filter(position__lte=limit)
+    grouped = defaultdict(list)
+    for row in recipes.values("author_id", *SHORT_RECIPE_FIELDS):
+        grouped[row.pop("author_id")].append(row)
+    return grouped
@@ -1,11 +1,12 @@
 from rest_framework import serializers
 
+from api.sparse import SparseFieldsMixin
 from users.serializers import UserSerializer
 from ..fields import Base64ImageField
 from ..models import Recipe
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """ Сериализатор для чтения и отображения рецептов. """
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
@@ -18,6 +19,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = [
             "id", "author", "name", "image", "text", "cooking_time",
             "is_favorited", "is_in_shopping_cart", "ingredients", "created_at",
+            "favorites_count",
         ]
 
     def get_is_favorited(self, obj):
@@ -3,6 +3,7 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from constants import MIN_COOKING_TIME
+from ..ingredient_index import recipe_changed
 from ..models import Recipe, RecipeIngredient, Ingredient
 from ..fields import Base64ImageField
 
@@ -124,6 +125,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             for item in ingredients_data
         ]
         RecipeIngredient.objects.bulk_create(recipeingredient_list)
+        # bulk_create не отправляет сигналы
+        recipe_changed(recipe.id)
 
     def to_representation(self, instance):
         """
@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import response_cache
+from users.models import Subscription
+from . import feed, trending
+from .counters import change_counter
+from .ingredient_index import recipe_changed
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+
+User = get_user_model()
+
+#: Счётчик рецепта, который ведётся для каждой модели связи
+RELATION_COUNTERS = {
+    Favorite: "favorites_count",
+    ShoppingCart: "shopping_carts_count",
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_created(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецепта при добавлении в избранное/корзину."""
+    if created:
+        change_counter(
+            Recipe, instance.recipe_id, RELATION_COUNTERS[sender], 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_deleted(sender, instance, **kwargs):
+    """Уменьшает счётчик рецепта при удалении из избранного/корзины."""
+    change_counter(
+        Recipe, instance.recipe_id, RELATION_COUNTERS[sender], -1
+    )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_withdrawn(sender, instance, **kwargs):
+    """Вычитает вклад удалённого события из рейтинга популярности."""
+    trending.withdraw(
+        sender, [(instance.id, instance.recipe_id, instance.created_at)]
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    """Увеличивает количество рецептов автора."""
+    if created:
+        change_counter(User, instance.author_id, "recipes_count", 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Уменьшает количество рецептов автора."""
+    change_counter(User, instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    """Отмечает изменение состава рецепта в индексе ингредиентов."""
+    recipe_changed(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, **kwargs):
+    """Раскладывает новый рецепт по лентам подписчиков после коммита."""
+    if created:
+        recipe_id = instance.pk
+        transaction.on_commit(lambda: feed.fan_out_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_feed_backfill(sender, instance, created, **kwargs):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    if created:
+        subscriptions = Subscription.objects.filter(pk=instance.pk)
+        transaction.on_commit(lambda: feed.backfill(subscriptions))
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_feed_cleanup(sender, instance, **kwargs):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    feed.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def content_changed(sender, **kwargs):
+    """Сбрасывает кеш ответов анонимным пользователям."""
+    response_cache.content_changed()
@@ -0,0 +1,189 @@
+"""
+Похожие рецепты по составу ингредиентов: MinHash и LSH.
+
+Для каждого рецепта вычисляется MinHash-подпись множества ингредиентов
+из NUM_PERM хеш-функций вида (a * x + b) mod p. Подпись делится
+на BANDS полос; рецепты с совпадающей полосой попадают в одну корзину.
+Кандидаты в похожие — рецепты из общих корзин: два рецепта с
+коэффициентом Жаккара J становятся кандидатами с вероятностью
+1 - (1 - J ** r) ** BANDS, где r = NUM_PERM / BANDS. Число общих корзин
+оценивает сходство; лучшие по нему кандидаты упорядочиваются
+по точному коэффициенту Жаккара.
+
+Индекс хранится в памяти процесса и обновляется вместе с индексом
+ингредиентов (recipes.ingredient_index), на изменения которого
+подписан: пересчитываются подписи только изменённых рецептов.
+"""
+
+import itertools
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .ingredient_index import ingredient_index
+
+#: Настройки по умолчанию, переопределяются словарём SIMILAR_RECIPES
+DEFAULTS = {
+    "NUM_PERM": 64,
+    "BANDS": 16,
+    "TOP_K": 10,
+    "SEED": 39,
+    # Корзины больше этого размера не дают кандидатов: в них попадают
+    # рецепты, у которых минимум хешей дают самые частые ингредиенты
+    "MAX_BUCKET": 500,
+    # Сколько кандидатов с наибольшим числом общих корзин (на один
+    # искомый рецепт) сравнивается по точному коэффициенту Жаккара
+    "CANDIDATES_PER_RESULT": 20,
+    # Рецептов в одном блоке при вычислении подписей
+    "BATCH_SIZE": 5000,
+}
+
+#: Простое число Мерсенна 2 ** 31 - 1: a * x + b помещается в uint64
+PRIME = (1 << 31) - 1
+
+
+def get_setting(name):
+    return getattr(settings, "SIMILAR_RECIPES", {}).get(name, DEFAULTS[name])
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    common = len(first & second)
+    return common / (len(first) + len(second) - common)
+
+
+class MinHash:
+    """Набор хеш-функций и вычисление подписей множеств."""
+
+    def __init__(self, num_perm, seed):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+    def signatures(self, sets):
+        """
+        Подписи непустых множеств целых чисел: массив
+        len(sets) x num_perm, по одному минимуму хеша на функцию.
+        """
+        sizes = np.fromiter(map(len, sets), dtype=np.int64, count=len(sets))
+        values = np.fromiter(
+            itertools.chain.from_iterable(sets),
+            dtype=np.uint64,
+            count=int(sizes.sum()),
+        )
+        hashes = (self.a * (values % PRIME) + self.b) % PRIME
+        starts = np.r_[0, np.cumsum(sizes)[:-1]]
+        return np.minimum.reduceat(hashes, starts, axis=1).T
+
+
+class SimilarIndex:
+    """
+    Корзины LSH по полосам MinHash-подписей и состав рецептов
+    для точного ранжирования кандидатов.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self._lock = source._lock if source else threading.RLock()
+        self.minhash = None
+        self.rows = None
+        self.buckets = {}
+        self.keys = {}
+        self.sets = {}
+        if source is not None:
+            with self._lock:
+                source.listeners.append(self)
+                if source.version is not None:
+                    self.recipes_loaded(source.recipes, full=True)
+
+    def _remove(self, recipe_id):
+        for key in self.keys.pop(recipe_id, ()):
+            bucket = self.buckets[key]
+            bucket.discard(recipe_id)
+            if not bucket:
+                del self.buckets[key]
+        self.sets.pop(recipe_id, None)
+
+    def _add(self, recipes):
+        batch_size = get_setting("BATCH_SIZE")
+        items = [
+            (pk, ingredients) for pk, ingredients in recipes if ingredients
+        ]
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            signatures = self.minhash.signatures([
+                ingredients for _, ingredients in batch
+            ])
+            for (recipe_id, ingredients), signature in zip(batch, signatures):
+                keys = [
+                    (band, signature[band * self.rows:(band + 1) * self.rows]
+                     .tobytes())
+                    for band in range(len(signature) // self.rows)
+                ]
+                for key in keys:
+                    self.buckets.setdefault(key, set()).add(recipe_id)
+                self.keys[recipe_id] = keys
+                self.sets[recipe_id] = ingredients
+
+    def recipes_loaded(self, recipes, full=False):
+        """
+        Обновляет подписи рецептов с новым составом (id -> множество
+        ингредиентов); при full=True индекс строится заново.
+        """
+        with self._lock:
+            if full or self.minhash is None:
+                self.minhash = MinHash(
+                    get_setting("NUM_PERM"), get_setting("SEED")
+                )
+                self.rows = get_setting("NUM_PERM") // get_setting("BANDS")
+                self.buckets = {}
+                self.keys = {}
+                self.sets = {}
+            else:
+                for recipe_id in recipes:
+                    self._remove(recipe_id)
+            self._add(recipes.items())
+
+    def candidates(self, recipe_id, limit):
+        """
+        До limit рецептов с наибольшим числом общих корзин. Переполненные
+        корзины не учитываются.
+        """
+        max_bucket = get_setting("MAX_BUCKET")
+        shared = Counter()
+        for key in self.keys.get(recipe_id, ()):
+            bucket = self.buckets[key]
+            if len(bucket) <= max_bucket:
+                shared.update(bucket)
+        shared.pop(recipe_id, None)
+        return [other for other, _ in shared.most_common(limit)]
+
+    def similar(self, recipe_id, k=None):
+        """
+        До k похожих рецептов: список пар (id, коэффициент Жаккара)
+        по убыванию сходства.
+        """
+        if k is None:
+            k = get_setting("TOP_K")
+        if self.source is not None:
+            self.source.sync()
+        with self._lock:
+            ingredients = self.sets.get(recipe_id)
+            if ingredients is None:
+                return []
+            sets = self.sets
+            scored = [
+                (other, jaccard(ingredients, sets[other]))
+                for other in self.candidates(
+                    recipe_id, k * get_setting("CANDIDATES_PER_RESULT")
+                )
+            ]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:k]
+
+
+#: Индекс процесса, обновляется вместе с ingredient_index
+similar_index = SimilarIndex(ingredient_index)
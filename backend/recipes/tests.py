@@ -1,3 +1,1583 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from recipes import async_views, related
+from recipes.batch import remove_relations
+from recipes.ingredient_index import IngredientIndex, ingredient_index
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientIndexChange,
+    IngredientIndexState,
+    PopularAuthor,
+    Recipe,
+    RecipeIngredient,
+    RelatedRecipe,
+    ShoppingCart,
+    TimelineEntry,
+    TrendingScore,
+    TrendingState,
+)
+from recipes.serializers.projections import RECIPE_FIELDS, build_recipes
+from recipes.serializers.recipe_read import RecipeReadSerializer
+from recipes.similar import SimilarIndex
+from recipes.trending import update_scores
+from users.models import Subscription, User
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Борщ',
+            image='recipes/images/borsch.png',
+            text='Варить долго.',
+            cooking_time=90,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_recipe_create_and_delete_change_recipes_count(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_favorite_changes_favorites_count(self):
+        url = reverse('recipe-favorite', args=[self.recipe.id])
+        self.client.post(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.client.delete(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_shopping_cart_changes_shopping_carts_count(self):
+        url = reverse('recipe-shopping-cart', args=[self.recipe.id])
+        self.client.post(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.shopping_carts_count, 1)
+        self.client.delete(url)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.shopping_carts_count, 0)
+
+    def test_subscribe_changes_subscribers_count(self):
+        url = reverse('user-subscribe', args=[self.author.id])
+        response = self.client.post(url)
+        self.assertEqual(response.data['recipes_count'], 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.client.delete(url)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_counter_does_not_go_below_zero(self):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.update(favorites_count=0)
+        favorite.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_sync_counters_fixes_drift(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        Recipe.objects.update(favorites_count=7, shopping_carts_count=0)
+        User.objects.update(recipes_count=5, subscribers_count=3)
+
+        call_command('sync_counters', stdout=StringIO())
+
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.shopping_carts_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+
+
+class AdminQueriesTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='validPass123'
+        )
+        self.client.force_login(self.admin)
+        self.rows = 0
+
+    def add_rows(self, count):
+        for index in range(self.rows, self.rows + count):
+            author = User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                password='validPass123'
+            )
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {index}',
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            Favorite.objects.create(user=self.admin, recipe=recipe)
+            Subscription.objects.create(user=self.admin, author=author)
+        self.rows += count
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def assert_constant_queries(self, url):
+        self.add_rows(2)
+        small = self.count_queries(url)
+        self.add_rows(10)
+        self.assertEqual(self.count_queries(url), small)
+
+    def test_recipe_changelist(self):
+        self.assert_constant_queries(
+            reverse('admin:recipes_recipe_changelist')
+        )
+
+    def test_favorite_changelist(self):
+        self.assert_constant_queries(
+            reverse('admin:recipes_favorite_changelist')
+        )
+
+    def test_subscription_changelist(self):
+        self.assert_constant_queries(
+            reverse('admin:users_subscription_changelist')
+        )
+
+
+class AsyncViewsTests(TestCase):
+    """Асинхронные представления отдают то же, что и DRF."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        sugar = Ingredient.objects.create(name='сахар', measurement_unit='г')
+        self.recipes = []
+        for index in range(8):
+            author = User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                password='validPass123'
+            )
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {index}',
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10 + index,
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=salt, amount=index + 1
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=sugar, amount=5
+            )
+            self.recipes.append(recipe)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        Subscription.objects.create(
+            user=self.user, author=self.recipes[2].author
+        )
+
+    def assert_same(self, view, path, authenticated=True, **kwargs):
+        headers = {}
+        if authenticated:
+            headers['HTTP_AUTHORIZATION'] = f'Token {self.token.key}'
+        self.client.credentials(**headers)
+        expected = self.client.get(path)
+        request = self.factory.get(path, **headers)
+        actual = async_to_sync(view)(request, **kwargs)
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(json.loads(actual.content), expected.json())
+
+    def test_recipe_list(self):
+        self.assert_same(async_views.recipe_list, '/api/recipes/')
+        self.assert_same(async_views.recipe_list, '/api/recipes/?page=2')
+        self.assert_same(
+            async_views.recipe_list, '/api/recipes/', authenticated=False
+        )
+
+    def test_recipe_list_filters(self):
+        self.assert_same(
+            async_views.recipe_list, '/api/recipes/?is_favorited=1'
+        )
+        self.assert_same(
+            async_views.recipe_list,
+            '/api/recipes/?is_in_shopping_cart=0&limit=3',
+        )
+        self.assert_same(
+            async_views.recipe_list,
+            f'/api/recipes/?author={self.recipes[2].author_id}',
+        )
+        self.assert_same(async_views.recipe_list, '/api/recipes/?author=9999')
+
+    def test_recipe_list_invalid_page(self):
+        self.assert_same(async_views.recipe_list, '/api/recipes/?page=100')
+
+    def test_recipe_search(self):
+        self.assert_same(
+            async_views.recipe_list, '/api/recipes/?search=рецепт&limit=3'
+        )
+
+    def test_recipe_detail(self):
+        recipe_id = self.recipes[0].id
+        self.assert_same(
+            async_views.recipe_detail, f'/api/recipes/{recipe_id}/',
+            pk=recipe_id,
+        )
+        self.assert_same(
+            async_views.recipe_detail, '/api/recipes/9999/', pk=9999
+        )
+
+    def test_sparse_fields(self):
+        recipe_id = self.recipes[0].id
+        self.assert_same(
+            async_views.recipe_list, '/api/recipes/?fields=id,is_favorited'
+        )
+        self.assert_same(
+            async_views.recipe_detail,
+            f'/api/recipes/{recipe_id}/?omit=ingredients',
+            pk=recipe_id,
+        )
+
+    def test_ingredient_search(self):
+        self.assert_same(
+            async_views.ingredient_list, '/api/ingredients/?name=со',
+            authenticated=False,
+        )
+        self.assert_same(
+            async_views.ingredient_list, '/api/ingredients/',
+            authenticated=False,
+        )
+
+
+class RecipeSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        self.borsch = self.create_recipe('Борщ', 'Свекла, капуста и мясо.')
+        self.soup = self.create_recipe('Суп', 'Вместо борща: суп с курицей.')
+        self.pie = self.create_recipe('Пирог', 'Тесто и яблоки.')
+        self.url = reverse('recipe-list')
+
+    def create_recipe(self, name, text):
+        return Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image='recipes/images/recipe.png',
+            text=text,
+            cooking_time=30,
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_search_by_name_and_text_ranks_name_first(self):
+        self.assertEqual(self.search('борщ'), [self.borsch.id, self.soup.id])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('суп курица'), [self.soup.id])
+        self.assertEqual(self.search('суп яблоки'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('"пирог" NEAR('), [])
+        self.assertEqual(self.search('пирог*'), [self.pie.id])
+
+    def test_index_follows_recipe_changes(self):
+        self.pie.name = 'Шарлотка'
+        self.pie.save()
+        self.assertEqual(self.search('шарлотка'), [self.pie.id])
+        self.assertEqual(self.search('пирог'), [])
+        self.pie.delete()
+        self.assertEqual(self.search('шарлотка'), [])
+
+    def test_cursor_pagination(self):
+        response = self.client.get(self.url, {'search': 'борщ', 'limit': 1})
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.borsch.id],
+        )
+        self.assertNotIn('count', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.soup.id],
+        )
+        self.assertIsNone(response.data['next'])
+
+    def test_search_with_favorited_filter(self):
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(
+            self.search('борщ', is_favorited='1'), [self.soup.id]
+        )
+        self.assertEqual(
+            self.search('борщ', is_favorited='0'), [self.borsch.id]
+        )
+
+    def test_list_without_search_keeps_page_numbers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['count'], 3)
+
+
+class IngredientFilterTests(TestCase):
+    def setUp(self):
+        ingredient_index.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.client.force_authenticate(user=self.author)
+        self.egg, self.flour, self.milk, self.salt = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('яйцо', 'мука', 'молоко', 'соль')
+        )
+        self.omelette = self.create_recipe('Омлет', self.egg, self.milk)
+        self.pancakes = self.create_recipe(
+            'Блины', self.egg, self.flour, self.milk
+        )
+        self.bread = self.create_recipe('Хлеб', self.flour, self.salt)
+        self.url = reverse('recipe-list')
+
+    def create_recipe(self, name, *ingredients):
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image='recipes/images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        for ingredient in ingredients:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1
+            )
+        return recipe
+
+    def ids(self, *ingredients):
+        return ','.join(str(ingredient.id) for ingredient in ingredients)
+
+    def filter(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_contains_all(self):
+        self.assertEqual(
+            self.filter(ingredients=self.ids(self.egg, self.milk)),
+            [self.pancakes.id, self.omelette.id],
+        )
+        self.assertEqual(
+            self.filter(ingredients=self.ids(self.egg, self.salt)), []
+        )
+
+    def test_contains_any_ranked_by_matched(self):
+        self.assertEqual(
+            self.filter(
+                ingredients=self.ids(self.egg, self.flour, self.salt),
+                ingredients_match='any',
+            ),
+            [self.bread.id, self.pancakes.id, self.omelette.id],
+        )
+
+    def test_missing_at_most(self):
+        have = self.ids(self.egg, self.milk, self.salt)
+        self.assertEqual(
+            self.filter(ingredients=have, max_missing='0'),
+            [self.omelette.id],
+        )
+        self.assertEqual(
+            self.filter(ingredients=have, max_missing='1'),
+            [self.omelette.id, self.pancakes.id, self.bread.id],
+        )
+
+    def test_page_is_cut_from_ranked_ids(self):
+        params = {
+            'ingredients': self.ids(self.egg, self.flour, self.salt),
+            'ingredients_match': 'any',
+            'limit': 1,
+            'page': 2,
+        }
+        self.client.get(self.url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.pancakes.id],
+        )
+        recipe_queries = [
+            query['sql'] for query in queries
+            if 'FROM "recipes_recipe"' in query['sql']
+        ]
+        # Число рецептов считает индекс; из базы читается только страница
+        self.assertFalse(
+            [sql for sql in recipe_queries if 'COUNT(' in sql]
+        )
+        self.assertTrue(recipe_queries)
+        for sql in recipe_queries:
+            self.assertNotIn(str(self.bread.id) + ',', sql)
+
+    def test_ranked_ids_respect_other_filters(self):
+        Favorite.objects.create(user=self.author, recipe=self.omelette)
+        self.assertEqual(
+            self.filter(
+                ingredients=self.ids(self.egg), is_favorited='1'
+            ),
+            [self.omelette.id],
+        )
+
+    def test_invalid_params(self):
+        for params in (
+            {'ingredients': 'abc'},
+            {'ingredients': ''},
+            {'ingredients': self.ids(self.egg), 'max_missing': '-1'},
+            {'ingredients': self.ids(self.egg), 'ingredients_match': 'x'},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_index_follows_recipe_writes(self):
+        self.filter(ingredients=self.ids(self.salt))
+        url = reverse('recipe-detail', args=[self.omelette.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {
+                'ingredients': [
+                    {'id': self.egg.id, 'amount': 2},
+                    {'id': self.salt.id, 'amount': 1},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.filter(ingredients=self.ids(self.salt)),
+            [self.bread.id, self.omelette.id],
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bread.delete()
+        self.assertEqual(
+            self.filter(ingredients=self.ids(self.salt)), [self.omelette.id]
+        )
+
+    @override_settings(INGREDIENT_INDEX={'CHECK_INTERVAL': 0})
+    def test_changes_reach_other_processes_through_journal(self):
+        first, second = IngredientIndex(), IngredientIndex()
+        self.assertEqual(second.contains_all([self.salt.id]), {self.bread.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(
+                recipe=self.omelette, ingredient=self.salt, amount=1
+            )
+        first.recipe_changed(self.omelette.id)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                second.contains_all([self.salt.id]),
+                {self.bread.id, self.omelette.id},
+            )
+        # Версия, журнал и только изменённый рецепт
+        self.assertEqual(len(queries), 3)
+        version = IngredientIndexState.objects.get().version
+        IngredientIndexChange.objects.filter(version=version).delete()
+        third = IngredientIndex()
+        third.version = version - 1
+        self.assertEqual(
+            third.contains_all([self.salt.id]),
+            {self.bread.id, self.omelette.id},
+        )
+        self.assertEqual(third.version, version)
+
+    def test_journal_versions_are_unique(self):
+        index = IngredientIndex()
+        index.recipe_changed(self.bread.id)
+        index.recipe_changed(self.omelette.id)
+        self.assertEqual(
+            list(IngredientIndexChange.objects.order_by(
+                'version'
+            ).values_list('recipe_id', flat=True))[-2:],
+            [self.bread.id, self.omelette.id],
+        )
+        self.assertEqual(
+            IngredientIndexState.objects.get().version,
+            IngredientIndexChange.objects.order_by('version').last().version,
+        )
+
+    def test_other_processes_checked_once_per_interval(self):
+        index = IngredientIndex()
+        index.contains_all([self.salt.id])
+        IngredientIndex().recipe_changed(self.omelette.id)
+        with self.assertNumQueries(0):
+            index.contains_all([self.salt.id])
+
+
+@override_settings(FEED={'FANOUT_LIMIT': 3, 'BACKFILL_RECIPES': 2})
+class FeedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = self.create_user('reader')
+        self.author = self.create_user('author')
+        self.star = self.create_user('star')
+        self.client.force_authenticate(user=self.reader)
+        self.url = reverse('recipe-feed')
+
+    def create_user(self, username):
+        return User.objects.create_user(
+            username=username,
+            email=f'{username}@example.com',
+            password='validPass123'
+        )
+
+    def publish(self, author, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Recipe.objects.create(
+                author=author,
+                name=name,
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+
+    def subscribe(self, user, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=user, author=author)
+
+    def feed(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def names(self, response):
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_fan_out_on_write(self):
+        self.subscribe(self.reader, self.author)
+        self.publish(self.author, 'Первый')
+        self.publish(self.author, 'Второй')
+        self.publish(self.star, 'Чужой')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(self.names(self.feed()), ['Второй', 'Первый'])
+
+    def test_popular_author_is_merged_on_read(self):
+        for index in range(2):
+            self.subscribe(self.create_user(f'fan{index}'), self.star)
+        self.subscribe(self.reader, self.star)
+        self.subscribe(self.reader, self.author)
+        self.publish(self.author, 'Обычный')
+        self.publish(self.star, 'Популярный')
+        self.assertFalse(
+            TimelineEntry.objects.filter(recipe__author=self.star).exists()
+        )
+        self.assertEqual(self.names(self.feed()), ['Популярный', 'Обычный'])
+
+    def test_cursor_pagination(self):
+        self.subscribe(self.reader, self.author)
+        for index in range(3):
+            self.publish(self.author, f'Рецепт {index}')
+        response = self.feed(limit=2)
+        self.assertEqual(self.names(response), ['Рецепт 2', 'Рецепт 1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.names(response), ['Рецепт 0'])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(self.names(response), ['Рецепт 2', 'Рецепт 1'])
+        self.assertIsNone(response.data['previous'])
+        self.assertIsNotNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_merges_popular_authors_without_duplicates(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.reader, self.star)
+        first = self.publish(self.star, 'До популярности')
+        self.publish(self.author, 'Обычный')
+        for index in range(2):
+            self.subscribe(self.create_user(f'fan{index}'), self.star)
+        self.publish(self.star, 'Популярный')
+        # Рецепт опубликован до популярности автора: он и в записях ленты,
+        # и среди рецептов популярного автора
+        self.assertTrue(
+            TimelineEntry.objects.filter(recipe=first).exists()
+        )
+        response = self.feed(limit=2)
+        self.assertEqual(self.names(response), ['Популярный', 'Обычный'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.names(response), ['До популярности'])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_queries_do_not_depend_on_feed_size(self):
+        self.subscribe(self.reader, self.author)
+        for index in range(3):
+            self.publish(self.author, f'Рецепт {index}')
+        self.feed(limit=2)
+        with CaptureQueriesContext(connection) as small:
+            self.feed(limit=2)
+        for index in range(3, 10):
+            self.publish(self.author, f'Рецепт {index}')
+        with CaptureQueriesContext(connection) as large:
+            response = self.feed(limit=2)
+        self.assertEqual(self.names(response), ['Рецепт 9', 'Рецепт 8'])
+        self.assertEqual(len(large), len(small))
+        timeline = [
+            query['sql'] for query in large.captured_queries
+            if TimelineEntry._meta.db_table in query['sql']
+        ]
+        self.assertEqual(len(timeline), 1)
+        self.assertIn('LIMIT 3', timeline[0])
+
+    def make_star_popular(self):
+        fans = [self.create_user(f'fan{index}') for index in range(2)]
+        for user in (*fans, self.reader):
+            self.subscribe(user, self.star)
+        self.publish(self.star, 'Популярный')
+        self.assertTrue(
+            PopularAuthor.objects.filter(author=self.star).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(recipe__author=self.star).exists()
+        )
+        return fans
+
+    def test_author_below_limit_is_backfilled(self):
+        fan, _ = self.make_star_popular()
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.get(user=fan, author=self.star).delete()
+        self.assertFalse(
+            PopularAuthor.objects.filter(author=self.star).exists()
+        )
+        self.assertEqual(self.names(self.feed()), ['Популярный'])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, recipe__author=self.star
+        ).exists())
+        self.publish(self.star, 'Снова обычный')
+        self.assertEqual(
+            self.names(self.feed()), ['Снова обычный', 'Популярный']
+        )
+
+    def test_unsubscribe_endpoint_backfills_author_below_limit(self):
+        fan, _ = self.make_star_popular()
+        self.client.force_authenticate(user=fan)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(
+                reverse('user-subscribe', args=[self.star.id])
+            )
+        self.assertEqual(response.status_code, 204)
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.names(self.feed()), ['Популярный'])
+        self.assertFalse(
+            PopularAuthor.objects.filter(author=self.star).exists()
+        )
+
+    def test_backfill_command_syncs_popular_authors(self):
+        self.make_star_popular()
+        User.objects.filter(pk=self.star.pk).update(subscribers_count=0)
+        call_command('backfill_feed', stdout=StringIO())
+        self.assertFalse(
+            PopularAuthor.objects.filter(author=self.star).exists()
+        )
+        self.assertEqual(self.names(self.feed()), ['Популярный'])
+
+    def test_subscribe_backfills_and_unsubscribe_cleans_up(self):
+        for index in range(3):
+            self.publish(self.author, f'Рецепт {index}')
+        self.subscribe(self.reader, self.author)
+        self.assertEqual(self.names(self.feed()), ['Рецепт 2', 'Рецепт 1'])
+        Subscription.objects.get(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.names(self.feed()), [])
+
+    def test_backfill_command(self):
+        Subscription.objects.create(user=self.reader, author=self.author)
+        self.publish(self.author, 'Рецепт')
+        TimelineEntry.objects.all().delete()
+        out = StringIO()
+        call_command('backfill_feed', user=[self.reader.id], stdout=out)
+        self.assertIn('1 entries', out.getvalue())
+        self.assertEqual(self.names(self.feed()), ['Рецепт'])
+
+
+@override_settings(TRENDING={'HALF_LIFE_HOURS': 1, 'SETTLE_SECONDS': 0})
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                password='validPass123'
+            )
+            for index in range(3)
+        ]
+        self.old, self.fresh, self.quiet = (
+            Recipe.objects.create(
+                author=self.author,
+                name=name,
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for name in ('Старый', 'Свежий', 'Тихий')
+        )
+        self.now = timezone.now()
+        TrendingState.objects.create(pk=1, epoch=self.now)
+
+    def add(self, model, user, recipe, hours_ago):
+        return model.objects.create(
+            user=user,
+            recipe=recipe,
+            created_at=self.now - timedelta(hours=hours_ago),
+        )
+
+    def update(self, hours=0, seconds=1):
+        return update_scores(
+            self.now + timedelta(hours=hours, seconds=seconds)
+        )
+
+    def names(self):
+        response = self.client.get(reverse('recipe-trending'))
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_recent_events_outweigh_old_ones(self):
+        for user in self.users:
+            self.add(Favorite, user, self.old, hours_ago=5)
+        self.add(Favorite, self.users[0], self.fresh, hours_ago=0)
+        self.assertEqual(self.update(), 2)
+        self.assertEqual(self.names(), ['Свежий', 'Старый'])
+        score = TrendingScore.objects.get(recipe=self.fresh).score
+        self.assertAlmostEqual(score, 1.0)
+
+    def test_only_new_events_are_processed(self):
+        favorite = self.add(Favorite, self.users[0], self.old, hours_ago=1)
+        self.update()
+        self.add(ShoppingCart, self.users[1], self.fresh, hours_ago=0)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.update(), 1)
+        favorite_queries = [
+            query['sql'] for query in queries
+            if 'FROM "recipes_favorite"' in query['sql']
+        ]
+        self.assertEqual(len(favorite_queries), 1)
+        self.assertIn(f'"id" > {favorite.id}', favorite_queries[0])
+        self.assertEqual(
+            TrendingState.objects.get().last_favorite_id, favorite.id
+        )
+        self.assertEqual(
+            TrendingScore.objects.get(recipe=self.old).score, 0.5
+        )
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.fresh).score, 0.5
+        )
+        self.assertEqual(self.update(), 0)
+
+    @override_settings(TRENDING={'HALF_LIFE_HOURS': 1, 'SETTLE_SECONDS': 60})
+    def test_unsettled_events_wait_for_next_run(self):
+        self.add(Favorite, self.users[0], self.old, hours_ago=1)
+        self.add(Favorite, self.users[1], self.fresh, hours_ago=0)
+        # Более старое событие с большим id тоже ждёт
+        self.add(Favorite, self.users[2], self.quiet, hours_ago=1)
+        self.assertEqual(self.update(), 1)
+        self.assertEqual(self.names(), ['Старый'])
+        self.assertEqual(self.update(seconds=120), 2)
+        self.assertEqual(len(self.names()), 3)
+
+    def test_rebase_keeps_scores_comparable_and_drops_stale(self):
+        self.add(Favorite, self.users[0], self.old, hours_ago=0)
+        self.update()
+        self.add(Favorite, self.users[1], self.fresh, hours_ago=-2)
+        self.update(hours=2)
+        self.assertEqual(self.names(), ['Свежий', 'Старый'])
+        self.add(Favorite, self.users[2], self.quiet, hours_ago=-40)
+        self.update(hours=40)
+        self.assertEqual(
+            TrendingState.objects.get().epoch,
+            self.now + timedelta(hours=40, seconds=1),
+        )
+        self.assertEqual(self.names(), ['Тихий'])
+
+    def test_removal_withdraws_contribution(self):
+        self.add(Favorite, self.users[0], self.fresh, hours_ago=0)
+        self.add(Favorite, self.users[1], self.fresh, hours_ago=0)
+        self.update()
+        Favorite.objects.get(user=self.users[0]).delete()
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.fresh).score, 1.0
+        )
+        Favorite.objects.get(user=self.users[1]).delete()
+        self.assertEqual(self.names(), [])
+
+    def test_endpoint_removal_withdraws_contribution(self):
+        self.add(Favorite, self.users[0], self.fresh, hours_ago=0)
+        self.update()
+        self.client.force_authenticate(user=self.users[0])
+        url = reverse('recipe-favorite', args=[self.fresh.id])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.names(), [])
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        # Удаление не блокирует строку состояния задачи
+        self.assertFalse([
+            query for query in queries
+            if TrendingState._meta.db_table in query['sql']
+            and 'FOR ' in query['sql']
+        ])
+
+    def test_refavorite_counts_once(self):
+        for _ in range(3):
+            Favorite.objects.filter(user=self.users[0]).delete()
+            self.add(Favorite, self.users[0], self.fresh, hours_ago=0)
+            self.update()
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.fresh).score, 1.0
+        )
+
+    def test_unprocessed_removal_is_skipped(self):
+        self.add(Favorite, self.users[0], self.fresh, hours_ago=0)
+        self.update()
+        self.add(Favorite, self.users[1], self.fresh, hours_ago=0).delete()
+        self.update()
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.fresh).score, 1.0
+        )
+
+    def test_batch_removal_withdraws_contribution(self):
+        for recipe in (self.old, self.fresh):
+            self.add(ShoppingCart, self.users[0], recipe, hours_ago=0)
+        self.add(ShoppingCart, self.users[1], self.fresh, hours_ago=0)
+        self.update()
+        remove_relations(
+            ShoppingCart, self.users[0], [self.old.id, self.fresh.id]
+        )
+        self.assertEqual(self.names(), ['Свежий'])
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(recipe=self.fresh).score, 0.5
+        )
+
+
+@override_settings(RELATED={'MIN_COMMON': 1, 'SETTLE_SECONDS': 0})
+class RelatedRecipesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                password='validPass123'
+            )
+            for index in range(4)
+        ]
+        self.recipes = {
+            name: Recipe.objects.create(
+                author=self.users[0],
+                name=name,
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for name in ('Блины', 'Оладьи', 'Сырники', 'Борщ')
+        }
+        self.favorite(0, 'Блины', 'Оладьи', 'Сырники')
+        self.favorite(1, 'Блины', 'Оладьи')
+        self.favorite(2, 'Блины', 'Сырники')
+        self.favorite(3, 'Борщ')
+
+    def favorite(self, user, *names):
+        for name in names:
+            Favorite.objects.create(
+                user=self.users[user], recipe=self.recipes[name]
+            )
+
+    def related_names(self, name):
+        response = self.client.get(
+            reverse('recipe-related', args=[self.recipes[name].id])
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data]
+
+    def rows(self, names):
+        return set(RelatedRecipe.objects.filter(
+            recipe__name__in=names
+        ).values_list('recipe__name', 'related__name', 'score'))
+
+    def test_build_orders_by_cosine_similarity(self):
+        related.build()
+        self.assertEqual(self.related_names('Блины'), ['Оладьи', 'Сырники'])
+        self.assertEqual(self.related_names('Оладьи'), ['Блины', 'Сырники'])
+        self.assertEqual(self.related_names('Борщ'), [])
+        score = RelatedRecipe.objects.get(
+            recipe=self.recipes['Оладьи'], related=self.recipes['Сырники']
+        ).score
+        self.assertAlmostEqual(score, 0.5)
+        response = self.client.get(reverse('recipe-related', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_recomputes_affected_recipes(self):
+        related.build()
+        self.favorite(3, 'Оладьи')
+        updated = related.update(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(updated, 2)
+        self.assertEqual(self.related_names('Борщ'), ['Оладьи'])
+        incremental = self.rows(['Оладьи', 'Борщ'])
+        related.build()
+        self.assertEqual(incremental, self.rows(['Оладьи', 'Борщ']))
+        self.assertEqual(
+            related.update(timezone.now() + timedelta(seconds=1)), 0
+        )
+
+    def test_update_in_batches_matches_build(self):
+        related.build()
+        self.favorite(3, 'Оладьи', 'Блины')
+        with self.settings(RELATED={
+            'MIN_COMMON': 1, 'SETTLE_SECONDS': 0, 'TARGET_BATCH_SIZE': 1,
+        }):
+            updated = related.update(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(updated, 3)
+        names = ['Блины', 'Оладьи', 'Борщ']
+        incremental = self.rows(names)
+        related.build()
+        self.assertEqual(incremental, self.rows(names))
+
+    def test_update_caps_fan_in(self):
+        related.build()
+        self.favorite(3, 'Оладьи')
+        with self.settings(RELATED={
+            'MIN_COMMON': 1, 'SETTLE_SECONDS': 0, 'MAX_FAN_IN': 1,
+        }):
+            related.update(timezone.now() + timedelta(seconds=1))
+        # Соседи «Оладий» считаются только по последнему добавившему
+        self.assertEqual(self.related_names('Оладьи'), ['Борщ'])
+
+    def test_top_k_matches_brute_force(self):
+        rng = np.random.default_rng(38)
+        pairs = np.unique(rng.integers(0, 30, size=(400, 2)), axis=0)
+        user_ids, recipe_ids = pairs[:, 0], pairs[:, 1] + 100
+        dense = np.zeros((30, 30))
+        dense[pairs[:, 0], pairs[:, 1]] = 1
+        common = dense.T @ dense
+        counts = dense.sum(axis=0)
+        with self.settings(RELATED={
+            'TOP_K': 3, 'MIN_COMMON': 2, 'BLOCK_SIZE': 7
+        }):
+            columns, results = related.compute(user_ids, recipe_ids)
+            found = {}
+            for src, dst, scores in results:
+                for row, col, score in zip(src, dst, scores):
+                    found.setdefault(columns[row] - 100, []).append(
+                        (columns[col] - 100, score)
+                    )
+        has_neighbours = (
+            (common >= 2) & ~np.eye(30, dtype=bool)
+        ).any(axis=1)
+        self.assertEqual(
+            sorted(found), np.flatnonzero(has_neighbours).tolist()
+        )
+        for recipe, neighbours in found.items():
+            scores = common[recipe] / np.sqrt(counts[recipe] * counts)
+            scores[recipe] = 0
+            scores[common[recipe] < 2] = 0
+            expected = sorted(
+                np.flatnonzero(scores), key=lambda col: (-scores[col], col)
+            )[:3]
+            self.assertEqual([col for col, _ in neighbours], expected)
+            for col, score in neighbours:
+                self.assertAlmostEqual(score, scores[col], places=5)
+
+    def test_command_builds_then_updates(self):
+        out = StringIO()
+        call_command('build_related', stdout=out)
+        self.assertIn('rebuilt', out.getvalue())
+        call_command('build_related', stdout=out)
+        self.assertIn('updated for', out.getvalue())
+
+
+# Подписи зависят только от SEED и id ингредиентов: id заданы явно,
+# поэтому корзины LSH и результаты одинаковы при каждом запуске. Полоса
+# из одного минимума хеша делает кандидатами рецепты с общим ингредиентом
+@override_settings(SIMILAR_RECIPES={
+    'NUM_PERM': 128, 'BANDS': 128, 'SEED': 39,
+})
+class SimilarRecipesTests(TestCase):
+    def setUp(self):
+        ingredient_index.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.client.force_authenticate(user=self.author)
+        self.ingredients = {
+            name: Ingredient.objects.create(
+                id=9000 + index, name=name, measurement_unit='г'
+            )
+            for index, name in enumerate((
+                'яйцо', 'молоко', 'соль', 'сыр', 'мука', 'сахар',
+                'вода', 'дрожжи',
+            ))
+        }
+        self.omelette = self.create_recipe('Омлет', 'яйцо', 'молоко', 'соль')
+        self.create_recipe('Омлет с сыром', 'яйцо', 'молоко', 'соль', 'сыр')
+        self.create_recipe(
+            'Блины', 'яйцо', 'молоко', 'соль', 'мука', 'сахар'
+        )
+        self.bread = self.create_recipe('Хлеб', 'мука', 'вода', 'дрожжи')
+
+    def create_recipe(self, name, *ingredients):
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name=name,
+            image='recipes/images/recipe.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        for ingredient in ingredients:
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=self.ingredients[ingredient],
+                amount=1,
+            )
+        return recipe
+
+    def similar(self, recipe):
+        response = self.client.get(
+            reverse('recipe-similar', args=[recipe.id])
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data]
+
+    def test_ordered_by_jaccard(self):
+        self.assertEqual(
+            self.similar(self.omelette), ['Омлет с сыром', 'Блины']
+        )
+        self.assertEqual(self.similar(self.bread), ['Блины'])
+        response = self.client.get(reverse('recipe-similar', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_index_follows_recipe_writes(self):
+        self.similar(self.omelette)
+        url = reverse('recipe-detail', args=[self.bread.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {
+                'ingredients': [
+                    {'id': self.ingredients[name].id, 'amount': 1}
+                    for name in ('яйцо', 'молоко', 'соль')
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.similar(self.omelette), ['Хлеб', 'Омлет с сыром', 'Блины']
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bread.delete()
+        self.assertEqual(
+            self.similar(self.omelette), ['Омлет с сыром', 'Блины']
+        )
+
+    def test_standalone_index(self):
+        index = SimilarIndex()
+        index.recipes_loaded({
+            1: frozenset({1, 2, 3}),
+            2: frozenset({1, 2, 3, 4}),
+            3: frozenset({5, 6}),
+        }, full=True)
+        self.assertEqual(index.similar(1), [(2, 0.75)])
+        self.assertEqual(index.similar(3), [])
+        index.recipes_loaded({2: frozenset(), 3: frozenset({1, 2, 3})})
+        self.assertEqual(index.similar(1), [(3, 1.0)])
+        self.assertEqual(index.similar(2), [])
+
+
+class BatchRelationsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user,
+                name=f'Рецепт {index}',
+                image='recipes/images/recipe.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for index in range(3)
+        ]
+        self.ids = [recipe.id for recipe in self.recipes]
+        self.unknown = self.ids[-1] + 100
+        self.client.force_authenticate(user=self.user)
+
+    def statuses(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [
+            (result['id'], result['status'])
+            for result in response.data['recipes']
+        ]
+
+    def test_add_and_remove_favorites(self):
+        url = reverse('recipe-favorite-batch')
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {
+                'recipes': self.ids + [self.unknown, self.ids[1]],
+            }, format='json')
+        self.assertEqual(self.statuses(response), [
+            (self.ids[0], 'exists'),
+            (self.ids[1], 'created'),
+            (self.ids[2], 'created'),
+            (self.unknown, 'not_found'),
+        ])
+        # Проверка, вставка и изменение счётчиков одним запросом,
+        # без сигналов по строкам
+        statements = [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+        self.assertEqual(len(statements), 1, statements)
+        self.assertIn('RETURNING', statements[0])
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'favorites_count', flat=True
+            )),
+            [1, 1, 1],
+        )
+        response = self.client.delete(url, {
+            'recipes': [self.ids[1], self.ids[1], self.unknown],
+        }, format='json')
+        self.assertEqual(self.statuses(response), [
+            (self.ids[1], 'deleted'), (self.unknown, 'not_found'),
+        ])
+        response = self.client.delete(
+            url, {'recipes': [self.ids[1]]}, format='json'
+        )
+        self.assertEqual(self.statuses(response), [(self.ids[1], 'absent')])
+        self.assertEqual(
+            set(Favorite.objects.values_list('recipe_id', flat=True)),
+            {self.ids[0], self.ids[2]},
+        )
+        self.recipes[1].refresh_from_db()
+        self.assertEqual(self.recipes[1].favorites_count, 0)
+
+    def test_add_to_shopping_cart(self):
+        response = self.client.post(
+            reverse('recipe-shopping-cart-batch'),
+            {'recipes': self.ids[:2]},
+            format='json',
+        )
+        self.assertEqual(self.statuses(response), [
+            (self.ids[0], 'created'), (self.ids[1], 'created'),
+        ])
+        self.assertEqual(
+            ShoppingCart.objects.filter(user=self.user).count(), 2
+        )
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].shopping_carts_count, 1)
+
+    def test_invalid_requests(self):
+        url = reverse('recipe-favorite-batch')
+        for data in (
+            {}, {'recipes': []}, {'recipes': ['abc']}, {'recipes': [0]},
+            {'recipes': list(range(1, 102))},
+        ):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.client.force_authenticate(user=None)
+        response = self.client.post(url, {'recipes': self.ids}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class ToggleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Борщ',
+            image='recipes/images/borsch.png',
+            text='Варить долго.',
+            cooking_time=90,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def statements(self, queries):
+        return [
+            query['sql'] for query in queries
+            if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))
+        ]
+
+    def test_favorite_add_is_idempotent(self):
+        url = reverse('recipe-favorite', args=[self.recipe.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Борщ')
+        self.assertEqual(response.data['cooking_time'], 90)
+        self.assertTrue(
+            response.data['image'].endswith('/media/recipes/images/borsch.png')
+        )
+        if connection.vendor == 'postgresql':
+            self.assertEqual(len(self.statements(queries)), 1)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), 1
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_shopping_cart_remove(self):
+        url = reverse('recipe-shopping-cart', args=[self.recipe.id])
+        self.client.post(url)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.shopping_carts_count, 0)
+
+    def test_missing_recipe(self):
+        for url in (
+            reverse('recipe-favorite', args=[self.recipe.id + 100]),
+            reverse('recipe-shopping-cart', args=['abc']),
+        ):
+            self.assertEqual(self.client.post(url).status_code, 404)
+            self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_subscribe_toggle(self):
+        url = reverse('user-subscribe', args=[self.author.id])
+        TimelineEntry.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.author.id)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+        self.assertEqual(
+            self.client.post(
+                reverse('user-subscribe', args=[self.user.id])
+            ).status_code,
+            400,
+        )
+        self.assertEqual(
+            self.client.post(
+                reverse('user-subscribe', args=[self.author.id + 100])
+            ).status_code,
+            404,
+        )
+
+
+class ProjectionContractTests(TestCase):
+    """Быстрый путь списка рецептов совпадает с RecipeReadSerializer."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123',
+            first_name='Иван',
+        )
+        User.objects.filter(pk=self.author.pk).update(
+            avatar='users/avatars/author.png'
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='validPass123'
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('свёкла', 'капуста', 'соль')
+        ]
+        self.recipes = []
+        for index, author in enumerate(
+            (self.author, self.other, self.author)
+        ):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт «{index}»',
+                image=f'recipes/images/{index}.png',
+                text='Описание\nс переносом',
+                cooking_time=10 + index,
+            )
+            for ingredient in ingredients[index:]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=index + 1
+                )
+            self.recipes.append(recipe)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipes[1])
+        Subscription.objects.create(user=self.user, author=self.author)
+
+    def request(self, user=None):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        if user is not None:
+            request.user = user
+        return request
+
+    def assert_same_bytes(self, request):
+        queryset = Recipe.objects.order_by('-created_at')
+        expected = JSONRenderer().render(RecipeReadSerializer(
+            queryset, many=True, context={'request': request}
+        ).data)
+        fast = JSONRenderer().render(
+            build_recipes(list(queryset.values(*RECIPE_FIELDS)), request)
+        )
+        self.assertEqual(fast, expected)
+        return expected
+
+    def test_anonymous(self):
+        self.assert_same_bytes(self.request())
+
+    def test_authenticated(self):
+        data = json.loads(self.assert_same_bytes(self.request(self.user)))
+        self.assertEqual(
+            [recipe['is_favorited'] for recipe in data], [False, False, True]
+        )
+        self.assertTrue(data[0]['author']['is_subscribed'])
+
+    def test_list_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse('recipe-list'), {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        expected = RecipeReadSerializer(
+            Recipe.objects.order_by('-created_at'), many=True,
+            context={'request': self.request(self.user)},
+        ).data
+        self.assertEqual(
+            response.json()['results'],
+            json.loads(JSONRenderer().render(expected)),
+        )
+        # Страница, счётчик, авторы, ингредиенты и три набора отметок
+        self.assertEqual(len(queries), 7)
+
+
+class SparseFieldsTests(TestCase):
+    """Параметры fields и omit сокращают ответ и число запросов."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='validPass123'
+        )
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='validPass123'
+        )
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image='recipes/images/0.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=ingredient, amount=1
+        )
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), queries
+
+    def test_list_fields(self):
+        data, queries = self.get(
+            reverse('recipe-list'), {'fields': 'id,name,is_favorited'}
+        )
+        self.assertEqual(data['results'], [
+            {'id': self.recipe.id, 'name': 'Рецепт', 'is_favorited': True}
+        ])
+        # Страница, счётчик и отметки избранного
+        self.assertEqual(len(queries), 3)
+
+    def test_list_omit(self):
+        data, queries = self.get(
+            reverse('recipe-list'), {'omit': 'text,ingredients,author'}
+        )
+        recipe, = data['results']
+        self.assertEqual(set(recipe), set(RecipeReadSerializer.Meta.fields) - {
+            'text', 'ingredients', 'author'
+        })
+        self.assertFalse(any(
+            '"text"' in query['sql'] for query in queries
+        ))
+        # Страница, счётчик, избранное и корзина
+        self.assertEqual(len(queries), 4)
+
+    def test_retrieve_fields(self):
+        data, _ = self.get(
+            reverse('recipe-detail', args=[self.recipe.id]),
+            {'fields': 'id,author'},
+        )
+        self.assertEqual(data['id'], self.recipe.id)
+        self.assertEqual(set(data), {'id', 'author'})
+        self.assertEqual(data['author']['username'], 'author')
+
+    def test_unknown_field(self):
+        response = self.client.get(
+            reverse('recipe-list'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.json())
+
+    def test_users_fields(self):
+        data, queries = self.get(
+            reverse('user-list'), {'fields': 'id,username'}
+        )
+        self.assertEqual(
+            [set(user) for user in data['results']],
+            [{'id', 'username'}] * 2,
+        )
+        self.assertFalse(any(
+            'subscription' in query['sql'].lower() for query in queries
+        ))
+
+
+class GenerateDataTests(TestCase):
+    options = {
+        'users': 40, 'recipes': 80, 'ingredients': 50,
+        'favorites_per_user': 4, 'carts_per_user': 2,
+        'subscriptions_per_user': 3, 'seed': 7,
+    }
+
+    def generate(self, **options):
+        call_command(
+            'generate_data', **{**self.options, **options}, stdout=StringIO()
+        )
+
+    def snapshot(self):
+        return {
+            'favorites': sorted(Favorite.objects.values_list(
+                'user__username', 'recipe__name', 'recipe__author__username'
+            )),
+            'subscriptions': sorted(Subscription.objects.values_list(
+                'user__username', 'author__username'
+            )),
+            'ingredients': sorted(RecipeIngredient.objects.values_list(
+                'recipe__name', 'ingredient__name', 'amount'
+            )),
+        }
+
+    def test_generates_requested_volume(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Recipe.objects.count(), 80)
+        self.assertEqual(Favorite.objects.count(), 160)
+        self.assertEqual(ShoppingCart.objects.count(), 80)
+        self.assertEqual(Subscription.objects.count(), 120)
+        self.assertFalse(
+            Subscription.objects.filter(user=F('author')).exists()
+        )
+        self.assertTrue(all(
+            recipe.favorites_count == recipe.favorite_set.count()
+            for recipe in Recipe.objects.all()
+        ))
+
+    def test_popularity_is_skewed(self):
+        self.generate()
+        counts = list(Recipe.objects.order_by(
+            '-favorites_count'
+        ).values_list('favorites_count', flat=True))
+        # Самые популярные рецепты собирают заметную долю избранного
+        self.assertGreater(sum(counts[:8]), sum(counts) / 4)
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.snapshot()
+        self.generate(clear=True)
+        self.assertEqual(self.snapshot(), first)
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,274 @@
+"""
+Добавление и удаление связи пользователя с объектом (избранное,
+корзина, подписка) одним запросом к базе.
+
+В PostgreSQL проверка существования объекта, вставка
+(INSERT ... ON CONFLICT DO NOTHING) или удаление (DELETE ... RETURNING)
+и изменение счётчика объекта выполняются одним запросом с WITH.
+Одновременные одинаковые запросы не приводят к IntegrityError: второй
+дожидается первого и ничего не меняет. В SQLite изменяющие запросы
+внутри WITH недоступны, поэтому те же действия выполняются несколькими
+запросами в транзакции.
+
+Пакетные варианты (add_many, remove_many) так же одним запросом
+обрабатывают список объектов и по каждому сообщают, изменилась ли связь:
+статусы берутся из строк, которые запрос действительно вставил или удалил.
+
+Сигналы моделей не отправляются: счётчик меняется самим запросом,
+остальные последствия вызывающий код выполняет явно.
+"""
+
+from django.db import connections, router, transaction
+from django.db.models import F
+
+from users.models import Subscription
+from .counters import change_counter
+from .models import Favorite, ShoppingCart
+
+
+class Toggle:
+    """Связь ``model`` пользователя (поле user) с объектом ``target``."""
+
+    def __init__(self, model, target, counter):
+        self.model = model
+        self.target_field = model._meta.get_field(target)
+        self.target_model = self.target_field.related_model
+        self.counter = counter
+        self.extra_fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in ("user", target)
+        ]
+
+    def _names(self, connection):
+        quote = connection.ops.quote_name
+        return {
+            "table": quote(self.model._meta.db_table),
+            "user": quote(self.model._meta.get_field("user").column),
+            "column": quote(self.target_field.column),
+            "target": quote(self.target_model._meta.db_table),
+            "pk": quote(self.target_model._meta.pk.column),
+            "counter": quote(self.counter),
+            "extra": "".join(
+                f", {quote(field.column)}" for field in self.extra_fields
+            ),
+            "extra_values": ", %s" * len(self.extra_fields),
+        }
+
+    def _extra_values(self, connection):
+        return [
+            field.get_db_prep_save(field.get_default(), connection)
+            for field in self.extra_fields
+        ]
+
+    def _columns(self, connection, fields):
+        quote = connection.ops.quote_name
+        return [
+            quote(self.target_model._meta.get_field(name).column)
+            for name in fields
+        ]
+
+    def add(self, user_id, target_id, fields=()):
+        """
+        Создаёт связь. Возвращает None, если объекта нет, иначе пару
+        (создана ли связь, словарь полей ``fields`` объекта).
+        """
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        names = self._names(connection)
+        extra_values = self._extra_values(connection)
+        if connection.vendor == "postgresql":
+            columns = self._columns(connection, fields)
+            selected = "".join(
+                f", {column}" for column in dict.fromkeys(columns)
+                if column != names["pk"]
+            )
+            sql = """
+                WITH t AS (
+                    SELECT {pk}{selected} FROM {target} WHERE {pk} = %s
+                ), inserted AS (
+                    INSERT INTO {table} ({user}, {column}{extra})
+                    SELECT %s, {pk}{extra_values} FROM t
+                    ON CONFLICT DO NOTHING
+                    RETURNING {column}
+                ), counted AS (
+                    UPDATE {target} SET {counter} = {counter} + 1
+                    WHERE {pk} IN (SELECT {column} FROM inserted)
+                )
+                SELECT EXISTS(SELECT 1 FROM inserted){columns} FROM t
+            """.format(
+                selected=selected,
+                columns="".join(f", {column}" for column in columns),
+                **names,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [target_id, user_id, *extra_values])
+                row = cursor.fetchone()
+            if row is None:
+                return None
+            return row[0], dict(zip(fields, row[1:]))
+        sql = """
+            INSERT INTO {table} ({user}, {column}{extra})
+            SELECT %s, {pk}{extra_values} FROM {target} WHERE {pk} = %s
+            ON CONFLICT DO NOTHING
+            RETURNING {column}
+        """.format(**names)
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user_id, *extra_values, target_id])
+                created = cursor.fetchone() is not None
+            if created:
+                change_counter(self.target_model, target_id, self.counter, 1)
+            if not created or fields:
+                row = self.target_model.objects.using(using).filter(
+                    pk=target_id
+                ).values(*fields or ("pk",)).first()
+                if row is None:
+                    return None
+                return created, {name: row[name] for name in fields}
+            return created, {}
+
+    def _row(self, connection, fields, values):
+        """Значения полей ``fields`` связи, приведённые к типам Python."""
+        row = {}
+        for name, value in zip(fields, values):
+            column = self.model._meta.get_field(name).get_col(
+                self.model._meta.db_table
+            )
+            for converter in (
+                connection.ops.get_db_converters(column)
+                + column.get_db_converters(connection)
+            ):
+                value = converter(value, column, connection)
+            row[name] = value
+        return row
+
+    def add_many(self, user_id, target_ids):
+        """
+        Создаёт связи с объектами ``target_ids``. Возвращает словарь
+        id существующего объекта -> создана ли связь этим запросом.
+        """
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        names = self._names(connection)
+        extra_values = self._extra_values(connection)
+        if connection.vendor == "postgresql":
+            sql = """
+                WITH t AS (
+                    SELECT {pk} FROM {target} WHERE {pk} = ANY(%s)
+                ), inserted AS (
+                    INSERT INTO {table} ({user}, {column}{extra})
+                    SELECT %s, {pk}{extra_values} FROM t
+                    ON CONFLICT DO NOTHING
+                    RETURNING {column}
+                ), counted AS (
+                    UPDATE {target} SET {counter} = {counter} + 1
+                    WHERE {pk} IN (SELECT {column} FROM inserted)
+                )
+                SELECT t.{pk}, inserted.{column} IS NOT NULL
+                FROM t LEFT JOIN inserted ON inserted.{column} = t.{pk}
+            """.format(**names)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    sql, [list(target_ids), user_id, *extra_values]
+                )
+                return dict(cursor.fetchall())
+        placeholders = ", ".join(["%s"] * len(target_ids))
+        sql = """
+            INSERT INTO {table} ({user}, {column}{extra})
+            SELECT %s, {pk}{extra_values} FROM {target}
+            WHERE {pk} IN ({placeholders})
+            ON CONFLICT DO NOTHING
+            RETURNING {column}
+        """.format(placeholders=placeholders, **names)
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user_id, *extra_values, *target_ids])
+                created = {row[0] for row in cursor.fetchall()}
+            self.target_model.objects.using(using).filter(
+                pk__in=created
+            ).update(**{self.counter: F(self.counter) + 1})
+            return {
+                pk: pk in created
+                for pk in self.target_model.objects.using(using).filter(
+                    pk__in=target_ids
+                ).values_list("pk", flat=True)
+            }
+
+    def remove_many(self, user_id, target_ids, fields=()):
+        """
+        Удаляет связи с объектами ``target_ids``. Возвращает словарь
+        id существующего объекта -> пара (была ли связь удалена,
+        словарь полей ``fields`` удалённой связи).
+        """
+        using = router.db_for_write(self.model)
+        connection = connections[using]
+        names = self._names(connection)
+        quote = connection.ops.quote_name
+        columns = [
+            quote(self.model._meta.get_field(name).column) for name in fields
+        ]
+        returning = "".join(f", {column}" for column in columns)
+        if connection.vendor == "postgresql":
+            sql = """
+                WITH t AS (
+                    SELECT {pk} FROM {target} WHERE {pk} = ANY(%s)
+                ), deleted AS (
+                    DELETE FROM {table}
+                    WHERE {user} = %s AND {column} IN (SELECT {pk} FROM t)
+                    RETURNING {column}{returning}
+                ), counted AS (
+                    UPDATE {target} SET {counter} = {counter} - 1
+                    WHERE {pk} IN (SELECT {column} FROM deleted)
+                    AND {counter} > 0
+                )
+                SELECT t.{pk}, deleted.{column} IS NOT NULL{selected}
+                FROM t LEFT JOIN deleted ON deleted.{column} = t.{pk}
+            """.format(
+                returning=returning,
+                selected="".join(f", deleted.{column}" for column in columns),
+                **names,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [list(target_ids), user_id])
+                return {
+                    row[0]: (
+                        row[1],
+                        self._row(connection, fields, row[2:]) if row[1]
+                        else {},
+                    )
+                    for row in cursor.fetchall()
+                }
+        placeholders = ", ".join(["%s"] * len(target_ids))
+        sql = """
+            DELETE FROM {table}
+            WHERE {user} = %s AND {column} IN ({placeholders})
+            RETURNING {column}{returning}
+        """.format(placeholders=placeholders, returning=returning, **names)
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [user_id, *target_ids])
+                deleted = {
+                    row[0]: self._row(connection, fields, row[1:])
+                    for row in cursor.fetchall()
+                }
+            self.target_model.objects.using(using).filter(
+                pk__in=deleted, **{f"{self.counter}__gt": 0}
+            ).update(**{self.counter: F(self.counter) - 1})
+            return {
+                pk: (pk in deleted, deleted.get(pk, {}))
+                for pk in self.target_model.objects.using(using).filter(
+                    pk__in=target_ids
+                ).values_list("pk", flat=True)
+            }
+
+    def remove(self, user_id, target_id, fields=()):
+        """
+        Удаляет связь. Возвращает None, если объекта нет, иначе пару
+        (была ли связь удалена, словарь полей ``fields`` удалённой связи).
+        """
+        return self.remove_many(user_id, [target_id], fields).get(target_id)
+
+
+FAVORITE = Toggle(Favorite, "recipe", "favorites_count")
+SHOPPING_CART = Toggle(ShoppingCart, "recipe", "shopping_carts_count")
+SUBSCRIPTION = Toggle(Subscription, "author", "subscribers_count")
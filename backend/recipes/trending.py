@@ -0,0 +1,203 @@
+"""
+Рейтинг популярности рецептов с затуханием по времени.
+
+Каждое добавление в избранное или корзину даёт рецепту вес,
+который уменьшается вдвое за HALF_LIFE_HOURS. Чтобы рейтинги рецептов,
+обновлённых в разное время, оставались сравнимыми, вклад события
+хранится приведённым к общей точке отсчёта ``TrendingState.epoch``:
+w * 2 ** ((t - epoch) / half_life). Тогда вклад новых событий больше
+старых, а сортировка идёт по индексу. Когда точка отсчёта устаревает,
+все рейтинги приводятся к новой одним UPDATE, а незначимые удаляются.
+
+Удаление из избранного или корзины вычитает вклад события (withdraw),
+если задача уже его учла; повторное добавление — новое событие,
+поэтому рецепт получает вес только за действующие связи.
+
+Удаление не блокирует строку состояния. Задача блокирует события,
+которые учитывает, и строки рейтингов, которые меняет, до своего
+коммита, а удаление сначала удаляет событие, затем блокирует строки
+рейтингов и только потом читает состояние. Если задача учла событие,
+удаление ждёт её коммита и видит новые id и точку отсчёта; если нет,
+задача ждёт удаления и события уже не видит. Поэтому удаление ждёт
+задачу, только когда затрагивает события или рейтинги этого запуска.
+
+Задача (update_scores, команда update_trending) обрабатывает только
+события с id больше сохранённых в TrendingState. События моложе
+SETTLE_SECONDS и все следующие за ними откладываются до следующего
+запуска: строка с меньшим id из ещё не завершённой транзакции иначе
+была бы пропущена навсегда.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.utils import timezone
+
+from .models import Favorite, ShoppingCart, TrendingScore, TrendingState
+
+#: Настройки по умолчанию, переопределяются словарём TRENDING в settings
+DEFAULTS = {
+    "HALF_LIFE_HOURS": 48,
+    "FAVORITE_WEIGHT": 1.0,
+    "SHOPPING_CART_WEIGHT": 0.5,
+    "BATCH_SIZE": 10000,
+    "SETTLE_SECONDS": 60,
+    # Через сколько периодов полураспада менять точку отсчёта
+    "REBASE_HALF_LIVES": 32,
+    # Рейтинги ниже этого значения (после приведения) удаляются
+    "MIN_SCORE": 0.001,
+}
+
+#: Источники событий: модель, поле состояния с последним id, вес
+SOURCES = (
+    (Favorite, "last_favorite_id", "FAVORITE_WEIGHT"),
+    (ShoppingCart, "last_shopping_cart_id", "SHOPPING_CART_WEIGHT"),
+)
+
+
+def get_setting(name):
+    return getattr(settings, "TRENDING", {}).get(name, DEFAULTS[name])
+
+
+def half_lives(since, until):
+    """Число периодов полураспада между двумя моментами."""
+    seconds = get_setting("HALF_LIFE_HOURS") * 3600
+    return (until - since).total_seconds() / seconds
+
+
+def collect(model, last_id, weight, epoch, until):
+    """
+    Вклады событий модели с id больше last_id по рецептам. Обработка
+    останавливается на первом событии, созданном не раньше until.
+    Прочитанные события блокируются до конца транзакции.
+    Возвращает вклады и id последнего учтённого события.
+    """
+    deltas = defaultdict(float)
+    batch_size = get_setting("BATCH_SIZE")
+    while True:
+        rows = list(
+            model.objects.select_for_update().filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "recipe_id", "created_at")[:batch_size]
+        )
+        for event_id, recipe_id, created_at in rows:
+            if created_at >= until:
+                return deltas, last_id
+            deltas[recipe_id] += weight * 2 ** half_lives(epoch, created_at)
+            last_id = event_id
+        if len(rows) < batch_size:
+            return deltas, last_id
+
+
+def lock_scores(recipe_ids):
+    """
+    Блокирует строки рейтингов рецептов в порядке id: задача и удаления
+    блокируют их в одном порядке и не ждут друг друга по кругу.
+    """
+    return {
+        score.recipe_id: score
+        for score in TrendingScore.objects.select_for_update().filter(
+            recipe_id__in=list(recipe_ids)
+        ).order_by("recipe_id")
+    }
+
+
+def apply(deltas):
+    """Прибавляет вклады к рейтингам, создавая недостающие строки."""
+    existing = lock_scores(deltas)
+    for recipe_id, score in existing.items():
+        score.score += deltas[recipe_id]
+    batch_size = get_setting("BATCH_SIZE")
+    TrendingScore.objects.bulk_update(
+        existing.values(), ["score"], batch_size=batch_size
+    )
+    TrendingScore.objects.bulk_create(
+        [
+            TrendingScore(recipe_id=recipe_id, score=delta)
+            for recipe_id, delta in deltas.items()
+            if recipe_id not in existing
+        ],
+        batch_size=batch_size,
+    )
+
+
+def withdraw(model, events):
+    """
+    Вычитает из рейтингов вклады удалённых событий модели ``model`` —
+    троек (id, id рецепта, дата создания). События, которые задача ещё
+    не обработала, пропускаются. Вызывается после удаления событий
+    в той же транзакции.
+    """
+    field, weight = next(
+        (field, weight) for source, field, weight in SOURCES
+        if source is model
+    )
+    weight = get_setting(weight)
+    with transaction.atomic(savepoint=False):
+        lock_scores({recipe_id for _, recipe_id, _ in events})
+        state = TrendingState.objects.filter(pk=1).first()
+        if state is None:
+            return 0
+        deltas = defaultdict(float)
+        for event_id, recipe_id, created_at in events:
+            if event_id <= getattr(state, field):
+                deltas[recipe_id] += weight * 2 ** half_lives(
+                    state.epoch, created_at
+                )
+        if not deltas:
+            return 0
+        scores = TrendingScore.objects.filter(recipe_id__in=list(deltas))
+        scores.update(score=F("score") - Case(
+            *(
+                When(recipe_id=recipe_id, then=Value(delta))
+                for recipe_id, delta in deltas.items()
+            ),
+            output_field=FloatField(),
+        ))
+        scores.filter(score__lt=get_setting("MIN_SCORE")).delete()
+    return len(deltas)
+
+
+def rebase(state, now):
+    """Приводит все рейтинги к новой точке отсчёта ``now``."""
+    factor = 2 ** -half_lives(state.epoch, now)
+    TrendingScore.objects.update(score=F("score") * factor)
+    TrendingScore.objects.filter(score__lt=get_setting("MIN_SCORE")).delete()
+    state.epoch = now
+
+
+@transaction.atomic
+def update_scores(now=None):
+    """
+    Учитывает новые события в рейтинге и возвращает число рецептов,
+    рейтинг которых изменился. Строка состояния блокируется,
+    поэтому одновременные запуски выполняются по очереди; удаления
+    её не блокируют.
+    """
+    now = now or timezone.now()
+    state = TrendingState.objects.select_for_update().filter(pk=1).first()
+    if state is None:
+        state = TrendingState.objects.create(pk=1, epoch=now)
+    epoch = state.epoch
+    if half_lives(epoch, now) >= get_setting("REBASE_HALF_LIVES"):
+        epoch = now
+    until = now - timedelta(seconds=get_setting("SETTLE_SECONDS"))
+    deltas = defaultdict(float)
+    # События блокируются раньше рейтингов, как и при удалении
+    for model, field, weight in SOURCES:
+        source_deltas, last_id = collect(
+            model, getattr(state, field), get_setting(weight), epoch, until,
+        )
+        for recipe_id, delta in source_deltas.items():
+            deltas[recipe_id] += delta
+        setattr(state, field, last_id)
+    if epoch != state.epoch:
+        rebase(state, now)
+    if deltas:
+        apply(deltas)
+    state.updated_at = now
+    state.save()
+    return len(deltas)
@@ -2,29 +2,65 @@ from http import HTTPStatus
 from io import BytesIO
 
 from django.conf import settings
+from django.db import transaction
 from django.db.models import Sum
-from django.http import FileResponse
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils.crypto import get_random_string
 from rest_framework import viewsets
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .filters import IngredientFilter
+from api.response_cache import ResponseCacheMixin
+from api.sparse import requested_fields
+from . import trending
+from .batch import add_relations, remove_relations
+from .feed import feed_page
+from .filters import (
+    IngredientFilter,
+    filter_by_user_lists,
+    rank_by_ingredients,
+    restrict_ranked,
+)
 from .models import Recipe, Ingredient, Favorite, ShoppingCart
-from .paginations import RecipePagination
+from .paginations import (
+    RecipeFeedPagination,
+    RecipePagination,
+    RecipeSearchPagination,
+)
+from .search import search_recipes
 from .serializers.ingredient import IngredientSerializer
-from .serializers.other_serializers import (
-    FavoriteSerializer,
-    ShoppingCartSerializer
+from .serializers.other_serializers import RecipeIdsSerializer
+from .serializers.projections import (
+    RECIPE_FIELDS,
+    SHORT_RECIPE_FIELDS,
+    build_recipes,
+    recipe_columns,
+    short_recipe_data,
 )
 from .serializers.recipe_read import RecipeReadSerializer
 from .serializers.recipe_write import RecipeWriteSerializer
+from .similar import similar_index
+from .toggles import FAVORITE, SHOPPING_CART
+
+
+def shopping_list_text(ingredients):
+    """Текст списка покупок из строк values() корзины с суммой amount."""
+    lines = ["Список покупок:\n"]
+    for item in ingredients:
+        line = (
+            f"{item['recipe__ingredients__name']} "
+            f"({item['recipe__ingredients__measurement_unit']}) "
+            f"— {item['amount']}"
+        )
+        lines.append(line)
+    return "\n".join(lines)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ResponseCacheMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для просмотра ингредиентов."""
     queryset = Ingredient.objects.all().order_by("name")
     serializer_class = IngredientSerializer
@@ -33,7 +69,7 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """Вьюсет для работы с рецептами - все CRUD операции."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeReadSerializer
@@ -84,29 +120,173 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return super().destroy(request, *args, **kwargs)
 
+    def get_search_query(self):
+        return self.request.query_params.get("search", "").strip()
+
+    @property
+    def paginator(self):
+        """Результаты поиска листаются курсором по релевантности."""
+        if (
+            not hasattr(self, "_paginator")
+            and self.action == "list"
+            and self.get_search_query()
+        ):
+            self._paginator = RecipeSearchPagination()
+        return super().paginator
+
+    def get_requested_fields(self):
+        """Поля ответа по параметрам fields/omit (None — все поля)."""
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = requested_fields(
+                self.request.query_params, RecipeReadSerializer.Meta.fields
+            )
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is RecipeReadSerializer:
+            kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
     def get_queryset(self):
-        """Фильтрация рецептов по корзине и избранному."""
-        queryset = Recipe.objects.select_related('author').prefetch_related('ingredients')
-        user = self.request.user
-        is_in_shopping_cart = self.request.query_params.get(
-            "is_in_shopping_cart"
+        """
+        Фильтрация рецептов по корзине, избранному, поисковому запросу
+        и имеющимся ингредиентам.
+        """
+        fields = (
+            self.get_requested_fields() if self.action == "retrieve" else None
+        )
+        if fields is None:
+            queryset = Recipe.objects.select_related(
+                'author'
+            ).defer("search_vector")
+        else:
+            # Только столбцы и связанные данные выбранных полей
+            queryset = Recipe.objects.only(*(
+                column.removesuffix("_id")
+                for column in recipe_columns(fields)
+            ))
+            if "author" in fields:
+                queryset = queryset.select_related("author")
+        search = self.get_search_query()
+        if self.action == "list" and search:
+            queryset = search_recipes(queryset, search)
+        return filter_by_user_lists(
+            queryset, self.request.user, self.request.query_params
         )
-        if is_in_shopping_cart is not None and user.is_authenticated:
-            queryset = (
-                queryset.filter(shoppingcart__user=user)
-                if is_in_shopping_cart == "1"
-                else queryset.exclude(shoppingcart__user=user)
-            )
 
-        is_favorited = self.request.query_params.get("is_favorited")
-        if is_favorited is not None and user.is_authenticated:
-            queryset = (
-                queryset.filter(favorite__user=user)
-                if is_favorited == "1"
-                else queryset.exclude(favorite__user=user)
+    def recipe_page_response(self, queryset):
+        """
+        Страница рецептов в формате RecipeReadSerializer, собранная
+        из строк values() и нескольких запросов на всю страницу.
+        """
+        fields = self.get_requested_fields()
+        columns = RECIPE_FIELDS if fields is None else recipe_columns(fields)
+        if isinstance(self.paginator, CursorPagination):
+            # Курсор строится по значениям полей сортировки
+            columns += tuple(
+                name.lstrip("-") for name in self.paginator.ordering
+                if name.lstrip("-") not in columns
             )
+        rows = queryset.prefetch_related(None).values(*columns)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(build_recipes(list(rows), self.request, fields))
+        return self.get_paginated_response(
+            build_recipes(page, self.request, fields)
+        )
+
+    def recipes_in_order(self, queryset, recipe_ids):
+        """Представления рецептов из ``recipe_ids`` в том же порядке."""
+        fields = self.get_requested_fields()
+        columns = RECIPE_FIELDS if fields is None else recipe_columns(fields)
+        rows = {
+            row["id"]: row
+            for row in queryset.prefetch_related(None).filter(
+                id__in=recipe_ids
+            ).order_by().values(*columns)
+        }
+        return build_recipes(
+            [rows[recipe_id] for recipe_id in recipe_ids if recipe_id in rows],
+            self.request, fields,
+        )
 
-        return queryset
+    def ranked_page_response(self, queryset, recipe_ids):
+        """
+        Страница рецептов в порядке ``recipe_ids``: номер страницы
+        выбирает срез списка, из базы читаются только рецепты среза.
+        """
+        page = self.paginate_queryset(recipe_ids)
+        return self.get_paginated_response(
+            self.recipes_in_order(queryset, page)
+        )
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        ranked = rank_by_ingredients(request.query_params)
+        if ranked is None:
+            return self.recipe_page_response(queryset)
+        ranked = restrict_ranked(queryset, ranked)
+        if isinstance(self.paginator, CursorPagination):
+            # Результаты поиска листаются курсором по релевантности:
+            # подбор по ингредиентам только сужает найденное поиском
+            return self.recipe_page_response(queryset.filter(id__in=ranked))
+        return self.ranked_page_response(queryset, ranked)
+
+    @action(
+        detail=False, methods=["get"],
+        permission_classes=[IsAuthenticated],
+        pagination_class=RecipeFeedPagination,
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        rows = self.paginator.paginate_rows(
+            lambda limit, position, reverse: feed_page(
+                request.user, limit, position, reverse
+            ),
+            request,
+        )
+        return self.paginator.get_paginated_response(self.recipes_in_order(
+            Recipe.objects.all(), [recipe_id for _, recipe_id in rows]
+        ))
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request):
+        """Популярные рецепты по материализованному рейтингу."""
+        return self.recipe_page_response(Recipe.objects.filter(
+            trending_score__isnull=False
+        ).order_by("-trending_score__score", "-id"))
+
+    @action(detail=True, methods=["get"])
+    def related(self, request, pk=None):
+        """Рецепты, которые добавляют в избранное вместе с этим."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        rows = Recipe.objects.filter(
+            related_from__recipe=recipe
+        ).order_by("-related_from__score").values(*SHORT_RECIPE_FIELDS)
+        return Response(
+            [short_recipe_data(row, request) for row in rows],
+            status=HTTPStatus.OK,
+        )
+
+    @action(detail=True, methods=["get"])
+    def similar(self, request, pk=None):
+        """Рецепты с похожим составом ингредиентов."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        found = similar_index.similar(recipe.id)
+        rows = {
+            row["id"]: row
+            for row in Recipe.objects.filter(
+                id__in=[recipe_id for recipe_id, _ in found]
+            ).values(*SHORT_RECIPE_FIELDS)
+        }
+        return Response(
+            [
+                short_recipe_data(rows[recipe_id], request)
+                for recipe_id, _ in found
+                if recipe_id in rows
+            ],
+            status=HTTPStatus.OK,
+        )
 
     @action(detail=True, methods=["get"], url_path="get-link")
     def get_link(self, request, pk=None):
@@ -115,33 +295,58 @@ class RecipeViewSet(viewsets.ModelViewSet):
         short_link = f"{settings.BASE_URL}/short/{short_code}"
         return Response({"short-link": short_link}, status=HTTPStatus.OK)
 
+    def toggle_response(self, toggle, request, pk, errors):
+        """
+        Добавление (POST) или удаление (DELETE) рецепта одним запросом.
+        ``errors`` — сообщения о повторном добавлении и об отсутствии.
+        """
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if request.method == "POST":
+            result = toggle.add(
+                request.user.id, recipe_id, SHORT_RECIPE_FIELDS
+            )
+            if result is None:
+                raise Http404
+            created, row = result
+            if not created:
+                return Response(
+                    {"error": errors[0]}, status=HTTPStatus.BAD_REQUEST
+                )
+            return Response(
+                short_recipe_data(row, request), status=HTTPStatus.CREATED
+            )
+        with transaction.atomic():
+            result = toggle.remove(
+                request.user.id, recipe_id, ("id", "created_at")
+            )
+            if result is None:
+                raise Http404
+            deleted, row = result
+            if deleted:
+                # Сигнал post_delete не отправляется: вклад в рейтинг
+                # вычитается в той же транзакции
+                trending.withdraw(
+                    toggle.model, [(row["id"], recipe_id, row["created_at"])]
+                )
+        if not deleted:
+            return Response(
+                {"error": errors[1]}, status=HTTPStatus.BAD_REQUEST
+            )
+        return Response(status=HTTPStatus.NO_CONTENT)
+
     @action(
         detail=True, methods=["post", "delete"], url_path="favorite",
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk=None):
         """Добавление или удаление рецепта из избранного."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        if request.method == "POST":
-            data = {"user": request.user.id, "recipe": recipe.id}
-            serializer = FavoriteSerializer(
-                data=data,
-                context={"request": request}
-            )
-            serializer.is_valid(raise_exception=True)
-            instance = serializer.save()
-            return Response(
-                serializer.to_representation(instance),
-                status=HTTPStatus.CREATED,
-            )
-        favorite_qs = Favorite.objects.filter(user=request.user, recipe=recipe)
-        if favorite_qs.exists():
-            favorite_qs.delete()
-            return Response(status=HTTPStatus.NO_CONTENT)
-        return Response(
-            {"error": "Этот рецепт отсутствует в избранном."},
-            status=HTTPStatus.BAD_REQUEST,
-        )
+        return self.toggle_response(FAVORITE, request, pk, (
+            "Этот рецепт уже в избранном.",
+            "Этот рецепт отсутствует в избранном.",
+        ))
 
     @action(
         detail=True, methods=["post", "delete"], url_path="shopping_cart",
@@ -149,27 +354,38 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Добавление или удаление рецепта из корзины покупок."""
-        recipe = get_object_or_404(Recipe, pk=pk)
+        return self.toggle_response(SHOPPING_CART, request, pk, (
+            "Этот рецепт уже в корзине.",
+            "Этот рецепт отсутствует в корзине.",
+        ))
+
+    def batch_response(self, model, request):
+        """Пакетное добавление (POST) или удаление (DELETE) рецептов."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
         if request.method == "POST":
-            data = {"user": request.user.id, "recipe": recipe.id}
-            serializer = ShoppingCartSerializer(
-                data=data,
-                context={"request": request}
-            )
-            serializer.is_valid(raise_exception=True)
-            instance = serializer.save()
-            return Response(
-                serializer.to_representation(instance),
-                status=HTTPStatus.CREATED,
-            )
-        cart_qs = ShoppingCart.objects.filter(user=request.user, recipe=recipe)
-        if cart_qs.exists():
-            cart_qs.delete()
-            return Response(status=HTTPStatus.NO_CONTENT)
-        return Response(
-            {"error": "Этот рецепт отсутствует в корзине."},
-            status=HTTPStatus.BAD_REQUEST,
-        )
+            results = add_relations(model, request.user, recipe_ids)
+        else:
+            results = remove_relations(model, request.user, recipe_ids)
+        return Response({"recipes": results}, status=HTTPStatus.OK)
+
+    @action(
+        detail=False, methods=["post", "delete"], url_path="favorite/batch",
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        """Добавление или удаление нескольких рецептов в избранном."""
+        return self.batch_response(Favorite, request)
+
+    @action(
+        detail=False, methods=["post", "delete"],
+        url_path="shopping_cart/batch",
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        """Добавление или удаление нескольких рецептов в корзине покупок."""
+        return self.batch_response(ShoppingCart, request)
 
     @action(detail=False, methods=["get"], url_path="download_shopping_cart")
     def download_shopping_cart(self, request):
@@ -194,18 +410,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             "recipe__ingredients__measurement_unit"
         ).annotate(amount=Sum("recipe__recipeingredient__amount"))
 
-        lines = ["Список покупок:\n"]
-        for item in ingredients:
-            line = (
-                f"{item['recipe__ingredients__name']} "
-                f"({item['recipe__ingredients__measurement_unit']}) "
-                f"— {item['amount']}"
-            )
-            lines.append(line)
-        content = "\n".join(lines)
-
         # Create a BytesIO object with the encoded content
-        file_obj = BytesIO(content.encode("utf-8"))
+        file_obj = BytesIO(shopping_list_text(ingredients).encode("utf-8"))
 
         response = FileResponse(
             file_obj,
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as DefaultUserAdmin
 
+from recipes.paginations import EstimatedCountPaginator
 from .models import User, Subscription
 
 
@@ -8,6 +9,8 @@ from .models import User, Subscription
 class UserAdmin(DefaultUserAdmin):
     list_display = ("username", "email", "is_active", "is_staff")
     search_fields = ("username", "email")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {"fields": ("username", "email", "password")}),
@@ -41,4 +44,8 @@ class UserAdmin(DefaultUserAdmin):
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "author")
+    list_select_related = ("user", "author")
     search_fields = ("user__username", "author__username")
+    autocomplete_fields = ("user", "author")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
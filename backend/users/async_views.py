@@ -0,0 +1,231 @@
+"""
+Асинхронные представления для запуска под ASGI-сервером.
+Подключаются в api/urls.py при включённой настройке ASYNC_API.
+"""
+
+import json
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import Throttled
+
+from api.async_utils import (
+    alist,
+    apaginate,
+    async_api_view,
+    exception_response,
+    json_response,
+    paginated_data,
+)
+from api.sparse import FIELDS_PARAM, OMIT_PARAM
+from config import replicas
+from recipes.serializers.projections import (
+    USER_FIELDS,
+    recipes_by_author,
+    short_recipe_data,
+    user_data,
+)
+from . import hashing
+from .authentication import CachedTokenAuthentication
+from .backends import HashingPoolModelBackend
+from .models import User
+from .paginations import UserPagination
+from .serializers import UserCreateSerializer
+from .views import UserViewSet, new_password_error
+
+
+def error_response(message, status=HTTPStatus.BAD_REQUEST):
+    return JsonResponse({"non_field_errors": [message]}, status=status)
+
+
+def request_data(request):
+    """Тело запроса JSON или формы; None, если JSON некорректен."""
+    if request.content_type != "application/json":
+        return request.POST
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+
+
+async def token_login(request):
+    """
+    Асинхронный аналог AuthTokenView: пароль проверяется в пуле
+    users.hashing, и цикл событий продолжает обслуживать другие запросы.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    data = request_data(request)
+    if data is None:
+        return error_response("Некорректный JSON.")
+    email = data.get("email")
+    password = data.get("password")
+    if not (email and password):
+        return error_response("Требуется email и password")
+    try:
+        user = await HashingPoolModelBackend().aauthenticate(
+            request, username=email, password=password
+        )
+    except Throttled as exc:
+        return JsonResponse(
+            {"detail": str(exc.detail)}, status=HTTPStatus.TOO_MANY_REQUESTS
+        )
+    if user is None:
+        return error_response("Неверные учётные данные")
+    token, _ = await Token.objects.aget_or_create(user=user)
+    await sync_to_async(replicas.pin)(token.key)
+    return JsonResponse({"auth_token": token.key})
+
+
+user_list_view = UserViewSet.as_view({"get": "list", "post": "create"})
+
+
+def sync_user_list(request):
+    return user_list_view(request).render()
+
+
+async def user_list(request):
+    """
+    Асинхронная регистрация (POST): хеш пароля считается в пуле
+    users.hashing, и цикл событий продолжает обслуживать другие запросы.
+    Список пользователей отдаёт представление DRF.
+    """
+    if request.method != "POST":
+        return await sync_to_async(sync_user_list)(request)
+    data = request_data(request)
+    if data is None:
+        return error_response("Некорректный JSON.")
+    serializer = UserCreateSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return json_response(
+            serializer.errors, status=HTTPStatus.BAD_REQUEST
+        )
+    user = User(**serializer.validated_data)
+    try:
+        await hashing.aset_password(
+            user, serializer.validated_data["password"]
+        )
+    except Throttled as exc:
+        return exception_response(exc)
+    await user.asave()
+    return json_response(
+        UserCreateSerializer(user).data, status=HTTPStatus.CREATED
+    )
+
+
+async def set_password(request):
+    """
+    Асинхронный аналог UserViewSet.set_password: текущий пароль
+    проверяется и новый хешируется в пуле users.hashing.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    authentication = CachedTokenAuthentication()
+    try:
+        result = await authentication.aauthenticate(request)
+        if result is None:
+            raise exceptions.NotAuthenticated()
+    except (
+        exceptions.NotAuthenticated, exceptions.AuthenticationFailed
+    ) as exc:
+        exc.auth_header = authentication.authenticate_header(request)
+        return exception_response(exc)
+    user = result[0]
+    data = request_data(request)
+    if data is None:
+        return error_response("Некорректный JSON.")
+    old_password = data.get("current_password")
+    new_password = data.get("new_password")
+    if not old_password or not new_password:
+        return json_response(
+            {
+                "error": "Поля 'current_password' "
+                         "и 'new_password' обязательны."
+            },
+            status=HTTPStatus.BAD_REQUEST,
+        )
+    try:
+        if not await hashing.acheck_password(user, old_password):
+            return json_response(
+                {"error": "Текущий пароль указан неверно."},
+                status=HTTPStatus.BAD_REQUEST,
+            )
+        error = new_password_error(user, old_password, new_password)
+        if error:
+            return json_response(
+                {"error": error}, status=HTTPStatus.BAD_REQUEST
+            )
+        await hashing.aset_password(user, new_password)
+    except Throttled as exc:
+        return exception_response(exc)
+    await user.asave(update_fields=["password"])
+    return HttpResponse(status=HTTPStatus.NO_CONTENT)
+
+
+user_me_view = UserViewSet.as_view({"get": "me"})
+
+
+def sync_user_me(request):
+    return user_me_view(request).render()
+
+
+@async_api_view(fallback=user_me_view, login_required=True)
+async def user_me(request):
+    """
+    Асинхронный аналог UserViewSet.me. Выборку полей выполняет
+    синхронное представление.
+    """
+    if FIELDS_PARAM in request.GET or OMIT_PARAM in request.GET:
+        return await sync_to_async(sync_user_me)(request)
+    user = request.user
+    is_subscribed = await user.subscribers.filter(user=user).aexists()
+    row = {field: getattr(user, field) for field in USER_FIELDS}
+    row["avatar"] = user.avatar.name
+    return json_response(user_data(row, is_subscribed, request))
+
+
+@async_api_view(
+    fallback=UserViewSet.as_view({"get": "subscriptions"}),
+    login_required=True,
+)
+async def user_subscriptions(request):
+    """
+    Асинхронный аналог UserViewSet.subscriptions: рецепты авторов
+    страницы запрашиваются одним запросом.
+    """
+    try:
+        recipes_limit = int(request.GET.get("recipes_limit") or 0)
+    except ValueError:
+        recipes_limit = 0
+
+    queryset = User.objects.filter(subscribers__user=request.user)
+    pagination, rows = await apaginate(
+        queryset,
+        request,
+        UserPagination,
+        lambda page: alist(page.values(*USER_FIELDS, "recipes_count")),
+    )
+
+    # Подписки перечисляют только авторов, на которых подписан пользователь
+    recipes = await sync_to_async(recipes_by_author)(
+        [row["id"] for row in rows], recipes_limit
+    )
+    results = []
+    for row in rows:
+        data = user_data(row, True, request)
+        data["recipes_count"] = row["recipes_count"]
+        data["recipes"] = [
+            short_recipe_data(recipe, request)
+            for recipe in recipes[row["id"]]
+        ]
+        results.append(data)
+    return json_response(paginated_data(pagination, results))
+
+
+# Как и APIView, аутентификация по токену не использует CSRF-защиту
+token_login.csrf_exempt = True
+user_list.csrf_exempt = True
+set_password.csrf_exempt = True
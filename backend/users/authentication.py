@@ -0,0 +1,212 @@
+"""
+Аутентификация по токену с кешированием связки токен -> пользователь.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import FileField
+from rest_framework.authentication import (
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+#: Настройки по умолчанию, переопределяются словарём TOKEN_CACHE в settings
+DEFAULTS = {
+    "MAX_SIZE": 10000,
+    "TTL": 300,
+    "CHECK_INTERVAL": 5,
+    "CACHE_ALIAS": "shared",
+    "KEY_PREFIX": "auth-token",
+}
+
+
+def get_setting(name):
+    return getattr(settings, "TOKEN_CACHE", {}).get(name, DEFAULTS[name])
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру потокобезопасный LRU-кеш с временем жизни записей.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def field_values(instance):
+    """Значения полей объекта, из которых он собирается заново."""
+    values = {}
+    for field in instance._meta.concrete_fields:
+        value = getattr(instance, field.attname)
+        if isinstance(field, FileField):
+            value = value.name
+        values[field.attname] = value
+    return type(instance), instance._state.db, values
+
+
+def build(model, db, values):
+    """Новый экземпляр: запросы не делят ни его, ни файлы его полей."""
+    return model.from_db(db, list(values), list(values.values()))
+
+
+class TokenCache:
+    """
+    Кеш токенов процесса с отзывом через общий счётчик ревизий.
+
+    Записи живут в локальном LRU и не проверяются поштучно: источник
+    истины — таблица токенов, а общий кеш CACHE_ALIAS хранит один ключ
+    с ревизией отзывов. Процесс читает его не чаще раза в CHECK_INTERVAL
+    секунд и при смене ревизии очищает локальный кеш целиком, поэтому
+    отозванный токен перестаёт действовать в других процессах не позже
+    чем через CHECK_INTERVAL секунд. Ревизия записывается случайным
+    значением, а не инкрементом: двум одновременным отзывам не нужен
+    атомарный счётчик, чтобы её изменить. Без CACHE_ALIAS отозванный
+    токен действует в других процессах до истечения TTL.
+
+    Локальный кеш хранит значения полей пользователя и токена, а не
+    экземпляры: get каждый раз собирает новые объекты.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(get_setting("MAX_SIZE"), get_setting("TTL"))
+        self.revision = None
+        self.checked_at = None
+
+    @property
+    def shared(self):
+        alias = get_setting("CACHE_ALIAS")
+        return caches[alias] if alias else None
+
+    @property
+    def revision_key(self):
+        return f"{get_setting('KEY_PREFIX')}:revision"
+
+    def needs_check(self):
+        """Пора ли сверить ревизию отзывов с общим кешем."""
+        return (
+            self.checked_at is None
+            or time.monotonic() - self.checked_at
+            >= get_setting("CHECK_INTERVAL")
+        )
+
+    def check(self, revision):
+        """Очищает локальный кеш, если с прошлой сверки были отзывы."""
+        if revision != self.revision:
+            self.local.clear()
+            self.revision = revision
+        self.checked_at = time.monotonic()
+
+    def get(self, key):
+        shared = self.shared
+        if shared is not None and self.needs_check():
+            self.check(shared.get(self.revision_key))
+        return self.build(self.local.get(key))
+
+    async def aget(self, key):
+        """get для асинхронного кода: общий кеш читается через aget."""
+        shared = self.shared
+        if shared is not None and self.needs_check():
+            self.check(await shared.aget(self.revision_key))
+        return self.build(self.local.get(key))
+
+    @staticmethod
+    def build(cached):
+        if cached is None:
+            return None
+        user_fields, token_fields = cached
+        user = build(*user_fields)
+        token = build(*token_fields)
+        token.user = user
+        return user, token
+
+    def set(self, key, user, token):
+        self.local.set(key, (field_values(user), field_values(token)))
+
+    def invalidate(self, *keys):
+        """
+        Удаляет записи из кеша процесса и меняет общую ревизию, чтобы
+        остальные процессы очистили свои кеши при следующей сверке.
+        """
+        for key in keys:
+            self.local.delete(key)
+        shared = self.shared
+        if shared is not None and keys:
+            shared.set(self.revision_key, uuid4().hex, timeout=None)
+
+    def clear(self):
+        self.local.clear()
+        self.revision = None
+        self.checked_at = None
+
+
+#: Кеш токенов процесса
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication, который обращается к базе только при промахе кеша.
+    Записи сбрасываются сигналами при удалении токена и изменении
+    пользователя (смена пароля, деактивация).
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            return user, token
+        return cached
+
+    async def aauthenticate(self, request):
+        """
+        Асинхронный вариант authenticate для ASGI-представлений:
+        при попадании в кеш обходится без перехода в синхронный поток.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth:
+            return None
+        if len(auth) == 2 and auth[0].lower() == self.keyword.lower().encode():
+            try:
+                cached = await token_cache.aget(auth[1].decode())
+            except UnicodeError:
+                cached = None
+            if cached is not None:
+                return cached
+        return await sync_to_async(self.authenticate)(request)
@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from . import hashing
+
+User = get_user_model()
+
+
+class HashingPoolModelBackend(ModelBackend):
+    """
+    ModelBackend с асинхронной проверкой пароля в пуле users.hashing.
+    Синхронный authenticate наследуется: хешер паролей сам считает
+    хеш в пуле.
+    """
+
+    async def aauthenticate(self, request, username=None, password=None):
+        """Асинхронный вариант authenticate для ASGI-представлений."""
+        if username is None or password is None:
+            return None
+        try:
+            user = await User._default_manager.aget(
+                **{User.USERNAME_FIELD: username}
+            )
+        except User.DoesNotExist:
+            # Выравниваем время ответа для несуществующего пользователя
+            await hashing.amake_password(password)
+            return None
+        if (
+            await hashing.acheck_password(user, password)
+            and self.user_can_authenticate(user)
+        ):
+            return user
+        return None
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from . import hashing
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """
+    PBKDF2-SHA256 с числом итераций из настройки PASSWORD_PBKDF2_ITERATIONS.
+    Хеши с другим числом итераций пересчитываются при следующем входе.
+    Хеш вычисляется в пуле users.hashing.
+    """
+
+    def encode(self, password, salt, iterations=None):
+        return hashing.run(super().encode, password, salt, iterations)
+
+    @property
+    def iterations(self):
+        return getattr(
+            settings, "PASSWORD_PBKDF2_ITERATIONS", super().iterations
+        )
@@ -0,0 +1,124 @@
+"""
+Хеширование паролей в отдельном ограниченном пуле потоков.
+
+PBKDF2 отпускает GIL, поэтому вычисление хеша в пуле не блокирует
+остальные запросы процесса, а размер пула ограничивает число ядер,
+которое может занять всплеск входов и регистраций.
+
+Хешер users.hashers.PBKDF2PasswordHasher сам считает хеш в пуле, поэтому
+set_password и check_password пользователя проходят через пул без
+изменений в вызывающем коде. Синхронный запрос ждёт результата в своём
+потоке; асинхронные представления (ASYNC_API) ждут его через функции
+с префиксом "a", не занимая цикл событий.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+#: Настройки по умолчанию, переопределяются словарём PASSWORD_HASHING
+DEFAULTS = {
+    "WORKERS": 2,
+    "MAX_PENDING": 64,
+    "QUEUE_TIMEOUT": 5,
+}
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_local = threading.local()
+
+
+def get_setting(name):
+    return getattr(settings, "PASSWORD_HASHING", {}).get(name, DEFAULTS[name])
+
+
+def _mark_pool_thread():
+    _local.in_pool = True
+
+
+def get_executor():
+    """Лениво создаёт пул и семафор, ограничивающий длину очереди."""
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = get_setting("WORKERS")
+            _executor = ThreadPoolExecutor(
+                max_workers=workers,
+                thread_name_prefix="password-hashing",
+                initializer=_mark_pool_thread,
+            )
+            _slots = threading.BoundedSemaphore(
+                workers + get_setting("MAX_PENDING")
+            )
+    return _executor, _slots
+
+
+def submit(func, *args, blocking=True):
+    """
+    Ставит задачу в пул. Если очередь заполнена, ждёт QUEUE_TIMEOUT секунд
+    (или не ждёт вовсе при blocking=False) и отвечает 429.
+    """
+    executor, slots = get_executor()
+    timeout = get_setting("QUEUE_TIMEOUT") if blocking else None
+    if not slots.acquire(blocking=blocking, timeout=timeout):
+        raise Throttled(
+            detail="Сервис аутентификации перегружен, повторите запрос позже."
+        )
+    future = executor.submit(func, *args)
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def run(func, *args):
+    """
+    Выполняет func в пуле и ждёт результата. В потоке пула выполняет
+    сразу: задача пула не занимает второе место в очереди.
+    """
+    if getattr(_local, "in_pool", False):
+        return func(*args)
+    return submit(func, *args).result()
+
+
+async def arun(func, *args):
+    """Выполняет func в пуле, не занимая цикл событий."""
+    return await asyncio.wrap_future(submit(func, *args, blocking=False))
+
+
+def _check_password(user, password):
+    """
+    user.check_password без сохранения: устаревший хеш пересчитывается
+    через set_password, сохраняет его вызывающий. Не обращается к базе.
+    """
+    rehashed = False
+
+    def setter(raw_password):
+        nonlocal rehashed
+        user.set_password(raw_password)
+        rehashed = True
+
+    return hashers.check_password(password, user.password, setter), rehashed
+
+
+async def amake_password(password):
+    return await arun(hashers.make_password, password)
+
+
+async def aset_password(user, password):
+    """user.set_password с хешированием в пуле; сохраняет вызывающий."""
+    await arun(user.set_password, password)
+
+
+async def acheck_password(user, password):
+    """
+    Асинхронный user.check_password: пароль проверяется в пуле,
+    пересчитанный хеш сохраняется.
+    """
+    is_correct, rehashed = await arun(_check_password, user, password)
+    if rehashed:
+        await user.asave(update_fields=["password"])
+    return is_correct
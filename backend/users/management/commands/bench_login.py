@@ -0,0 +1,74 @@
+# Стандартная библиотека
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Сторонние библиотеки
+from django.conf import settings
+from django.contrib.auth import hashers as django_hashers
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+# Локальные импорты
+from users import hashing
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login password verification throughput per core "
+        "through the users.hashing pool"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--logins", type=int, default=200,
+            help="Total number of password checks",
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=32,
+            help="Number of simultaneous login requests",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=None,
+            help="PBKDF2 iterations (default: PASSWORD_PBKDF2_ITERATIONS)",
+        )
+
+    def handle(self, *args, **options):
+        iterations = (
+            options["iterations"] or settings.PASSWORD_PBKDF2_ITERATIONS
+        )
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=iterations):
+            self.run(options["logins"], options["concurrency"], iterations)
+
+    def run(self, logins, concurrency, iterations):
+        password = "benchPass123"
+        # Пользователь не сохраняется: измеряется только хеширование
+        user = User(email="bench@example.com")
+        user.password = django_hashers.make_password(password)
+
+        def login(_):
+            started = time.perf_counter()
+            assert user.check_password(password)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as requests:
+            started = time.perf_counter()
+            latencies = sorted(requests.map(login, range(logins)))
+            elapsed = time.perf_counter() - started
+
+        workers = hashing.get_setting("WORKERS")
+        cores = min(workers, os.cpu_count() or 1)
+        throughput = logins / elapsed
+        self.stdout.write(f"iterations:          {iterations}")
+        self.stdout.write(f"hashing workers:     {workers}")
+        self.stdout.write(f"logins:              {logins}")
+        self.stdout.write(f"throughput:          {throughput:.1f} logins/s")
+        self.stdout.write(
+            f"throughput per core: {throughput / cores:.1f} logins/s"
+        )
+        self.stdout.write(
+            f"latency p50/p95:     "
+            f"{latencies[len(latencies) // 2] * 1000:.1f} / "
+            f"{latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms"
+        )
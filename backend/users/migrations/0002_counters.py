@@ -0,0 +1,55 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def set_counter(model, field, related_model, related_field):
+    """Записывает в ``field`` число строк ``related_model``."""
+    model.objects.update(**{field: Coalesce(
+        Subquery(
+            related_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        Value(0),
+    )})
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Subscription = apps.get_model("users", "Subscription")
+    set_counter(User, "recipes_count", Recipe, "author")
+    set_counter(User, "subscribers_count", Subscription, "author")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+        ("recipes", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="recipes_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Количество рецептов"
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="subscribers_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Количество подписчиков",
+            ),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.17 on 2026-10-19 10:43
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="user",
+            index=models.Index(
+                Lower("username"), name="user_username_lower_idx"
+            ),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import Index, UniqueConstraint
+from django.db.models.functions import Lower
 
 
 class User(AbstractUser):
@@ -16,6 +17,16 @@ class User(AbstractUser):
         null=True,
         verbose_name="Аватар",
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество рецептов",
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество подписчиков",
+    )
 
     groups = models.ManyToManyField(
         "auth.Group",
@@ -34,6 +45,9 @@ class User(AbstractUser):
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
         ordering = ["email"]
+        indexes = [
+            Index(Lower("username"), name="user_username_lower_idx"),
+        ]
 
     def __str__(self):
         return self.email
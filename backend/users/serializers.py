@@ -1,8 +1,11 @@
 import re
 from django.contrib.auth import authenticate
+from django.db.models import Value
+from django.db.models.functions import Lower
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from api.sparse import SparseFieldsMixin
 from .models import User, Subscription
 from .fields import Base64ImageField
 from constants import (
@@ -51,7 +54,7 @@ class EmailAuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Сериализатор для отображения информации о пользователе.
     Включает статус подписки и аватар в base64.
@@ -72,6 +75,9 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        # Аннотация UserViewSet.get_queryset избавляет от запроса
+        if hasattr(obj, "subscribed"):
+            return obj.subscribed
         request = self.context.get("request")
         return (
             request
@@ -133,7 +139,9 @@ class UserCreateSerializer(serializers.ModelSerializer):
             raise ValidationError("Неверный формат username.")
         if value.lower() == 'me':
             raise ValidationError("Использовать 'me' как username запрещено.")
-        if User.objects.filter(username__iexact=value).exists():
+        if User.objects.alias(
+            username_lower=Lower("username")
+        ).filter(username_lower=Lower(Value(value))).exists():
             raise ValidationError("Такой username уже зарегистрирован.")
         return value
 
@@ -0,0 +1,84 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api import response_cache
+from recipes.counters import change_counter
+from .authentication import token_cache
+from .models import Subscription, User
+
+#: Поля пользователя, которые выводятся в кешируемых ответах
+#: (UserSerializer и автор рецепта)
+PAYLOAD_FIELDS = ("email", "username", "first_name", "last_name", "avatar")
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    """Увеличивает количество подписчиков автора."""
+    if created:
+        change_counter(User, instance.author_id, "subscribers_count", 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    """Уменьшает количество подписчиков автора."""
+    change_counter(User, instance.author_id, "subscribers_count", -1)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Сбрасывает кеш удалённого токена (выход, удаление в админке)."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Сбрасывает кеш токенов пользователя при любом его изменении:
+    смене пароля, деактивации, обновлении профиля.
+    """
+    if created or update_fields == frozenset(["last_login"]):
+        return
+    token_cache.invalidate(
+        *Token.objects.filter(user=instance).values_list("key", flat=True)
+    )
+
+
+@receiver(pre_save, sender=User)
+def user_payload_changing(sender, instance, update_fields=None, **kwargs):
+    """
+    Отмечает, меняет ли сохранение поля пользователя, которые выводятся
+    в кешируемых ответах. Без update_fields прежние значения читаются
+    одним запросом.
+    """
+    if instance._state.adding:
+        changed = False
+    elif update_fields is not None:
+        changed = not set(PAYLOAD_FIELDS).isdisjoint(update_fields)
+    else:
+        fields = [User._meta.get_field(name) for name in PAYLOAD_FIELDS]
+        old = User.objects.filter(pk=instance.pk).values_list(
+            *(field.attname for field in fields)
+        ).first()
+        changed = old is None or any(
+            field.get_prep_value(field.value_from_object(instance)) != value
+            for field, value in zip(fields, old)
+        )
+    instance._payload_changed = changed
+
+
+@receiver(post_save, sender=User)
+def user_content_changed(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кеш ответов анонимным пользователям, если изменились поля,
+    которые в них выводятся. Регистрация, вход и смена пароля его
+    не сбрасывают.
+    """
+    if instance.__dict__.pop("_payload_changed", not created):
+        response_cache.content_changed()
+
+
+@receiver(post_delete, sender=User)
+def user_content_deleted(sender, **kwargs):
+    """Сбрасывает кеш ответов анонимным пользователям."""
+    response_cache.content_changed()
@@ -1,7 +1,20 @@
-from django.test import TestCase
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.test import APIClient
 from django.urls import reverse
-from users.models import User
+from rest_framework.authtoken.models import Token
+from users import async_views
+from users.authentication import CachedTokenAuthentication, token_cache
+from users.hashers import PBKDF2PasswordHasher
+from recipes.models import Recipe
+from users.models import Subscription, User
 
 # Create your tests here.
 
@@ -94,3 +107,301 @@ class PasswordValidationTests(TestCase):
             'new_password': 'NewValidPass123',
         })
         self.assertEqual(response.status_code, 204)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='validPass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.me_url = reverse('user-me')
+
+    @override_settings(TOKEN_CACHE={'CACHE_ALIAS': None})
+    def test_cached_lookup_needs_no_query(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            user, token = authentication.authenticate_credentials(
+                self.token.key
+            )
+        self.assertEqual(user, self.user)
+        self.assertEqual(token, self.token)
+
+    def test_cached_lookup_skips_token_query(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertFalse([
+            query for query in queries
+            if Token._meta.db_table in query['sql']
+        ])
+
+    def test_cached_lookup_skips_shared_cache_between_checks(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        with self.assertNumQueries(0):
+            authentication.authenticate_credentials(self.token.key)
+
+    @override_settings(TOKEN_CACHE={'CHECK_INTERVAL': 0})
+    def test_revision_revokes_token_of_other_processes(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        # Другой процесс удалил токен и сменил ревизию отзывов: при
+        # следующей сверке этот процесс очищает свой кеш
+        Token.objects.filter(pk=self.token.pk).delete()
+        token_cache.shared.set(token_cache.revision_key, 'other')
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate_credentials(self.token.key)
+
+    def test_revision_is_not_checked_within_interval(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        token_cache.shared.set(token_cache.revision_key, 'other')
+        user, _ = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+
+    def test_cached_users_are_separate_instances(self):
+        self.user.avatar = 'users/avatars/avatar.png'
+        self.user.save()
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        first, _ = authentication.authenticate_credentials(self.token.key)
+        second, token = authentication.authenticate_credentials(
+            self.token.key
+        )
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.avatar, second.avatar)
+        self.assertIs(token.user, second)
+        first.avatar.name = 'users/avatars/other.png'
+        self.assertEqual(second.avatar.name, 'users/avatars/avatar.png')
+
+    def test_logout_revokes_token(self):
+        self.assertEqual(self.client.get(self.me_url).status_code, 200)
+        response = self.client.post(reverse('token_logout'))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get(self.me_url).status_code, 401)
+
+    def test_token_deletion_revokes_token(self):
+        self.assertEqual(self.client.get(self.me_url).status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get(self.me_url).status_code, 401)
+
+    def test_deactivation_revokes_token(self):
+        self.assertEqual(self.client.get(self.me_url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.me_url).status_code, 401)
+
+    def test_set_password_refreshes_cached_user(self):
+        self.assertEqual(self.client.get(self.me_url).status_code, 200)
+        response = self.client.post(reverse('user-set-password'), {
+            'current_password': 'validPass123',
+            'new_password': 'NewValidPass123',
+        })
+        self.assertEqual(response.status_code, 204)
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            self.token.key
+        )
+        self.assertTrue(user.check_password('NewValidPass123'))
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            self.user = User.objects.create_user(
+                username='testuser',
+                email='test@example.com',
+                password='validPass123'
+            )
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=2000)
+    def test_login_rehashes_password_with_configured_cost(self):
+        response = self.client.post(reverse('token_login'), {
+            'email': 'test@example.com',
+            'password': 'validPass123',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split('$')[1], '2000')
+
+    def test_wrong_password_is_rejected(self):
+        response = self.client.post(reverse('token_login'), {
+            'email': 'test@example.com',
+            'password': 'wrongPass123',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=2000)
+    def test_async_login_rehashes_password(self):
+        request = RequestFactory().post(
+            '/api/auth/token/login/',
+            data=json.dumps({
+                'email': 'test@example.com',
+                'password': 'validPass123',
+            }),
+            content_type='application/json',
+        )
+        response = async_to_sync(async_views.token_login)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('auth_token', json.loads(response.content))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password.split('$')[1], '2000')
+
+    def test_password_is_hashed_in_pool(self):
+        threads = []
+        base = PBKDF2PasswordHasher.__bases__[0]
+        encode = base.encode
+
+        def tracking_encode(hasher, *args):
+            threads.append(threading.current_thread().name)
+            return encode(hasher, *args)
+
+        with patch.object(base, 'encode', tracking_encode):
+            User(email='new@example.com').set_password('validPass123')
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('password-hashing'))
+
+    def test_set_password_notifies_validators(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with patch(
+            'django.contrib.auth.base_user.password_validation'
+            '.password_changed'
+        ) as password_changed:
+            response = self.client.post(reverse('user-set-password'), {
+                'current_password': 'validPass123',
+                'new_password': 'NewValidPass123',
+            })
+        self.assertEqual(response.status_code, 204)
+        password_changed.assert_called_once()
+        self.assertEqual(
+            password_changed.call_args.args[0], 'NewValidPass123'
+        )
+
+    def test_async_registration(self):
+        request = RequestFactory().post(
+            '/api/users/',
+            data=json.dumps({
+                'email': 'new@example.com',
+                'username': 'newuser',
+                'first_name': 'Иван',
+                'last_name': 'Петров',
+                'password': 'validPass123',
+            }),
+            content_type='application/json',
+        )
+        response = async_to_sync(async_views.user_list)(request)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.content)
+        self.assertEqual(data['username'], 'newuser')
+        self.assertNotIn('password', data)
+        user = User.objects.get(email='new@example.com')
+        self.assertTrue(user.check_password('validPass123'))
+
+    def test_async_registration_validates_data(self):
+        request = RequestFactory().post(
+            '/api/users/',
+            data=json.dumps({'email': 'test@example.com'}),
+            content_type='application/json',
+        )
+        response = async_to_sync(async_views.user_list)(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', json.loads(response.content))
+
+    def test_async_set_password(self):
+        token_cache.clear()
+        token = Token.objects.create(user=self.user)
+
+        def set_password(current, new):
+            request = RequestFactory().post(
+                '/api/users/set_password/',
+                data=json.dumps({
+                    'current_password': current, 'new_password': new,
+                }),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'Token {token.key}',
+            )
+            return async_to_sync(async_views.set_password)(request)
+
+        self.assertEqual(
+            set_password('wrongPass123', 'NewValidPass123').status_code, 400
+        )
+        self.assertEqual(
+            set_password('validPass123', '12345678901').status_code, 400
+        )
+        self.assertEqual(
+            set_password('validPass123', 'NewValidPass123').status_code, 204
+        )
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('NewValidPass123'))
+
+    def test_async_set_password_requires_authentication(self):
+        request = RequestFactory().post(
+            '/api/users/set_password/', data={},
+        )
+        response = async_to_sync(async_views.set_password)(request)
+        self.assertEqual(response.status_code, 401)
+
+
+class AsyncUserViewsTests(TestCase):
+    """Асинхронные представления отдают то же, что и DRF."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.client = APIClient()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='validPass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        for index in range(3):
+            author = User.objects.create_user(
+                username=f'author{index}',
+                email=f'author{index}@example.com',
+                password='validPass123'
+            )
+            for number in range(index + 1):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {index}.{number}',
+                    image='recipes/images/recipe.png',
+                    text='Описание',
+                    cooking_time=10,
+                )
+            Subscription.objects.create(user=self.user, author=author)
+
+    def assert_same(self, view, path, authenticated=True):
+        headers = {}
+        if authenticated:
+            headers['HTTP_AUTHORIZATION'] = f'Token {self.token.key}'
+        self.client.credentials(**headers)
+        expected = self.client.get(path)
+        actual = async_to_sync(view)(self.factory.get(path, **headers))
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(json.loads(actual.content), expected.json())
+
+    def test_me(self):
+        self.assert_same(async_views.user_me, '/api/users/me/')
+        self.assert_same(
+            async_views.user_me, '/api/users/me/', authenticated=False
+        )
+
+    def test_subscriptions(self):
+        self.assert_same(
+            async_views.user_subscriptions, '/api/users/subscriptions/'
+        )
+        self.assert_same(
+            async_views.user_subscriptions,
+            '/api/users/subscriptions/?recipes_limit=1&limit=2&page=2',
+        )
@@ -3,8 +3,9 @@ import base64
 import uuid
 
 from django.core.files.base import ContentFile
-from django.contrib.auth.hashers import check_password
-from django.db.models import Count
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -13,7 +14,18 @@ from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 
+from api.response_cache import ResponseCacheMixin
+from config import replicas
+from api.sparse import requested_fields
+from recipes import feed
 from recipes.models import Recipe
+from recipes.serializers.projections import (
+    USER_FIELDS,
+    recipes_by_author,
+    short_recipe_data,
+    user_data,
+)
+from recipes.toggles import SUBSCRIPTION
 from .models import User, Subscription
 from .serializers import (
     UserSerializer,
@@ -25,7 +37,20 @@ from .paginations import UserPagination
 logger = logging.getLogger(__name__)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+def new_password_error(user, old_password, new_password):
+    """Причина, по которой новый пароль не подходит, или None."""
+    if old_password == new_password:
+        return "Новый пароль не должен совпадать с текущим."
+    if len(new_password) < 8:
+        return "Пароль должен содержать не менее 8 символов."
+    if new_password == user.username:
+        return "Пароль не должен совпадать с именем пользователя."
+    if new_password.isdigit():
+        return "Пароль не может состоять только из цифр."
+    return None
+
+
+class UserViewSet(ResponseCacheMixin, viewsets.ModelViewSet):
     """
     Вьюсет для регистрации, смены пароля и аватара пользователя.
     """
@@ -44,6 +69,46 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserCreateSerializer
         return UserSerializer
 
+    def get_requested_fields(self):
+        """
+        Поля ответа по параметрам fields/omit для чтения пользователей
+        (None — все поля).
+        """
+        if self.action not in ("list", "retrieve", "me"):
+            return None
+        if not hasattr(self, "_requested_fields"):
+            self._requested_fields = requested_fields(
+                self.request.query_params, UserSerializer.Meta.fields
+            )
+        return self._requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.get_serializer_class() is UserSerializer:
+            kwargs.setdefault("fields", self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        """
+        Для чтения загружаются только столбцы выбранных полей, а подписка
+        текущего пользователя вычисляется в том же запросе.
+        """
+        queryset = super().get_queryset()
+        if self.action not in ("list", "retrieve"):
+            return queryset
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only("id", *(
+                name for name in fields if name != "is_subscribed"
+            ))
+        user = self.request.user
+        if user.is_authenticated and (
+            fields is None or "is_subscribed" in fields
+        ):
+            queryset = queryset.annotate(subscribed=Exists(
+                Subscription.objects.filter(author=OuterRef("pk"), user=user)
+            ))
+        return queryset
+
     @action(
         detail=False, methods=["get"],
         permission_classes=[IsAuthenticated]
@@ -73,33 +138,18 @@ class UserViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if not check_password(old_password, user.password):
+        if not user.check_password(old_password):
             return Response(
                 {"error": "Текущий пароль указан неверно."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        if old_password == new_password:
-            return Response(
-                {"error": "Новый пароль не должен совпадать с текущим."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if len(new_password) < 8:
-            return Response(
-                {"error": "Пароль должен содержать не менее 8 символов."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if new_password == user.username:
-            return Response(
-                {"error": "Пароль не должен совпадать с именем пользователя."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        if new_password.isdigit():
+        error = new_password_error(user, old_password, new_password)
+        if error:
             return Response(
-                {"error": "Пароль не может состоять только из цифр."},
-                status=status.HTTP_400_BAD_REQUEST,
+                {"error": error}, status=status.HTTP_400_BAD_REQUEST
             )
         user.set_password(new_password)
-        user.save()
+        user.save(update_fields=["password"])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -155,33 +205,43 @@ class UserViewSet(viewsets.ModelViewSet):
         from http import HTTPStatus
 
         user = request.user
-        author = self.get_object()
+        try:
+            author_id = int(pk)
+        except ValueError:
+            raise Http404
 
         if request.method == "DELETE":
-            subscription = Subscription.objects.filter(
-                user=user, author=author
-            )
-            if not subscription.exists():
+            result = SUBSCRIPTION.remove(user.id, author_id)
+            if result is None:
+                raise Http404
+            deleted, _ = result
+            if not deleted:
                 return Response(
                     {"error": "Вы не подписаны на этого пользователя."},
                     status=HTTPStatus.BAD_REQUEST,
                 )
-            subscription.delete()
+            feed.remove_author(user.id, author_id)
             return Response(status=HTTPStatus.NO_CONTENT)
 
-        if user == author:
+        if user.id == author_id:
             return Response(
                 {"error": "Вы не можете подписаться на самого себя."},
                 status=HTTPStatus.BAD_REQUEST,
             )
-        subscription, created = Subscription.objects.get_or_create(
-            user=user, author=author
-        )
+        result = SUBSCRIPTION.add(user.id, author_id)
+        if result is None:
+            raise Http404
+        created, _ = result
         if not created:
             return Response(
                 {"error": "Вы уже подписаны на этого пользователя."},
                 status=HTTPStatus.BAD_REQUEST,
             )
+        subscriptions = Subscription.objects.filter(
+            user=user, author_id=author_id
+        )
+        transaction.on_commit(lambda: feed.backfill(subscriptions))
+        author = User.objects.get(pk=author_id)
 
         recipes_limit = request.query_params.get("recipes_limit")
         try:
@@ -190,9 +250,7 @@ class UserViewSet(viewsets.ModelViewSet):
             recipes_limit = None
 
         author_data = UserSerializer(author, context={"request": request}).data
-        author_data["recipes_count"] = Recipe.objects.filter(
-            author=author
-        ).count()
+        author_data["recipes_count"] = author.recipes_count
         qs = Recipe.objects.filter(author=author)
         if recipes_limit:
             qs = qs[:recipes_limit]
@@ -225,37 +283,29 @@ class UserViewSet(viewsets.ModelViewSet):
         Возвращает список авторов, на которых подписан пользователь.
         Включает количество рецептов и ограниченный список рецептов каждого автора.
         """
-        user = request.user
         subscriptions = User.objects.filter(
-            subscribers__user=user
-        ).annotate(recipes_count=Count("recipes"))
+            subscribers__user=request.user
+        ).values(*USER_FIELDS, "recipes_count")
 
         paginator = UserPagination()
         page = paginator.paginate_queryset(subscriptions, request)
-        response_data = []
         recipes_limit = request.query_params.get("recipes_limit")
         try:
             recipes_limit = int(recipes_limit) if recipes_limit else None
         except ValueError:
             recipes_limit = None
 
-        for author in page:
-            author_data = UserSerializer(
-                author, context={"request": request}
-            ).data
-            author_data["recipes_count"] = author.recipes_count
-            qs = Recipe.objects.filter(author=author)
-            if recipes_limit:
-                qs = qs[:recipes_limit]
+        # Рецепты всех авторов страницы — одним запросом
+        recipes = recipes_by_author(
+            [row["id"] for row in page], recipes_limit
+        )
+        response_data = []
+        for row in page:
+            author_data = user_data(row, True, request)
+            author_data["recipes_count"] = row["recipes_count"]
             author_data["recipes"] = [
-                {
-                    "id": r.id,
-                    "name": r.name,
-                    "image": request.build_absolute_uri(r.image.url)
-                    if request else r.image.url,
-                    "cooking_time": r.cooking_time,
-                }
-                for r in qs
+                short_recipe_data(recipe, request)
+                for recipe in recipes[row["id"]]
             ]
             response_data.append(author_data)
 
@@ -301,4 +351,6 @@ class AuthTokenView(ObtainAuthToken):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
+        # Первые чтения с новым токеном идут в основную базу
+        replicas.pin(token.key)
         return Response({'auth_token': token.key})